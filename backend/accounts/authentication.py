@@ -0,0 +1,114 @@
+"""
+JWT authentication that resolves users from a per-process cache.
+
+simplejwt's JWTAuthentication reads the ``users`` row on every request.
+CachedJWTAuthentication keeps the field values of recently seen users for
+``AUTH_USER_CACHE_TTL`` seconds and builds ``request.user`` from them, so
+only the first request of each user per process and TTL touches the
+table. Saving or deleting a User drops its entry in this process; other
+processes see the change once their entry expires. Tokens also carry
+``username`` and ``role`` claims for clients, but authorization always
+uses the role of the stored user, which a token would outlive.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def get_ttl():
+    return getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+
+
+class UserCache:
+    """Least recently used field values of users, keyed by primary key."""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Bumped by every invalidation, so a load that raced one is not stored
+        self.generation = 0
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, values = entry
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return values
+
+    def set(self, user_id, values, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[user_id] = (time.monotonic() + get_ttl(), values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def get_cached_user(user_id):
+    """The User with primary key ``user_id``, or None if there is none."""
+    User = get_user_model()
+    attnames = [field.attname for field in User._meta.concrete_fields]
+    values = user_cache.get(user_id)
+    if values is None:
+        generation = user_cache.generation
+        values = User.objects.filter(pk=user_id).values_list(*attnames).first()
+        if values is None:
+            return None
+        user_cache.set(user_id, values, generation)
+    # A fresh instance per request, so nothing leaks between them
+    return User.from_db(DEFAULT_DB_ALIAS, attnames, values)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from exc
+
+        try:
+            user_id = self.user_model._meta.pk.to_python(user_id)
+        except Exception as exc:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from exc
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
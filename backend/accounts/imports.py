@@ -0,0 +1,190 @@
+"""
+Bulk creation of user accounts from CSV or NDJSON files.
+
+Rows are read lazily and handled a batch at a time: fields are checked in
+this process with one username query per batch, password validation and
+hashing (the expensive part) run in a pool of worker processes, and the
+accounts are written with ``bulk_create``. While one batch is inserted the
+workers are already hashing the next one.
+"""
+import csv
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+
+User = get_user_model()
+
+IMPORT_FIELDS = ('username', 'email', 'first_name', 'last_name', 'role', 'phone_number', 'address')
+
+
+def read_rows(path, file_format=None):
+    """
+    Yield ``(line, fields)`` for every record of the CSV or NDJSON file at
+    ``path``; the format follows the extension unless ``file_format`` is
+    given. Unparseable NDJSON lines yield a string instead of a dict.
+    """
+    file_format = file_format or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as source:
+        if file_format == 'csv':
+            reader = csv.DictReader(source)
+            for fields in reader:
+                yield reader.line_num, fields
+            return
+        for line, text in enumerate(source, start=1):
+            if not text.strip():
+                continue
+            try:
+                fields = json.loads(text)
+            except ValueError as exc:
+                yield line, f"Invalid JSON: {exc}"
+                continue
+            yield line, fields if isinstance(fields, dict) else "Each line must be a JSON object"
+
+
+def clean_fields(fields):
+    """Return ``(values, errors)`` for the importable model fields of a row."""
+    values = {}
+    errors = {}
+    for name in IMPORT_FIELDS:
+        field = User._meta.get_field(name)
+        raw = fields.get(name)
+        value = field.get_default() if raw in (None, '') else str(raw).strip()
+        try:
+            values[name] = field.clean(value, None)
+        except ValidationError as exc:
+            errors[name] = exc.messages
+    return values, errors
+
+
+def existing_usernames(usernames):
+    """The subset of ``usernames`` already taken, in statements SQLite accepts."""
+    step = connection.features.max_query_params or len(usernames) or 1
+    taken = set()
+    for start in range(0, len(usernames), step):
+        taken.update(User.objects.filter(username__in=usernames[start:start + step])
+                     .values_list('username', flat=True))
+    return taken
+
+
+def hash_passwords(rows, validate=True):
+    """
+    Validate and hash the passwords of ``rows``, ``[(line, fields,
+    password)]``, in a worker process. Returns ``[(line, hash, errors)]``;
+    an empty password gives an unusable one.
+    """
+    results = []
+    for line, fields, password in rows:
+        if password and validate:
+            try:
+                validate_password(password, User(**fields))
+            except ValidationError as exc:
+                results.append((line, None, {'password': exc.messages}))
+                continue
+        results.append((line, make_password(password or None), None))
+    return results
+
+
+class UserImport:
+    """
+    Import rows from ``read_rows``. ``on_error(line, fields, errors)`` is
+    called for every rejected row and ``on_batch(import)`` after each batch.
+    """
+
+    def __init__(self, workers=None, batch_size=1000, validate_passwords=True, dry_run=False,
+                 on_error=None, on_batch=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.validate_passwords = validate_passwords
+        self.dry_run = dry_run
+        self.on_error = on_error or (lambda line, fields, errors: None)
+        self.on_batch = on_batch or (lambda user_import: None)
+        self.created = 0
+        self.rejected = 0
+        self.seen = set()
+
+    def run(self, rows):
+        hash_chunk = partial(hash_passwords, validate=self.validate_passwords)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            # At most two batches in flight: one hashing, one being inserted
+            pending = deque()
+            batch = []
+            for line, fields in rows:
+                batch.append((line, fields))
+                if len(batch) >= self.batch_size:
+                    pending.append(self.submit(pool, hash_chunk, batch))
+                    batch = []
+                    if len(pending) > 1:
+                        self.finish(*pending.popleft())
+            if batch:
+                pending.append(self.submit(pool, hash_chunk, batch))
+            while pending:
+                self.finish(*pending.popleft())
+        return self.created, self.rejected
+
+    def reject(self, line, fields, errors):
+        self.rejected += 1
+        # Plain text passwords never reach the error report
+        self.on_error(line, {name: value for name, value in fields.items() if name != 'password'}, errors)
+
+    def submit(self, pool, hash_chunk, batch):
+        """Check the fields of ``batch`` and start hashing the passwords of the valid rows."""
+        candidates = {}
+        for line, fields in batch:
+            if not isinstance(fields, dict):
+                self.reject(line, {}, {'row': [fields]})
+                continue
+            values, errors = clean_fields(fields)
+            username = values.get('username')
+            if not errors and username in self.seen:
+                errors = {'username': ["Repeats an earlier row."]}
+            if errors:
+                self.reject(line, fields, errors)
+                continue
+            self.seen.add(username)
+            candidates[username] = (line, values, fields.get('password') or '')
+
+        for username in existing_usernames(list(candidates)):
+            line, values, _ = candidates.pop(username)
+            self.reject(line, values, {'username': ["A user with that username already exists."]})
+
+        rows = list(candidates.values())
+        chunk_size = max(len(rows) // self.workers, 1)
+        futures = [pool.submit(hash_chunk, rows[start:start + chunk_size])
+                   for start in range(0, len(rows), chunk_size)]
+        return {line: values for line, values, _ in rows}, futures
+
+    def finish(self, values_by_line, futures):
+        users = []
+        for future in futures:
+            for line, password, errors in future.result():
+                if errors:
+                    self.reject(line, values_by_line[line], errors)
+                else:
+                    users.append((line, User(password=password, **values_by_line[line])))
+        if not self.dry_run:
+            self.insert(users)
+        self.created += len(users)
+        self.on_batch(self)
+
+    def insert(self, users):
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create([user for _, user in users], batch_size=self.batch_size)
+        except IntegrityError:
+            # Someone registered one of these usernames since the batch was checked
+            taken = existing_usernames([user.username for _, user in users])
+            for line, user in users:
+                if user.username in taken:
+                    self.reject(line, {'username': user.username},
+                                {'username': ["A user with that username already exists."]})
+            users[:] = [(line, user) for line, user in users if user.username not in taken]
+            with transaction.atomic():
+                User.objects.bulk_create([user for _, user in users], batch_size=self.batch_size)
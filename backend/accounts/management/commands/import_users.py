@@ -0,0 +1,64 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.imports import UserImport, read_rows
+
+
+class Command(BaseCommand):
+    help = "Create user accounts from a CSV or NDJSON file, hashing passwords in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV with a header row, or NDJSON (.ndjson/.jsonl) with one object per line.")
+        parser.add_argument('--format', choices=('csv', 'ndjson'), help="Override the format implied by the extension.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--errors', help="Where to write rejected rows as NDJSON (default: <path>.errors.ndjson).")
+        parser.add_argument('--skip-password-validation', action='store_true',
+                            help="Do not run AUTH_PASSWORD_VALIDATORS on the imported passwords.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate every row without creating users.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        errors_path = options['errors'] or f"{path}.errors.ndjson"
+        errors_file = None
+        started = time.monotonic()
+
+        def on_error(line, fields, errors):
+            nonlocal errors_file
+            if errors_file is None:
+                errors_file = open(errors_path, 'w', encoding='utf-8')
+            errors_file.write(json.dumps({'line': line, 'fields': fields, 'errors': errors}) + '\n')
+
+        def on_batch(user_import):
+            elapsed = time.monotonic() - started
+            done = user_import.created + user_import.rejected
+            self.stdout.write(
+                f"{done} rows: {user_import.created} imported, {user_import.rejected} rejected "
+                f"({done / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+
+        user_import = UserImport(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            validate_passwords=not options['skip_password_validation'],
+            dry_run=options['dry_run'],
+            on_error=on_error,
+            on_batch=on_batch,
+        )
+        try:
+            created, rejected = user_import.run(read_rows(path, options['format']))
+        finally:
+            if errors_file is not None:
+                errors_file.close()
+
+        verb = "Validated" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {created} users in {time.monotonic() - started:.1f}s, rejected {rejected}"
+        ))
+        if rejected:
+            self.stderr.write(f"Rejected rows written to {errors_path}")
@@ -1,3 +1,113 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import user_cache
+from .models import User
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='pass', role='customer')
+        self.client = APIClient()
+        response = self.client.post('/api/token/', {'username': 'buyer', 'password': 'pass'})
+        self.access = response.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_tokens_carry_username_and_role(self):
+        token = AccessToken(self.access)
+        self.assertEqual((token['user_id'], token['username'], token['role']),
+                         (str(self.user.id), 'buyer', 'customer'))
+        response = self.client.post('/api/users/register/', {
+            'username': 'new', 'password': 'Str0ng-pass!', 'password2': 'Str0ng-pass!', 'email': 'n@example.com',
+            'first_name': 'N', 'last_name': 'U',
+        })
+        self.assertEqual(AccessToken(response.data['access'])['username'], 'new')
+
+    def test_repeat_requests_skip_the_users_table(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/users/me/').data['username'], 'buyer')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/users/me/').data['role'], 'customer')
+
+    def test_saving_the_user_drops_the_cached_copy(self):
+        self.client.get('/api/users/me/')
+        self.user.role = 'manager'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').data['role'], 'manager')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+        self.user.delete()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='taken', password='pass')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as target:
+            target.write(text)
+        return path
+
+    def import_users(self, path, *args):
+        out = StringIO()
+        call_command('import_users', path, '--workers', '2', '--batch-size', '3', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_imports_csv_and_reports_rejected_rows(self):
+        path = self.write('users.csv', '\n'.join([
+            'username,password,email,first_name,role',
+            *[f'student{i},Corr3ct-Horse-{i},s{i}@example.com,Student,customer' for i in range(5)],
+            'teacher,Corr3ct-Horse-t,t@example.com,Teacher,staff',
+            'taken,Corr3ct-Horse-x,,,',
+            'student1,Corr3ct-Horse-y,,,',
+            'weak,password,,,',
+            'badrole,Corr3ct-Horse-z,,,wizard',
+            'nopassword,,,,',
+        ]) + '\n')
+        output = self.import_users(path)
+        self.assertIn('Imported 7 users', output)
+        self.assertIn('rejected 4', output)
+
+        teacher = User.objects.get(username='teacher')
+        self.assertEqual((teacher.role, teacher.email), ('staff', 't@example.com'))
+        self.assertTrue(teacher.check_password('Corr3ct-Horse-t'))
+        self.assertEqual(User.objects.get(username='student3').role, 'customer')
+        self.assertFalse(User.objects.get(username='nopassword').has_usable_password())
+
+        with open(f'{path}.errors.ndjson', encoding='utf-8') as report:
+            rejected = {row['line']: row for row in map(json.loads, report)}
+        self.assertEqual(sorted(rejected), [8, 9, 10, 11])
+        self.assertIn('already exists', rejected[8]['errors']['username'][0])
+        self.assertIn('earlier row', rejected[9]['errors']['username'][0])
+        self.assertIn('password', rejected[10]['errors'])
+        self.assertIn('role', rejected[11]['errors'])
+        self.assertFalse(any('password' in row['fields'] for row in rejected.values()))
+
+    def test_ndjson_and_dry_run(self):
+        path = self.write('users.ndjson', '\n'.join([
+            json.dumps({'username': 'a', 'password': 'Corr3ct-Horse-a', 'role': 'manager'}),
+            'not json',
+            json.dumps({'username': 'b', 'password': 'Corr3ct-Horse-b'}),
+        ]))
+        output = self.import_users(path, '--dry-run')
+        self.assertIn('Validated 2 users', output)
+        self.assertFalse(User.objects.filter(username__in=['a', 'b']).exists())
+
+        self.import_users(path)
+        self.assertEqual(User.objects.get(username='a').role, 'manager')
@@ -0,0 +1,203 @@
+"""
+Concurrency benchmark for the SQLite settings in DATABASES.
+
+Runs checkout-like write transactions (read stock, insert an order and its
+items, decrement stock) and support-message inserts from several processes,
+alongside processes reading order lists, against a scratch database file.
+This is done once with SQLite's defaults (rollback journal, DEFERRED
+transactions, a new connection per transaction) and once with the
+configured pragmas, transaction mode and persistent connections.
+
+    python benchmark_sqlite.py --writers 8 --readers 2 --seconds 10
+
+"Lock wait" is the time taken to get the write lock. "Locked" counts
+transactions that failed with "database is locked".
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stem_kit_backend.settings')
+django.setup()
+
+from django.conf import settings
+
+PRODUCTS = 50
+
+SCHEMA = """
+CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, stock INTEGER NOT NULL);
+CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER, total REAL, created_at REAL);
+CREATE TABLE order_items (id INTEGER PRIMARY KEY, order_id INTEGER, product_id INTEGER, quantity INTEGER);
+CREATE TABLE support_messages (id INTEGER PRIMARY KEY, ticket_id INTEGER, message TEXT, created_at REAL);
+CREATE INDEX order_items_order_idx ON order_items (order_id);
+CREATE INDEX orders_customer_idx ON orders (customer_id, created_at);
+"""
+
+
+def configurations():
+    options = settings.DATABASES['default'].get('OPTIONS', {})
+    return {
+        'defaults': {'init_command': '', 'transaction_mode': 'DEFERRED', 'persistent': False},
+        'configured': {
+            'init_command': options.get('init_command', ''),
+            'transaction_mode': options.get('transaction_mode') or 'DEFERRED',
+            'persistent': bool(settings.DATABASES['default'].get('CONN_MAX_AGE')),
+        },
+    }
+
+
+def connect(path, config):
+    # Python's default 5 second busy timeout, as Django uses it
+    connection = sqlite3.connect(path, isolation_level=None)
+    for statement in config['init_command'].split(';'):
+        if statement.strip():
+            connection.execute(statement)
+    return connection
+
+
+def create_database(path, config):
+    connection = connect(path, config)
+    connection.executescript(SCHEMA)
+    connection.executemany('INSERT INTO products (id, name, stock) VALUES (?, ?, ?)',
+                           [(pk, f'Kit {pk}', 10 ** 9) for pk in range(1, PRODUCTS + 1)])
+    connection.close()
+
+
+def checkout(cursor, rng):
+    """Returns the seconds spent waiting for the write lock."""
+    items = [(rng.randint(1, PRODUCTS), rng.randint(1, 3)) for _ in range(rng.randint(1, 4))]
+    for product_id, _ in items:
+        cursor.execute('SELECT stock FROM products WHERE id = ?', (product_id,)).fetchone()
+    start = time.perf_counter()
+    cursor.execute('INSERT INTO orders (customer_id, total, created_at) VALUES (?, ?, ?)',
+                   (rng.randint(1, 1000), 10.0 * len(items), time.time()))
+    waited = time.perf_counter() - start
+    order_id = cursor.lastrowid
+    cursor.executemany('INSERT INTO order_items (order_id, product_id, quantity) VALUES (?, ?, ?)',
+                       [(order_id, product_id, quantity) for product_id, quantity in items])
+    cursor.executemany('UPDATE products SET stock = stock - ? WHERE id = ?',
+                       [(quantity, product_id) for product_id, quantity in items])
+    return waited
+
+
+def add_message(cursor, rng):
+    cursor.execute('SELECT COUNT(*) FROM support_messages WHERE ticket_id = ?', (rng.randint(1, 100),))
+    start = time.perf_counter()
+    cursor.execute('INSERT INTO support_messages (ticket_id, message, created_at) VALUES (?, ?, ?)',
+                   (rng.randint(1, 100), 'Still not working', time.time()))
+    return time.perf_counter() - start
+
+
+def write(path, config, seconds, seed):
+    rng = random.Random(seed)
+    connection = connect(path, config) if config['persistent'] else None
+    committed = locked = 0
+    waits = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if not config['persistent']:
+            connection = connect(path, config)
+        cursor = connection.cursor()
+        try:
+            start = time.perf_counter()
+            cursor.execute(f"BEGIN {config['transaction_mode']}")
+            waited = time.perf_counter() - start
+            waited += (checkout if rng.random() < 0.8 else add_message)(cursor, rng)
+            cursor.execute('COMMIT')
+            committed += 1
+            waits.append(waited)
+        except sqlite3.OperationalError as exc:
+            if 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            locked += 1
+        if not config['persistent']:
+            connection.close()
+    if config['persistent']:
+        connection.close()
+    return committed, locked, waits
+
+
+def read(path, config, seconds, seed):
+    rng = random.Random(seed)
+    connection = connect(path, config) if config['persistent'] else None
+    reads = locked = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if not config['persistent']:
+            connection = connect(path, config)
+        try:
+            connection.execute(
+                'SELECT o.id, o.total, COUNT(i.id) FROM orders o LEFT JOIN order_items i ON i.order_id = o.id '
+                'WHERE o.customer_id = ? GROUP BY o.id ORDER BY o.created_at DESC LIMIT 20',
+                (rng.randint(1, 1000),),
+            ).fetchall()
+            reads += 1
+        except sqlite3.OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            locked += 1
+        if not config['persistent']:
+            connection.close()
+    if config['persistent']:
+        connection.close()
+    return reads, locked
+
+
+def run(name, config, writers, readers, seconds):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f'{name}.sqlite3')
+        create_database(path, config)
+        with multiprocessing.Pool(writers + readers) as pool:
+            write_results = [pool.apply_async(write, (path, config, seconds, seed)) for seed in range(writers)]
+            read_results = [pool.apply_async(read, (path, config, seconds, writers + seed))
+                            for seed in range(readers)]
+            write_results = [result.get() for result in write_results]
+            read_results = [result.get() for result in read_results]
+
+    committed = sum(result[0] for result in write_results)
+    locked = sum(result[1] for result in write_results)
+    waits = sorted(wait * 1000 for result in write_results for wait in result[2])
+    reads = sum(result[0] for result in read_results)
+    read_locked = sum(result[1] for result in read_results)
+    attempts = committed + locked
+    return {
+        'writes/s': committed / seconds,
+        'locked': f'{locked} ({100 * locked / attempts if attempts else 0:.1f}%)',
+        'wait p50 ms': statistics.median(waits) if waits else 0.0,
+        'wait p95 ms': waits[int(len(waits) * 0.95)] if waits else 0.0,
+        'wait max ms': waits[-1] if waits else 0.0,
+        'reads/s': reads / seconds,
+        'reads locked': read_locked,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    results = {name: run(name, config, args.writers, args.readers, args.seconds)
+               for name, config in configurations().items()}
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:g}s each")
+    print(f"{'':<14}" + ''.join(f'{name:>14}' for name in results))
+    for metric in next(iter(results.values())):
+        cells = []
+        for result in results.values():
+            value = result[metric]
+            cells.append(f'{value:>14.1f}' if isinstance(value, float) else f'{value:>14}')
+        print(f'{metric:<14}' + ''.join(cells))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from jobs import queue
+
+
+def work(index, poll_interval, batch_size, burst):
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        close_old_connections()
+        jobs = queue.claim(worker_id, limit=batch_size)
+        for job in jobs:
+            queue.run(job)
+        if not jobs:
+            if burst:
+                break
+            time.sleep(poll_interval)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run background job workers in separate processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--batch-size', type=int, default=1,
+                            help="Jobs claimed per poll by each worker.")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once the queue is empty.")
+        parser.add_argument('--stats', action='store_true',
+                            help="Print queue statistics and exit.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            stats = queue.stats()
+            for row in stats['counts']:
+                self.stdout.write(f"{row['task']:<40} {row['status']:<10} {row['count']}")
+            self.stdout.write(f"Oldest due job waiting: {stats['oldest_due_seconds']:.1f}s")
+            return
+
+        # Children must open their own database connections
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=work,
+                args=(index, options['poll_interval'], options['batch_size'], options['burst']),
+                daemon=True,
+            )
+            for index in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {len(processes)} workers")
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
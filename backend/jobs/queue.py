@@ -0,0 +1,157 @@
+"""
+A small durable job queue on top of the ``jobs`` table.
+
+Apps register work with the ``task`` decorator in their ``tasks.py`` and
+schedule it with ``enqueue``; ``manage.py run_workers`` claims and runs
+jobs in separate processes, so no external broker is needed.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Retry delays grow as BACKOFF_BASE * 2 ** (attempt - 1), capped at BACKOFF_MAX
+BACKOFF_BASE = timedelta(seconds=10)
+BACKOFF_MAX = timedelta(hours=1)
+# Running jobs whose worker has not finished them in this long are reclaimed
+VISIBILITY_TIMEOUT = timedelta(minutes=15)
+
+_registry = {}
+
+
+class UnknownTask(Exception):
+    pass
+
+
+def task(name):
+    """Register the decorated function as the handler for ``name``."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, delay=None, max_attempts=5):
+    """
+    Queue ``name`` to run with ``payload`` (a JSON-serialisable dict passed
+    as keyword arguments). The job is written in the caller's transaction,
+    so it only becomes visible to workers if that transaction commits.
+    """
+    if name not in _registry:
+        raise UnknownTask(name)
+    run_at = timezone.now() + delay if delay else timezone.now()
+    return Job.objects.create(task=name, payload=payload or {}, run_at=run_at,
+                              max_attempts=max_attempts)
+
+
+def claim(worker_id, limit=1):
+    """
+    Atomically take up to ``limit`` due jobs for ``worker_id``.
+
+    Candidates are read first and then taken with a conditional UPDATE on
+    their previous state, so two workers racing for the same job can never
+    both win it.
+    """
+    now = timezone.now()
+    stale = now - VISIBILITY_TIMEOUT
+    # Jobs whose worker died on their last allowed attempt are given up on
+    Job.objects.filter(status='running', locked_at__lt=stale, attempts__gte=F('max_attempts')).update(
+        status='failed', finished_at=now, locked_by='', locked_at=None,
+        last_error='Worker lost while running the final attempt',
+    )
+    candidates = list(
+        Job.objects.filter(status='queued', run_at__lte=now)
+        .order_by('run_at', 'id').values_list('id', 'status', 'locked_at')[:limit]
+    )
+    if len(candidates) < limit:
+        candidates += list(
+            Job.objects.filter(status='running', locked_at__lt=stale)
+            .order_by('locked_at', 'id').values_list('id', 'status', 'locked_at')[:limit - len(candidates)]
+        )
+
+    claimed = []
+    for job_id, status, locked_at in candidates:
+        taken = Job.objects.filter(id=job_id, status=status, locked_at=locked_at).update(
+            status='running',
+            attempts=F('attempts') + 1,
+            locked_by=worker_id,
+            locked_at=now,
+        )
+        if taken:
+            claimed.append(job_id)
+    return list(Job.objects.filter(id__in=claimed).order_by('run_at', 'id'))
+
+
+def backoff(attempt):
+    return min(BACKOFF_BASE * 2 ** (attempt - 1), BACKOFF_MAX)
+
+
+def run(job):
+    """
+    Run a claimed job and record the outcome; returns the new status. The
+    handler's return value must be JSON-serialisable.
+    """
+    try:
+        func = _registry.get(job.task)
+        if func is None:
+            raise UnknownTask(job.task)
+        with transaction.atomic():
+            result = func(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_at = timezone.now() + backoff(job.attempts)
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+        logger.warning("Job %s (%s) failed on attempt %s/%s", job.id, job.task,
+                       job.attempts, job.max_attempts)
+    else:
+        job.status = 'succeeded'
+        job.result = result
+        job.last_error = ''
+        job.finished_at = timezone.now()
+
+    # Only record the outcome if the job was not reclaimed in the meantime
+    Job.objects.filter(id=job.id, locked_by=job.locked_by, locked_at=job.locked_at).update(
+        status=job.status,
+        run_at=job.run_at,
+        last_error=job.last_error,
+        result=job.result,
+        finished_at=job.finished_at,
+        locked_by='',
+        locked_at=None,
+    )
+    return job.status
+
+
+def run_pending(worker_id='inline', limit=None):
+    """Run due jobs in the current process until none are left."""
+    processed = 0
+    while limit is None or processed < limit:
+        jobs = claim(worker_id)
+        if not jobs:
+            break
+        for job in jobs:
+            run(job)
+            processed += 1
+    return processed
+
+
+def stats():
+    """Job counts per task and status, plus the age of the oldest due job."""
+    now = timezone.now()
+    counts = Job.objects.values('task', 'status').annotate(count=Count('id')).order_by('task', 'status')
+    oldest = Job.objects.filter(status='queued', run_at__lte=now).aggregate(oldest=Min('run_at'))['oldest']
+    return {
+        'counts': list(counts),
+        'oldest_due_seconds': (now - oldest).total_seconds() if oldest else 0,
+    }
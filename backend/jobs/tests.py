@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from . import queue
+from .models import Job
+
+calls = []
+
+
+@queue.task('tests.record')
+def record(value):
+    calls.append(value)
+    return {'value': value}
+
+
+@queue.task('tests.explode')
+def explode():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_and_run(self):
+        job = queue.enqueue('tests.record', {'value': 3})
+        self.assertEqual(queue.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.result, {'value': 3})
+        self.assertEqual(calls, [3])
+
+    def test_unknown_task_is_rejected(self):
+        with self.assertRaises(queue.UnknownTask):
+            queue.enqueue('tests.missing')
+
+    def test_claim_is_exclusive(self):
+        queue.enqueue('tests.record', {'value': 1})
+        first = queue.claim('worker-a')
+        second = queue.claim('worker-b')
+        self.assertEqual(len(first), 1)
+        self.assertEqual(second, [])
+        self.assertEqual(first[0].locked_by, 'worker-a')
+
+    def test_delayed_jobs_wait(self):
+        queue.enqueue('tests.record', {'value': 1}, delay=timedelta(minutes=5))
+        self.assertEqual(queue.run_pending(), 0)
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        job = queue.enqueue('tests.explode', max_attempts=2)
+        queue.run(queue.claim('worker')[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertIn('boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + queue.BACKOFF_BASE - timedelta(seconds=1))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        queue.run(queue.claim('worker')[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 2)
+
+    def test_stale_running_jobs_are_reclaimed(self):
+        job = queue.enqueue('tests.record', {'value': 7})
+        queue.claim('dead-worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - queue.VISIBILITY_TIMEOUT * 2)
+        self.assertEqual(queue.run_pending(), 1)
+        self.assertEqual(calls, [7])
+
+    def test_stats(self):
+        queue.enqueue('tests.record', {'value': 1})
+        stats = queue.stats()
+        self.assertEqual(stats['counts'], [{'task': 'tests.record', 'status': 'queued', 'count': 1}])
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Lab
+from .models import Lab, LabEntitlement
 
 @admin.register(Lab)
 class LabAdmin(admin.ModelAdmin):
@@ -7,3 +7,9 @@ class LabAdmin(admin.ModelAdmin):
     list_filter = ('status', 'created_at', 'updated_at')
     search_fields = ('title', 'description', 'content')
     raw_id_fields = ('product',)
+
+@admin.register(LabEntitlement)
+class LabEntitlementAdmin(admin.ModelAdmin):
+    list_display = ('customer', 'product', 'granted_at')
+    search_fields = ('customer__username', 'product__name')
+    raw_id_fields = ('customer', 'product')
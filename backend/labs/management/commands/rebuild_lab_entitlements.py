@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min
+
+from labs.models import LabEntitlement
+from orders.models import OrderItem
+
+
+class Command(BaseCommand):
+    help = "Rebuild the lab entitlement table from activated order items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pairs = (
+            OrderItem.objects.filter(labs_activated=True)
+            .exclude(order__status='cancelled')
+            .values('order__customer_id', 'product_id')
+            .annotate(granted_at=Min('order__updated_at'))
+            .order_by()
+        )
+
+        created = 0
+        with transaction.atomic():
+            LabEntitlement.objects.all().delete()
+            batch = []
+            for row in pairs.iterator(chunk_size=batch_size):
+                batch.append(LabEntitlement(
+                    customer_id=row['order__customer_id'],
+                    product_id=row['product_id'],
+                    granted_at=row['granted_at'],
+                ))
+                if len(batch) >= batch_size:
+                    LabEntitlement.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                LabEntitlement.objects.bulk_create(batch)
+                created += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {created} lab entitlements"))
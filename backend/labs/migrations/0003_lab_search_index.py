@@ -0,0 +1,49 @@
+from django.db import migrations
+
+# SQLite FTS5 index over labs(title, content), kept in sync by
+# triggers. Other database backends fall back to LIKE search.
+CREATE_SQL = [
+    """CREATE VIRTUAL TABLE labs_fts USING fts5(
+        title, content, content='labs', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER labs_fts_ai AFTER INSERT ON labs BEGIN
+        INSERT INTO labs_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    """CREATE TRIGGER labs_fts_ad AFTER DELETE ON labs BEGIN
+        INSERT INTO labs_fts(labs_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    """CREATE TRIGGER labs_fts_au AFTER UPDATE OF title, content ON labs BEGIN
+        INSERT INTO labs_fts(labs_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO labs_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    "INSERT INTO labs_fts(labs_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS labs_fts_au",
+    "DROP TRIGGER IF EXISTS labs_fts_ad",
+    "DROP TRIGGER IF EXISTS labs_fts_ai",
+    "DROP TABLE IF EXISTS labs_fts",
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labs', '0002_lab_entitlement'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(CREATE_SQL), run_sqlite(DROP_SQL)),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:01
+
+import gzip
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.html import linebreaks
+
+# Adding a column makes SQLite rebuild the labs table, which drops the
+# full-text search triggers from 0003; they are put back afterwards.
+TRIGGER_SQL = [
+    """CREATE TRIGGER IF NOT EXISTS labs_fts_ai AFTER INSERT ON labs BEGIN
+        INSERT INTO labs_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS labs_fts_ad AFTER DELETE ON labs BEGIN
+        INSERT INTO labs_fts(labs_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS labs_fts_au AFTER UPDATE OF title, content ON labs BEGIN
+        INSERT INTO labs_fts(labs_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO labs_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+]
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in TRIGGER_SQL:
+        schema_editor.execute(statement)
+
+
+def render_existing_content(apps, schema_editor):
+    Lab = apps.get_model('labs', 'Lab')
+    LabContent = apps.get_model('labs', 'LabContent')
+    # Walk ids rather than one open cursor: SQLite would see our own updates
+    ids = list(Lab.objects.values_list('id', flat=True))
+    for start in range(0, len(ids), 100):
+        for lab in Lab.objects.filter(id__in=ids[start:start + 100]).only('id', 'content'):
+            content_hash = hashlib.sha256(lab.content.encode('utf-8')).hexdigest()
+            rendered = linebreaks(lab.content, autoescape=True).encode('utf-8')
+            LabContent.objects.get_or_create(lab_id=lab.id, content_hash=content_hash, defaults={
+                'rendered_gzip': gzip.compress(rendered, compresslevel=9, mtime=0),
+                'rendered_size': len(rendered),
+            })
+            Lab.objects.filter(id=lab.id).update(content_hash=content_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labs', '0003_lab_search_index'),
+    ]
+
+    operations = [
+        # Runs last when migrating backwards, after the column is dropped again
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='lab',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='LabContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('rendered_gzip', models.BinaryField()),
+                ('rendered_size', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('lab', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='content_versions', to='labs.lab')),
+            ],
+            options={
+                'db_table': 'lab_contents',
+                'constraints': [models.UniqueConstraint(fields=('lab', 'content_hash'), name='lab_content_version')],
+            },
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(render_existing_content, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,21 @@
+import gzip
+import hashlib
+
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from django.utils.html import linebreaks
 from products.models import Product
 
+class LabQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """The labs ``user`` may open: customers only get published labs they have purchased."""
+        if user.role != 'customer':
+            return self
+        entitled = LabEntitlement.objects.filter(customer=user).values('product_id')
+        return self.filter(status='published', product_id__in=entitled)
+
+
 class Lab(models.Model):
     STATUS_CHOICES = (
         ('draft', 'Draft'),
@@ -12,15 +26,85 @@ class Lab(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     content = models.TextField()
+    # SHA-256 of content, identifies the current LabContent version
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='labs', null=True)
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='labs', null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = LabQuerySet.as_manager()
+
     class Meta:
         db_table = 'labs'
         ordering = ['-created_at']
 
     def __str__(self):
         return f"{self.title} - {self.product.name if self.product else 'No Product'}"
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        content_changed = False
+        if 'content' not in self.get_deferred_fields() and (update_fields is None or 'content' in update_fields):
+            content_hash = hashlib.sha256(self.content.encode('utf-8')).hexdigest()
+            content_changed = content_hash != self.content_hash
+            self.content_hash = content_hash
+            if content_changed and update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'content_hash'}
+        super().save(*args, **kwargs)
+        if content_changed:
+            LabContent.objects.get_or_create(
+                lab=self, content_hash=self.content_hash,
+                defaults=LabContent.render(self.content),
+            )
+            # Only the current version is ever served
+            self.content_versions.exclude(content_hash=self.content_hash).delete()
+
+class LabEntitlement(models.Model):
+    """
+    A customer's right to the labs of a product, kept in step with delivered
+    and cancelled orders so lab visibility is a single indexed lookup.
+    """
+    customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='lab_entitlements')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='lab_entitlements')
+    granted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'lab_entitlements'
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'product'], name='lab_entitlement_customer_product'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer.username} - {self.product.name}"
+
+class LabContent(models.Model):
+    """
+    A rendered, gzip-compressed version of a lab's content, keyed by the
+    hash of the source text. Rendering happens once, when the lab is saved,
+    and replaces the lab's previous version.
+    """
+    lab = models.ForeignKey(Lab, on_delete=models.CASCADE, related_name='content_versions')
+    content_hash = models.CharField(max_length=64)
+    rendered_gzip = models.BinaryField()
+    rendered_size = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'lab_contents'
+        constraints = [
+            models.UniqueConstraint(fields=['lab', 'content_hash'], name='lab_content_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.lab_id} @ {self.content_hash[:12]}"
+
+    @staticmethod
+    def render(content):
+        rendered = linebreaks(content, autoescape=True).encode('utf-8')
+        return {
+            'rendered_gzip': gzip.compress(rendered, compresslevel=9, mtime=0),
+            'rendered_size': len(rendered),
+        }
+
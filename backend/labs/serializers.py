@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from .models import Lab
 from accounts.serializers import UserSerializer
 from products.serializers import ProductSerializer
@@ -13,7 +14,14 @@ class LabSerializer(serializers.ModelSerializer):
 class LabDetailSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     author = UserSerializer(read_only=True)
+    # The body itself is served by the lab's content endpoint
+    content = serializers.CharField(write_only=True, required=False, allow_blank=True)
+    content_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Lab
-        fields = ['id', 'title', 'description', 'content', 'product', 'status', 'created_at', 'updated_at', 'author'] 
\ No newline at end of file
+        fields = ['id', 'title', 'description', 'content', 'content_hash', 'content_url', 'product', 'status',
+                  'created_at', 'updated_at', 'author']
+
+    def get_content_url(self, obj):
+        return reverse('lab-content', kwargs={'pk': obj.pk}, request=self.context.get('request')) 
\ No newline at end of file
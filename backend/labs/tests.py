@@ -1,3 +1,179 @@
+import gzip
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from orders.models import Order, OrderItem
+from products.models import Product
+from .models import Lab, LabEntitlement
+
+User = get_user_model()
+
+
+class LabEntitlementTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='buyer', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.product = Product.objects.create(name='Kit', description='', price=Decimal('5.00'), stock=10)
+        self.other_product = Product.objects.create(name='Other', description='', price=Decimal('5.00'), stock=10)
+        self.lab = Lab.objects.create(title='Lab', description='', content='', product=self.product, status='published')
+        Lab.objects.create(title='Draft', description='', content='', product=self.product, status='draft')
+        Lab.objects.create(title='Other lab', description='', content='', product=self.other_product, status='published')
+
+    def order(self, status='shipped', copies=1):
+        order = Order.objects.create(customer=self.customer, status=status,
+                                     total_amount=Decimal('5.00'), shipping_address='x')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.product, quantity=1, price=Decimal('5.00'))
+            for _ in range(copies)
+        ])
+        return order
+
+    def visible_titles(self):
+        response = self.client.get('/api/labs/')
+        self.assertEqual(response.status_code, 200)
+        return [lab['title'] for lab in response.data]
+
+    def test_delivery_grants_and_cancellation_revokes(self):
+        order = self.order(copies=2)
+        self.assertEqual(self.visible_titles(), [])
+
+        Order.objects.filter(pk=order.pk).set_status('delivered')
+        self.assertEqual(LabEntitlement.objects.filter(customer=self.customer).count(), 1)
+        # Two lines for the same product must not duplicate the lab
+        self.assertEqual(self.visible_titles(), ['Lab'])
+
+        Order.objects.filter(pk=order.pk).set_status('cancelled')
+        self.assertFalse(LabEntitlement.objects.exists())
+        self.assertEqual(self.visible_titles(), [])
+
+    def test_refund_through_status_update_revokes(self):
+        order = self.order()
+        staff = APIClient()
+        staff.force_authenticate(User.objects.create_user(username='staff', password='pass', role='staff'))
+        for new_status in ('delivered', 'cancelled'):
+            response = staff.post(f'/api/orders/{order.pk}/update_status/', {'status': new_status})
+            self.assertEqual(response.status_code, 200)
+            if new_status == 'delivered':
+                self.assertEqual(self.visible_titles(), ['Lab'])
+        self.assertFalse(response.data['items'][0]['labs_activated'])
+        self.assertFalse(LabEntitlement.objects.exists())
+        self.assertEqual(self.visible_titles(), [])
+
+    def test_cancellation_keeps_entitlement_from_other_orders(self):
+        first, second = self.order(), self.order()
+        Order.objects.filter(pk__in=[first.pk, second.pk]).set_status('delivered')
+        Order.objects.filter(pk=first.pk).set_status('cancelled')
+        self.assertEqual(self.visible_titles(), ['Lab'])
+
+    def test_visibility_does_not_scan_orders(self):
+        Order.objects.filter(pk=self.order().pk).set_status('delivered')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.visible_titles(), ['Lab'])
+        lab_queries = [query['sql'] for query in queries.captured_queries if 'FROM "labs"' in query['sql']]
+        self.assertEqual(len(lab_queries), 1)
+        self.assertNotIn('order_items', lab_queries[0])
+
+    def test_detail_hides_drafts_and_unpurchased_labs(self):
+        Order.objects.filter(pk=self.order().pk).set_status('delivered')
+        draft = Lab.objects.get(title='Draft')
+        other = Lab.objects.get(title='Other lab')
+        self.assertEqual(self.client.get(f'/api/labs/{self.lab.pk}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/labs/{draft.pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/labs/{other.pk}/').status_code, 404)
+
+    def test_only_managers_edit_labs(self):
+        response = self.client.patch(f'/api/labs/{self.lab.pk}/', {'title': 'Mine'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        manager = User.objects.create_user(username='manager', password='pass', role='manager')
+        self.client.force_authenticate(manager)
+        response = self.client.patch(f'/api/labs/{self.lab.pk}/', {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.lab.refresh_from_db()
+        self.assertEqual(self.lab.title, 'Renamed')
+
+    def test_rebuild_command(self):
+        order = self.order()
+        Order.objects.filter(pk=order.pk).set_status('delivered')
+        LabEntitlement.objects.all().delete()
+        self.order(status='cancelled')
+        out = StringIO()
+        call_command('rebuild_lab_entitlements', stdout=out)
+        self.assertIn('Rebuilt 1 lab entitlements', out.getvalue())
+        self.assertEqual(self.visible_titles(), ['Lab'])
+
+
+class LabContentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='staff', password='pass', role='staff')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.body = 'Step <1>\n\n' + 'Wire the LED. ' * 2000
+        self.lab = Lab.objects.create(title='Blink', description='', content=self.body, status='published')
+        self.url = f'/api/labs/{self.lab.pk}/content/'
+
+    def test_save_keeps_only_the_current_version(self):
+        self.assertEqual(len(self.lab.content_hash), 64)
+        first = self.lab.content_versions.get()
+        self.lab.title = 'Renamed'
+        self.lab.save()
+        self.assertEqual(self.lab.content_versions.get(), first)
+        self.lab.content = 'New body'
+        self.lab.save()
+        version = self.lab.content_versions.get()
+        self.assertEqual(version.content_hash, self.lab.content_hash)
+        self.assertEqual(gzip.decompress(version.rendered_gzip), b'<p>New body</p>')
+
+    def test_gzip_passthrough_and_etag(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        html = gzip.decompress(response.content).decode()
+        self.assertTrue(html.startswith('<p>Step &lt;1&gt;</p>'))
+        self.assertLess(len(response.content), len(html) / 10)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_gzip_q_values(self):
+        for header, gzipped in [('gzip;q=0', False), ('gzip; q=0.0, identity', False),
+                                ('deflate, gzip;q=0.5', True), ('*', True), ('*;q=0', False),
+                                ('br, *;q=0.1, gzip;q=0', False), ('identity', False)]:
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING=header)
+            self.assertEqual(response.get('Content-Encoding') == 'gzip', gzipped, header)
+
+    def test_range_requests(self):
+        full = self.client.get(self.url).content
+        response = self.client.get(self.url, HTTP_RANGE='bytes=3-9', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 206)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response.content, full[3:10])
+        self.assertEqual(response['Content-Range'], f'bytes 3-9/{len(full)}')
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=-5').content, full[-5:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE=f'bytes={len(full)}-').status_code, 416)
+
+    def test_customers_only_read_entitled_content(self):
+        customer = User.objects.create_user(username='buyer', password='pass')
+        product = Product.objects.create(name='Kit', description='', price=Decimal('5.00'), stock=10)
+        draft = Lab.objects.create(title='Draft', description='', content='Secret', product=product)
+        self.lab.product = product
+        self.lab.save()
+        self.client.force_authenticate(customer)
+        self.assertEqual(self.client.get(f'/api/labs/{draft.pk}/content/').status_code, 404)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        LabEntitlement.objects.create(customer=customer, product=product)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get(f'/api/labs/{draft.pk}/content/').status_code, 404)
 
-# Create your tests here.
+    def test_lists_do_not_load_content(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/labs/')
+        self.assertNotIn('"content"', queries.captured_queries[0]['sql'])
@@ -1,12 +1,135 @@
+import gzip
+import re
+
+from django.http import HttpResponse
 from django.shortcuts import render
-from rest_framework import viewsets
+from django.utils.http import parse_etags
+from rest_framework import permissions, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
-from .models import Lab
-from .serializers import LabSerializer
+from .models import Lab, LabContent
+from .serializers import LabSerializer, LabDetailSerializer
+from products.search import FullTextSearchMixin
 
 # Create your views here.
 
-class LabViewSet(viewsets.ModelViewSet):
-    queryset = Lab.objects.all()
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` (inclusive) for a single-range ``Range`` header,
+    ``None`` to serve the whole body, or ``False`` if it is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # Malformed and multi-range requests get the full body
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            return False
+    else:
+        length = int(last)
+        if length == 0:
+            return False
+        start = max(size - length, 0)
+        end = size - 1
+    return start, end
+
+
+def accepts_gzip(header):
+    """
+    Whether an ``Accept-Encoding`` header allows gzip: listed, or covered by
+    ``*``, with a non-zero q-value. ``gzip;q=0`` refuses it.
+    """
+    qualities = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+class IsManagerOrReadOnly(permissions.BasePermission):
+    def has_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        return request.user and request.user.role in ['admin', 'manager']
+
+
+class LabContentMixin:
+    """
+    Serves a lab's pre-rendered content from ``<lab>/content/`` with ETag
+    revalidation, single byte ranges, and the stored gzip body sent as-is
+    to clients that accept it.
+    """
+
+    @action(detail=True, methods=['get'])
+    def content(self, request, pk=None):
+        # Through get_queryset, so customers only reach labs they are entitled to
+        lab = self.get_object()
+        version = LabContent.objects.filter(lab=lab, content_hash=lab.content_hash).first()
+        if version is None:
+            return HttpResponse(status=404)
+
+        etag = f'"{version.content_hash}"'
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            response = HttpResponse(status=304)
+            response['ETag'] = etag
+            return response
+
+        range_header = request.headers.get('Range')
+        if accepts_gzip(request.headers.get('Accept-Encoding', '')) and not range_header:
+            response = HttpResponse(bytes(version.rendered_gzip), content_type='text/html; charset=utf-8')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            # Ranges are served over the identity encoding
+            body = gzip.decompress(version.rendered_gzip)
+            byte_range = parse_range(range_header, len(body)) if range_header else None
+            if byte_range is False:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{len(body)}'
+            elif byte_range:
+                start, end = byte_range
+                response = HttpResponse(body[start:end + 1], status=206, content_type='text/html; charset=utf-8')
+                response['Content-Range'] = f'bytes {start}-{end}/{len(body)}'
+            else:
+                response = HttpResponse(body, content_type='text/html; charset=utf-8')
+
+        response['ETag'] = etag
+        response['Accept-Ranges'] = 'bytes'
+        response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class LabViewSet(LabContentMixin, FullTextSearchMixin, viewsets.ModelViewSet):
+    queryset = Lab.objects.defer('content')
     serializer_class = LabSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsManagerOrReadOnly]
+    search_fts_table = 'labs_fts'
+    search_fields = ('title', 'content')
+    read_replica_actions = ('list',)
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return LabDetailSerializer
+        return LabSerializer
+
+    def get_queryset(self):
+        # The body is served from the content action, never with the row
+        return Lab.objects.defer('content').visible_to(self.request.user)
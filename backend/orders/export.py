@@ -0,0 +1,71 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import OrderItem
+
+EXPORT_CHUNK_SIZE = 2000
+# Rows are joined into blocks of about this many characters before being sent
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+# (column name, OrderItem lookup) for every exported order item row
+EXPORT_COLUMNS = (
+    ('order_id', 'order_id'),
+    ('order_created_at', 'order__created_at'),
+    ('order_status', 'order__status'),
+    ('customer_id', 'order__customer_id'),
+    ('order_total', 'order__total_amount'),
+    ('item_id', 'id'),
+    ('product_id', 'product_id'),
+    ('product_name', 'product__name'),
+    ('quantity', 'quantity'),
+    ('price', 'price'),
+    ('labs_activated', 'labs_activated'),
+)
+
+
+class Echo:
+    """File-like object that hands back what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(orders):
+    """
+    Stream one tuple per order item of ``orders`` straight from the cursor,
+    without building model instances or holding more than a chunk in memory.
+    """
+    return (
+        OrderItem.objects.filter(order__in=orders.values('id'))
+        .order_by('order_id', 'id')
+        .values_list(*(lookup for _, lookup in EXPORT_COLUMNS))
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def buffered(lines):
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    # The header goes out on its own so the client sees a first byte at once
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    yield from buffered(writer.writerow(row) for row in rows)
+
+
+def iter_ndjson(rows):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    encoder = DjangoJSONEncoder()
+    yield from buffered(encoder.encode(dict(zip(names, row))) + '\n' for row in rows)
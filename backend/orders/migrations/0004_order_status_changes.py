@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def log_existing_orders(apps, schema_editor):
+    # Only the placement and the current status are known for existing
+    # orders; the last update stands in for when that status was reached
+    Order = apps.get_model('orders', 'Order')
+    OrderStatusChange = apps.get_model('orders', 'OrderStatusChange')
+    changes = []
+    for order_id, status, created_at, updated_at in Order.objects.values_list(
+            'id', 'status', 'created_at', 'updated_at').iterator(chunk_size=1000):
+        changes.append(OrderStatusChange(order_id=order_id, to_status='pending', changed_at=created_at))
+        if status != 'pending':
+            changes.append(OrderStatusChange(order_id=order_id, from_status='pending', to_status=status,
+                                             changed_at=updated_at))
+        if len(changes) >= 1000:
+            OrderStatusChange.objects.bulk_create(changes)
+            changes = []
+    OrderStatusChange.objects.bulk_create(changes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_item_product_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, max_length=20)),
+                ('to_status', models.CharField(max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_changes', to='orders.order')),
+            ],
+            options={
+                'db_table': 'order_status_changes',
+                'ordering': ['changed_at', 'id'],
+                'indexes': [models.Index(fields=['order', 'to_status', 'changed_at'], name='order_status_changes_order_idx'), models.Index(fields=['to_status', 'changed_at'], name='order_status_changes_to_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_orders, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,50 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 from products.models import Product
+from labs.models import LabEntitlement
+from .signals import order_status_changed
+
+class OrderQuerySet(models.QuerySet):
+    def set_status(self, new_status):
+        """
+        Move every order in the queryset to ``new_status`` with set-based
+        UPDATEs and return the number of orders changed. Delivered orders
+        get their labs activated and entitlements granted in the same pass;
+        cancelled orders lose them. ``order_status_changed`` is sent with the
+        orders that were changed, and every order that really moved is
+        appended to the OrderStatusChange log.
+        """
+        with transaction.atomic(savepoint=False):
+            now = timezone.now()
+            changed = list(self.values_list('id', 'customer_id', 'status'))
+            # Items first: the queryset may filter on the status being replaced
+            items = OrderItem.objects.filter(order__in=self.values('id'))
+            if new_status == 'delivered':
+                items.update(labs_activated=True)
+                grant_lab_entitlements(items)
+            elif new_status == 'cancelled':
+                pairs = list(items.filter(labs_activated=True).values_list('order__customer_id', 'product_id').distinct())
+                items.update(labs_activated=False)
+            updated = self.update(status=new_status, updated_at=now)
+            if new_status == 'cancelled' and pairs:
+                revoke_lab_entitlements(pairs)
+            OrderStatusChange.objects.bulk_create([
+                OrderStatusChange(order_id=order_id, from_status=old_status, to_status=new_status, changed_at=now)
+                for order_id, _, old_status in changed
+                if old_status != new_status
+            ])
+            if order_status_changed.has_listeners(Order):
+                previous = {}
+                for order_id, _, old_status in changed:
+                    previous.setdefault(old_status, []).append(order_id)
+                order_status_changed.send(
+                    sender=Order,
+                    orders=[(order_id, customer_id) for order_id, customer_id, _ in changed],
+                    status=new_status,
+                    previous=previous,
+                )
+            return updated
 
 class Order(models.Model):
     STATUS_CHOICES = (
@@ -10,6 +54,15 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     )
+
+    # Statuses bulk_update_status may move an order to from each status
+    STATUS_TRANSITIONS = {
+        'pending': ('processing', 'shipped', 'cancelled'),
+        'processing': ('shipped', 'cancelled'),
+        'shipped': ('delivered',),
+        'delivered': (),
+        'cancelled': (),
+    }
     
     customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -17,9 +70,15 @@ class Order(models.Model):
     shipping_address = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OrderQuerySet.as_manager()
     
     class Meta:
         db_table = 'orders'
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='orders_created_id_idx'),
+            models.Index(fields=['customer', '-created_at', '-id'], name='orders_customer_created_idx'),
+        ]
         
     def __str__(self):
         return f"Order #{self.id} - {self.customer.username}"
@@ -33,6 +92,55 @@ class OrderItem(models.Model):
     
     class Meta:
         db_table = 'order_items'
+        indexes = [
+            models.Index(fields=['product', 'order'], name='order_items_product_order_idx'),
+        ]
         
     def __str__(self):
         return f"{self.product.name} x {self.quantity} - Order #{self.order.id}"
+
+class OrderStatusChange(models.Model):
+    """
+    Append-only log of status transitions. Placing an order records its
+    initial status with an empty ``from_status``.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_changes')
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'order_status_changes'
+        ordering = ['changed_at', 'id']
+        indexes = [
+            models.Index(fields=['order', 'to_status', 'changed_at'], name='order_status_changes_order_idx'),
+            models.Index(fields=['to_status', 'changed_at'], name='order_status_changes_to_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status or '-'} -> {self.to_status}"
+
+def grant_lab_entitlements(items):
+    """Grant every customer the labs of the products in ``items``."""
+    pairs = items.values_list('order__customer_id', 'product_id').distinct()
+    LabEntitlement.objects.bulk_create(
+        [LabEntitlement(customer_id=customer_id, product_id=product_id) for customer_id, product_id in pairs],
+        ignore_conflicts=True,
+    )
+
+def revoke_lab_entitlements(pairs):
+    """
+    Drop the entitlements for ``(customer_id, product_id)`` pairs that are no
+    longer backed by any activated order item.
+    """
+    customer_ids = {customer_id for customer_id, _ in pairs}
+    product_ids = {product_id for _, product_id in pairs}
+    still_owned = OrderItem.objects.filter(
+        order__customer=models.OuterRef('customer'),
+        product=models.OuterRef('product'),
+        labs_activated=True,
+    )
+    LabEntitlement.objects.filter(
+        customer_id__in=customer_ids, product_id__in=product_ids
+    ).exclude(models.Exists(still_owned)).delete()
+
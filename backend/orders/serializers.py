@@ -1,44 +1,137 @@
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Case, F, Prefetch, Q, When, prefetch_related_objects
 from rest_framework import serializers
-from .models import Order, OrderItem
+from .models import Order, OrderItem, OrderStatusChange
+from .signals import order_placed
 from products.models import Product
-from products.serializers import ProductSerializer
+from products.serializers import ProductSerializer, ProductSummarySerializer
+
+# Upper bound on the number of products touched by one conditional stock
+# UPDATE, keeps the generated WHERE/CASE clauses well inside SQLite's
+# expression depth limit on very large carts.
+STOCK_UPDATE_BATCH_SIZE = 100
 
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
-    
+
     class Meta:
         model = OrderItem
         fields = ('id', 'product', 'product_id', 'quantity', 'price', 'labs_activated')
         read_only_fields = ('price', 'labs_activated')
+        extra_kwargs = {
+            'quantity': {'min_value': 1}
+        }
+
+class OrderItemListSerializer(serializers.ModelSerializer):
+    product = ProductSummarySerializer(read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ('id', 'product', 'quantity', 'price', 'labs_activated')
+        read_only_fields = fields
+
+class OrderListSerializer(serializers.ModelSerializer):
+    items = OrderItemListSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ('id', 'customer', 'status', 'total_amount', 'shipping_address',
+                 'created_at', 'updated_at', 'items')
+        read_only_fields = fields
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
     total_amount = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    
+
     class Meta:
         model = Order
-        fields = ('id', 'customer', 'status', 'total_amount', 'shipping_address', 
+        fields = ('id', 'customer', 'status', 'total_amount', 'shipping_address',
                  'created_at', 'updated_at', 'items')
         read_only_fields = ('customer', 'status', 'total_amount')
-    
+
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError("An order must contain at least one item.")
+        return items
+
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        order = Order.objects.create(total_amount=0, **validated_data)
-        
-        total_amount = 0
+
+        # Merge repeated lines for the same product so stock is reserved once
+        quantities = OrderedDict()
         for item_data in items_data:
-            product = Product.objects.get(id=item_data['product_id'])
-            price = product.price * item_data['quantity']
-            total_amount += price
-            
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=item_data['quantity'],
-                price=price
-            )
-        
-        order.total_amount = total_amount
-        order.save()
-        return order 
\ No newline at end of file
+            product_id = item_data['product_id']
+            quantities[product_id] = quantities.get(product_id, 0) + item_data.get('quantity', 1)
+
+        try:
+            with transaction.atomic():
+                products = Product.objects.only('id', 'name', 'price').in_bulk(list(quantities))
+                missing = [product_id for product_id in quantities if product_id not in products]
+                if missing:
+                    raise serializers.ValidationError(
+                        {'items': [f"Product {product_id} does not exist." for product_id in missing]}
+                    )
+
+                reserve_stock(quantities)
+
+                order_items = []
+                total_amount = 0
+                for product_id, quantity in quantities.items():
+                    product = products[product_id]
+                    price = product.price * quantity
+                    total_amount += price
+                    order_items.append(OrderItem(product=product, quantity=quantity, price=price))
+
+                order = Order.objects.create(total_amount=total_amount, **validated_data)
+                OrderStatusChange.objects.create(order=order, to_status=order.status, changed_at=order.created_at)
+                for order_item in order_items:
+                    order_item.order = order
+                OrderItem.objects.bulk_create(order_items)
+                order_placed.send(sender=Order, order=order, items=order_items)
+        except InsufficientStock as exc:
+            # The reservation has been rolled back, so the stock read here is
+            # what the other buyers left us.
+            available = Product.objects.filter(id__in=exc.product_ids).values_list('id', 'name', 'stock')
+            raise serializers.ValidationError({'items': [
+                f"Insufficient stock for {name}: {stock} left, {quantities[product_id]} requested."
+                for product_id, name, stock in available
+                if stock < quantities[product_id]
+            ] or ["Insufficient stock."]})
+
+        # One query for the nested representation instead of one per line
+        prefetch_related_objects(
+            [order], Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        )
+        return order
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(product_ids)
+        self.product_ids = product_ids
+
+def reserve_stock(quantities):
+    """
+    Decrement ``Product.stock`` for every ``{product_id: quantity}`` pair.
+
+    Each batch is a single ``UPDATE ... WHERE stock >= qty`` so concurrent
+    checkouts can never take more units than are left. Raises
+    InsufficientStock when any product in a batch is short; the caller's
+    transaction is expected to roll back the partial update.
+    """
+    product_ids = list(quantities)
+    for start in range(0, len(product_ids), STOCK_UPDATE_BATCH_SIZE):
+        batch = product_ids[start:start + STOCK_UPDATE_BATCH_SIZE]
+        condition = Q()
+        decrement = []
+        for product_id in batch:
+            condition |= Q(id=product_id, stock__gte=quantities[product_id])
+            decrement.append(When(id=product_id, then=quantities[product_id]))
+
+        updated = Product.objects.filter(condition).update(
+            stock=F('stock') - Case(*decrement, default=0)
+        )
+        if updated != len(batch):
+            raise InsufficientStock(batch)
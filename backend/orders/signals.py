@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent by OrderQuerySet.set_status inside its transaction with ``orders``
+# (a list of ``(order_id, customer_id)``), the new ``status`` and
+# ``previous`` (``{old_status: [order_id, ...]}``)
+order_status_changed = Signal()
+
+# Sent by OrderSerializer.create once an order and its ``items`` are saved
+order_placed = Signal()
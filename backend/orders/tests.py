@@ -1,3 +1,303 @@
-from django.test import TestCase
+import csv
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from products.models import Product
+from .models import Order, OrderItem, OrderStatusChange
+
+User = get_user_model()
+
+
+class OrderCreateTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='buyer', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.products = [
+            Product.objects.create(name=f'Kit {i}', description='', price=Decimal('10.00'), stock=5)
+            for i in range(20)
+        ]
+
+    def post_order(self, items):
+        return self.client.post('/api/orders/', {
+            'shipping_address': '1 Main St',
+            'items': items,
+        }, format='json')
+
+    def test_create_reserves_stock_and_totals(self):
+        response = self.post_order([
+            {'product_id': self.products[0].id, 'quantity': 2},
+            {'product_id': self.products[1].id, 'quantity': 1},
+            {'product_id': self.products[0].id, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Decimal(response.data['total_amount']), Decimal('40.00'))
+        self.assertEqual(len(response.data['items']), 2)
+        self.products[0].refresh_from_db()
+        self.products[1].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 2)
+        self.assertEqual(self.products[1].stock, 4)
+
+    def test_oversell_is_rejected_and_rolled_back(self):
+        response = self.post_order([
+            {'product_id': self.products[0].id, 'quantity': 1},
+            {'product_id': self.products[1].id, 'quantity': 6},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Kit 1', str(response.data['items']))
+        self.assertFalse(Order.objects.exists())
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 5)
+
+    def test_unknown_product_is_rejected(self):
+        response = self.post_order([{'product_id': 999999, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        small = [{'product_id': p.id, 'quantity': 1} for p in self.products[:2]]
+        large = [{'product_id': p.id, 'quantity': 1} for p in self.products]
+        # Six of these keep the report rollups current, one logs the status
+        with self.assertNumQueries(14):
+            self.assertEqual(self.post_order(small).status_code, 201)
+        with self.assertNumQueries(14):
+            self.assertEqual(self.post_order(large).status_code, 201)
+        self.assertEqual(OrderItem.objects.count(), 22)
+
+
+class OrderListTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='pass', role='manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+        products = [
+            Product.objects.create(name=f'Kit {i}', description='long text', price=Decimal('5.00'), stock=100)
+            for i in range(3)
+        ]
+        orders = Order.objects.bulk_create([
+            Order(customer=self.manager, total_amount=Decimal('15.00'), shipping_address='x')
+            for _ in range(25)
+        ])
+        # Identical timestamps make sure ties are broken by id
+        Order.objects.update(created_at=orders[0].created_at)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price=product.price)
+            for order in orders for product in products
+        ])
+
+    def test_cursor_walks_every_order_once(self):
+        seen = []
+        url = '/api/orders/?page_size=10'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(order['id'] for order in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_list_is_compact_and_query_count_is_fixed(self):
+        with self.assertNumQueries(2):
+            small = self.client.get('/api/orders/?page_size=2')
+        with self.assertNumQueries(2):
+            large = self.client.get('/api/orders/?page_size=25')
+        self.assertEqual(len(small.data['results']), 2)
+        self.assertEqual(len(large.data['results']), 25)
+        product = large.data['results'][0]['items'][0]['product']
+        self.assertNotIn('description', product)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/orders/?cursor=nope').status_code, 404)
+
+
+class OrderStatusTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='buyer', password='pass')
+        self.staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.product = Product.objects.create(name='Kit', description='', price=Decimal('5.00'), stock=10)
+
+    def make_orders(self, count, status):
+        orders = Order.objects.bulk_create([
+            Order(customer=self.customer, status=status, total_amount=Decimal('5.00'), shipping_address='x')
+            for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.product, quantity=1, price=Decimal('5.00'))
+            for order in orders
+        ])
+        return [order.id for order in orders]
+
+    def test_single_update_allows_corrections(self):
+        order_id = self.make_orders(1, 'delivered')[0]
+        response = self.client.post(f'/api/orders/{order_id}/update_status/', {'status': 'processing'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'processing')
+        response = self.client.post(f'/api/orders/{order_id}/update_status/', {'status': 'pending'})
+        self.assertEqual(response.data['status'], 'pending')
+
+    def test_single_update_activates_labs(self):
+        order_id = self.make_orders(1, 'shipped')[0]
+        response = self.client.post(f'/api/orders/{order_id}/update_status/', {'status': 'delivered'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'delivered')
+        self.assertTrue(response.data['items'][0]['labs_activated'])
+
+    def test_status_changes_are_logged(self):
+        self.client.force_authenticate(User.objects.create_user(username='manager', password='pass',
+                                                                role='manager'))
+        order_id = self.make_orders(1, 'pending')[0]
+        self.client.post(f'/api/orders/{order_id}/update_status/', {'status': 'processing'})
+        self.client.post(f'/api/orders/{order_id}/update_status/', {'status': 'processing'})
+        others = self.make_orders(2, 'processing')
+        self.client.post('/api/orders/bulk_update_status/', {'ids': [order_id, *others], 'status': 'shipped'},
+                         format='json')
+        changes = OrderStatusChange.objects.filter(order_id=order_id).values_list('from_status', 'to_status')
+        self.assertEqual(list(changes), [('pending', 'processing'), ('processing', 'shipped')])
+        self.assertEqual(OrderStatusChange.objects.filter(to_status='shipped').count(), 3)
+
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/orders/', {
+            'shipping_address': 'x', 'items': [{'product_id': self.product.id, 'quantity': 1}],
+        }, format='json')
+        change = OrderStatusChange.objects.get(order_id=response.data['id'])
+        self.assertEqual((change.from_status, change.to_status), ('', 'pending'))
+
+    def test_bulk_update_reports_per_id_results(self):
+        shipped = self.make_orders(3, 'shipped')
+        cancelled = self.make_orders(1, 'cancelled')
+        delivered = self.make_orders(1, 'delivered')
+        pending = self.make_orders(1, 'pending')
+        response = self.client.post('/api/orders/bulk_update_status/', {
+            'ids': shipped + cancelled + delivered + pending + [999999],
+            'status': 'delivered',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 3)
+        results = {row['id']: row['result'] for row in response.data['results']}
+        self.assertEqual([results[i] for i in shipped], ['updated'] * 3)
+        self.assertEqual(results[cancelled[0]], 'invalid_transition')
+        self.assertEqual(results[delivered[0]], 'unchanged')
+        # Staff cannot see pending orders
+        self.assertEqual(results[pending[0]], 'not_found')
+        self.assertEqual(results[999999], 'not_found')
+        self.assertEqual(OrderItem.objects.filter(order_id__in=shipped, labs_activated=True).count(), 3)
+        self.assertFalse(OrderItem.objects.filter(order_id__in=cancelled, labs_activated=True).exists())
+
+    def test_bulk_update_query_count(self):
+        ids = self.make_orders(2000, 'shipped')
+        # Per batch of ids: select, changed orders, items, entitlement pairs,
+        # entitlement insert, orders and two statements per status rollup row,
+        # plus the status log inserts of up to 249 rows each
+        with self.assertNumQueries(41):
+            response = self.client.post('/api/orders/bulk_update_status/', {
+                'ids': ids, 'status': 'delivered',
+            }, format='json')
+        self.assertEqual(response.data['updated'], 2000)
+
+    def test_bulk_update_requires_staff(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/orders/bulk_update_status/', {
+            'ids': [1], 'status': 'shipped',
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='pass', role='manager')
+        self.customer = User.objects.create_user(username='buyer', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+        product = Product.objects.create(name='Kit, large', description='', price=Decimal('5.00'), stock=10)
+        self.old, self.new = Order.objects.bulk_create([
+            Order(customer=self.customer, status='delivered', total_amount=Decimal('10.00'), shipping_address='x'),
+            Order(customer=self.customer, status='pending', total_amount=Decimal('5.00'), shipping_address='y'),
+        ])
+        Order.objects.filter(pk=self.old.pk).update(created_at=self.old.created_at - timedelta(days=10))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=self.old, product=product, quantity=2, price=Decimal('10.00')),
+            OrderItem(order=self.new, product=product, quantity=1, price=Decimal('5.00')),
+        ])
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        rows = list(csv.DictReader(self.read(self.client.get('/api/orders/export/')).splitlines()))
+        self.assertEqual([row['order_id'] for row in rows], [str(self.old.pk), str(self.new.pk)])
+        self.assertEqual(rows[0]['product_name'], 'Kit, large')
+        self.assertEqual(rows[0]['quantity'], '2')
+
+    def test_ndjson_export_with_filters(self):
+        today = self.new.created_at.date().isoformat()
+        body = self.read(self.client.get(f'/api/orders/export/?as=ndjson&start_date={today}&end_date={today}'))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['order_id'] for row in rows], [self.new.pk])
+        body = self.read(self.client.get('/api/orders/export/?as=ndjson&status=delivered'))
+        self.assertEqual([json.loads(line)['order_id'] for line in body.splitlines()], [self.old.pk])
+
+    def test_export_is_scoped_and_validated(self):
+        staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        self.client.force_authenticate(staff)
+        rows = list(csv.DictReader(self.read(self.client.get('/api/orders/export/')).splitlines()))
+        self.assertEqual([row['order_id'] for row in rows], [str(self.old.pk)])
+        self.assertEqual(self.client.get('/api/orders/export/?as=xml').status_code, 400)
+        self.assertEqual(self.client.get('/api/orders/export/?start_date=yesterday').status_code, 400)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    buyers = 12
+    stock = 5
+
+    def test_parallel_checkouts_never_oversell(self):
+        # A lock error can surface after a checkout already committed, so the
+        # invariants are checked on the database rather than per response.
+        product = Product.objects.create(name='Last units', description='', price=Decimal('1.00'), stock=self.stock)
+        users = [User.objects.create_user(username=f'buyer{i}', password='pass') for i in range(self.buyers)]
+        results = []
+        start = threading.Barrier(self.buyers)
+
+        def checkout(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            start.wait()
+            try:
+                # SQLite serialises writers; retry lock contention the way a
+                # client would, an oversell must still never happen.
+                for attempt in range(200):
+                    try:
+                        response = client.post('/api/orders/', {
+                            'shipping_address': 'Somewhere',
+                            'items': [{'product_id': product.id, 'quantity': 1}],
+                        }, format='json')
+                    except OperationalError:
+                        time.sleep(0.005 * (attempt % 10))
+                        continue
+                    results.append(response.status_code)
+                    return
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(Order.objects.count(), self.stock)
+        self.assertEqual(sum(OrderItem.objects.values_list('quantity', flat=True)), self.stock)
+        self.assertEqual(len(results), self.buyers)
+        self.assertIn(400, results)
@@ -2,11 +2,20 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from datetime import datetime, time, timedelta
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .export import export_rows, iter_csv, iter_ndjson
 from .models import Order, OrderItem
-from .serializers import OrderSerializer, OrderItemSerializer
+from .pagination import KeysetPagination
+from .serializers import OrderSerializer, OrderItemSerializer, OrderListSerializer
 
 # Create your views here.
 
+BULK_STATUS_MAX_IDS = 10000
+
 class IsOwnerOrStaff(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return (obj.customer == request.user or 
@@ -15,14 +24,29 @@ class IsOwnerOrStaff(permissions.BasePermission):
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrStaff]
+    pagination_class = KeysetPagination
+    # Expensive actions switch to the 'reports' scope
+    throttle_scope = 'default'
 
     def get_queryset(self):
         user = self.request.user
         if user.role in ['admin', 'manager']:
-            return Order.objects.all()
+            queryset = Order.objects.all()
         elif user.role == 'staff':
-            return Order.objects.exclude(status='pending')
-        return Order.objects.filter(customer=user)
+            queryset = Order.objects.exclude(status='pending')
+        else:
+            queryset = Order.objects.filter(customer=user)
+
+        # Items and their products come in one extra query per page
+        items = OrderItem.objects.select_related('product')
+        if self.action == 'list':
+            items = items.defer('product__description')
+        return queryset.prefetch_related(Prefetch('items', queryset=items))
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return OrderListSerializer
+        return OrderSerializer
 
     def perform_create(self, serializer):
         serializer.save(customer=self.request.user)
@@ -44,13 +68,124 @@ class OrderViewSet(viewsets.ModelViewSet):
         if request.user.role not in ['admin', 'manager', 'staff']:
             return Response({'error': 'Permission denied'}, 
                           status=status.HTTP_403_FORBIDDEN)
-        
-        # Activate labs when order is delivered
-        if new_status == 'delivered':
-            order_items = OrderItem.objects.filter(order=order)
-            order_items.update(labs_activated=True)
-        
-        order.status = new_status
-        order.save()
+
+        # Staff may correct any status here; only bulk updates follow STATUS_TRANSITIONS
+        if new_status != order.status:
+            # Activates labs when the order is delivered; cancelling a
+            # delivered order is how a refund is recorded and revokes them
+            Order.objects.filter(pk=order.pk).set_status(new_status)
+
+        # Not through get_queryset: staff stop seeing orders moved back to pending
+        order = Order.objects.prefetch_related('items__product').get(pk=order.pk)
         serializer = self.get_serializer(order)
         return Response(serializer.data)
+
+    @action(detail=False, methods=['post'])
+    def bulk_update_status(self, request):
+        """
+        Move many orders to one status in a single transaction.
+
+        Expects ``{"ids": [...], "status": "..."}`` and answers with a result
+        per id: ``updated``, ``unchanged``, ``not_found`` or
+        ``invalid_transition``. Valid orders are updated even when others
+        in the request are rejected.
+        """
+        if request.user.role not in ['admin', 'manager', 'staff']:
+            return Response({'error': 'Permission denied'},
+                          status=status.HTTP_403_FORBIDDEN)
+
+        new_status = request.data.get('status')
+        if new_status not in [choice[0] for choice in Order.STATUS_CHOICES]:
+            return Response({'error': 'Invalid status'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return Response({'error': 'A non-empty list of ids is required'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = list(dict.fromkeys(int(order_id) for order_id in ids))
+        except (TypeError, ValueError):
+            return Response({'error': 'Ids must be integers'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > BULK_STATUS_MAX_IDS:
+            return Response({'error': f'At most {BULK_STATUS_MAX_IDS} ids per request'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        sources = [current for current, targets in Order.STATUS_TRANSITIONS.items()
+                   if new_status in targets]
+        # Leave room in each statement for the role and status filters
+        batch_size = (connection.features.max_query_params or len(ids) + 10) - 10
+        results = {order_id: 'not_found' for order_id in ids}
+        updated = 0
+
+        with transaction.atomic():
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                current = self.get_queryset().select_for_update().filter(
+                    id__in=batch
+                ).values_list('id', 'status')
+
+                movable = []
+                for order_id, current_status in current:
+                    if current_status == new_status:
+                        results[order_id] = 'unchanged'
+                    elif current_status in sources:
+                        results[order_id] = 'updated'
+                        movable.append(order_id)
+                    else:
+                        results[order_id] = 'invalid_transition'
+
+                if movable:
+                    updated += Order.objects.filter(
+                        id__in=movable, status__in=sources
+                    ).set_status(new_status)
+
+        return Response({
+            'status': new_status,
+            'updated': updated,
+            'results': [{'id': order_id, 'result': result}
+                        for order_id, result in results.items()],
+        })
+
+    @action(detail=False, methods=['get'], throttle_scope='reports')
+    def export(self, request):
+        """
+        Stream the visible orders' items as CSV (``?as=csv``, the default)
+        or NDJSON (``?as=ndjson``), optionally filtered by ``start_date``,
+        ``end_date`` (inclusive, YYYY-MM-DD) and ``status``.
+        """
+        output = request.query_params.get('as', 'csv')
+        if output not in ('csv', 'ndjson'):
+            return Response({'error': 'Export format must be csv or ndjson'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        orders = self.get_queryset()
+        try:
+            start_date = request.query_params.get('start_date')
+            if start_date:
+                start = datetime.combine(datetime.strptime(start_date, '%Y-%m-%d'), time.min)
+                orders = orders.filter(created_at__gte=timezone.make_aware(start))
+            end_date = request.query_params.get('end_date')
+            if end_date:
+                end = datetime.combine(datetime.strptime(end_date, '%Y-%m-%d'), time.min) + timedelta(days=1)
+                orders = orders.filter(created_at__lt=timezone.make_aware(end))
+        except ValueError:
+            return Response({'error': 'Dates must be YYYY-MM-DD'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        order_status = request.query_params.get('status')
+        if order_status:
+            if order_status not in [choice[0] for choice in Order.STATUS_CHOICES]:
+                return Response({'error': 'Invalid status'},
+                              status=status.HTTP_400_BAD_REQUEST)
+            orders = orders.filter(status=order_status)
+
+        rows = export_rows(orders)
+        if output == 'csv':
+            response = StreamingHttpResponse(iter_csv(rows), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(iter_ndjson(rows), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="orders.{output}"'
+        return response
+
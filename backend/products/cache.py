@@ -0,0 +1,90 @@
+"""
+Read-through cache for the product catalog endpoints.
+
+Entries are keyed by a catalog version stored in the cache itself, so a
+save or delete of any Product or Lab makes every cached page stale for all
+processes sharing the cache backend at once. Stock levels shown in cached
+pages may lag by up to ``CATALOG_CACHE_TIMEOUT``; checkout re-checks stock
+in the database.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from stem_kit_backend.db import read_from_replica
+
+VERSION_KEY = 'catalog:version'
+HITS_KEY = 'catalog:hits'
+MISSES_KEY = 'catalog:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60)
+
+
+def get_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock rather than 1 so entries written under an
+        # evicted version can never be served again
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        get_version()
+
+
+def _count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'version': get_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def cached_response(request, build):
+    """
+    Return the cached data for this request's URL, or call ``build()`` for
+    a Response and cache its data if it succeeded. Responses built from a
+    read replica are not cached: the replica may not have caught up with
+    the change that bumped the version yet.
+    """
+    cache = get_cache()
+    key = f"catalog:{get_version()}:{request.get_host()}:{request.get_full_path()}"
+    data = cache.get(key)
+    if data is not None:
+        _count(HITS_KEY)
+        return Response(data)
+
+    _count(MISSES_KEY)
+    response = build()
+    if response.status_code == 200 and not read_from_replica():
+        cache.set(key, response.data, get_timeout())
+    return response
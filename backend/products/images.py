@@ -0,0 +1,132 @@
+"""
+Resized derivatives of product images.
+
+Rendering works on bytes only, so it can run in worker processes; saving
+goes through the default storage in the calling process.
+"""
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Bounding box (width, height) for each derivative; images are never upscaled
+VARIANT_SIZES = {
+    'thumbnail': (150, 150),
+    'card': (400, 400),
+    'detail': (1200, 1200),
+}
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+
+def render_variants(data):
+    """
+    Render every size in VARIANT_SIZES from the image ``data``.
+
+    Returns ``{variant: {extension: bytes}}`` with a JPEG (or PNG for
+    images with transparency) and a WebP encoding of each size.
+    """
+    rendered = {}
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        for variant, size in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+            encodings = {}
+
+            buffer = BytesIO()
+            if has_alpha:
+                resized.save(buffer, 'PNG', optimize=True)
+                encodings['png'] = buffer.getvalue()
+            else:
+                resized.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+                encodings['jpg'] = buffer.getvalue()
+
+            buffer = BytesIO()
+            resized.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+            encodings['webp'] = buffer.getvalue()
+
+            rendered[variant] = encodings
+    return rendered
+
+
+def variant_dir(product):
+    return f'products/variants/{product.pk}'
+
+
+def store_variants(product, rendered):
+    """
+    Save rendered derivatives for ``product``, replace any previous ones and
+    record them on ``product.image_variants``.
+    """
+    stem = posixpath.splitext(posixpath.basename(product.image.name))[0]
+    variants = {}
+    for variant, encodings in rendered.items():
+        variants[variant] = {
+            extension: default_storage.save(
+                f'{variant_dir(product)}/{stem}_{variant}.{extension}', ContentFile(data)
+            )
+            for extension, data in encodings.items()
+        }
+
+    delete_variants(product)
+    product.image_variants = {'source': product.image.name, 'files': variants}
+    product.save(update_fields=['image_variants'])
+
+
+def delete_variants(product):
+    for encodings in (product.image_variants or {}).get('files', {}).values():
+        for name in encodings.values():
+            default_storage.delete(name)
+
+
+def read_image(product):
+    with product.image.open('rb') as image_file:
+        return image_file.read()
+
+
+def generate_variants(products, workers=None):
+    """
+    Render and store derivatives for ``products`` using a pool of
+    ``workers`` processes. Images are read a batch at a time so memory stays
+    bounded. Returns ``(generated, failed_product_ids)``.
+    """
+    workers = workers or os.cpu_count() or 1
+    batch_size = workers * 4
+    generated = 0
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        batch = []
+        for product in products:
+            if product.image:
+                batch.append(product)
+            if len(batch) >= batch_size:
+                generated += _generate_batch(pool, batch, failed)
+                batch = []
+        if batch:
+            generated += _generate_batch(pool, batch, failed)
+    return generated, failed
+
+
+def _generate_batch(pool, products, failed):
+    generated = 0
+    futures = []
+    for product in products:
+        try:
+            futures.append((product, pool.submit(render_variants, read_image(product))))
+        except OSError:
+            failed.append(product.pk)
+    for product, future in futures:
+        try:
+            store_variants(product, future.result())
+            generated += 1
+        except (OSError, ValueError, Image.DecompressionBombError):
+            failed.append(product.pk)
+    return generated
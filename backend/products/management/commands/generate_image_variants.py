@@ -0,0 +1,39 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from products.images import generate_variants
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Generate resized image derivatives for products, in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--all', action='store_true',
+                            help="Regenerate derivatives that are already up to date.")
+
+    def handle(self, *args, **options):
+        # Ids first: SQLite does not isolate a running query from the rows
+        # we update while it is being read
+        ids = list(
+            Product.objects.exclude(image='').exclude(image__isnull=True)
+            .order_by('id').values_list('id', flat=True)
+        )
+        products = self.load(ids)
+        if not options['all']:
+            products = (product for product in products
+                        if product.image_variants.get('source') != product.image.name)
+
+        generated, failed = generate_variants(products, workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {generated} products"))
+        if failed:
+            self.stderr.write(f"Failed for product ids: {', '.join(map(str, failed))}")
+
+    def load(self, ids, chunk_size=200):
+        for start in range(0, len(ids), chunk_size):
+            chunk = Product.objects.in_bulk(ids[start:start + chunk_size])
+            for product_id in ids[start:start + chunk_size]:
+                if product_id in chunk:
+                    yield chunk[product_id]
@@ -0,0 +1,74 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework.pagination import PageNumberPagination
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix.
+    Words are quoted so user input can never be read as FTS5 syntax.
+    """
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(text))
+
+
+def search(queryset, text, fts_table, fields):
+    """
+    Filter ``queryset`` to rows matching ``text`` in its FTS5 index table
+    ``fts_table``, best matches first. On databases without the index the
+    ``fields`` are searched with LIKE instead.
+    """
+    query = fts_query(text)
+    if not query:
+        return queryset.none()
+
+    if connection.vendor != 'sqlite':
+        condition = Q()
+        for token in TOKEN_RE.findall(text):
+            token_condition = Q()
+            for field in fields:
+                token_condition |= Q(**{f'{field}__icontains': token})
+            condition &= token_condition
+        return queryset.filter(condition).order_by('-id')
+
+    qn = connection.ops.quote_name
+    meta = queryset.model._meta
+    fts, pk = qn(fts_table), f'{qn(meta.db_table)}.{qn(meta.pk.column)}'
+    # The rank is only looked up, by rowid, for the rows that matched
+    rank = RawSQL(f'SELECT bm25({fts}) FROM {fts} WHERE {fts} MATCH %s AND {fts}.rowid = {pk}', [query])
+    matches = RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [query])
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('search_rank', '-id')
+
+
+class FullTextSearchMixin:
+    """
+    Adds ranked, paginated ``?q=`` search to a viewset's list action.
+    Subclasses set ``search_fts_table`` and ``search_fields``. Matches are
+    taken from ``get_queryset()``, so rows a user may not see (and their
+    indexed text) never reach the results.
+    """
+    search_fts_table = None
+    search_fields = ()
+    search_pagination_class = SearchPagination
+
+    def list(self, request, *args, **kwargs):
+        text = request.query_params.get('q')
+        if text is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = search(self.filter_queryset(self.get_queryset()), text,
+                          self.search_fts_table, self.search_fields)
+        paginator = self.search_pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
@@ -1,7 +1,30 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from .models import Product
 
-class ProductSerializer(serializers.ModelSerializer):    
+class ImageVariantsField(serializers.ReadOnlyField):
+    """URLs of the resized copies of a product image, by size and format."""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for variant, encodings in (value or {}).get('files', {}).items():
+            urls[variant] = {}
+            for extension, name in encodings.items():
+                url = default_storage.url(name)
+                urls[variant][extension] = request.build_absolute_uri(url) if request else url
+        return urls
+
+class ProductSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'description', 'price', 'stock', 'image', 'image_variants', 'created_at', 'updated_at']
+
+class ProductSummarySerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Product
-        fields = ['id', 'name', 'description', 'price', 'stock', 'image', 'created_at', 'updated_at'] 
\ No newline at end of file
+        fields = ['id', 'name', 'price', 'image', 'image_variants']
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from jobs.queue import enqueue
+from labs.models import Lab
+from . import cache
+from .images import delete_variants
+from .models import Product
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Lab)
+@receiver(post_delete, sender=Lab)
+def invalidate_catalog_cache(sender, **kwargs):
+    cache.invalidate()
+
+
+@receiver(post_save, sender=Product)
+def schedule_image_variants(sender, instance, **kwargs):
+    variants = instance.image_variants or {}
+    if instance.image:
+        if variants.get('source') != instance.image.name:
+            enqueue('products.generate_image_variants', {'product_id': instance.pk})
+    elif variants:
+        delete_variants(instance)
+        instance.image_variants = {}
+        instance.save(update_fields=['image_variants'])
+
+
+@receiver(post_delete, sender=Product)
+def remove_image_variants(sender, instance, **kwargs):
+    delete_variants(instance)
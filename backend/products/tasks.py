@@ -0,0 +1,14 @@
+from jobs.queue import task
+from .images import read_image, render_variants, store_variants
+from .models import Product
+
+
+@task('products.generate_image_variants')
+def generate_image_variants(product_id):
+    product = Product.objects.filter(pk=product_id).first()
+    if product is None or not product.image:
+        return None
+    if product.image_variants.get('source') == product.image.name:
+        return product.image_variants
+    store_variants(product, render_variants(read_image(product)))
+    return product.image_variants
@@ -1,3 +1,166 @@
-from django.test import TestCase
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from jobs.queue import run_pending
+
+from labs.models import Lab, LabEntitlement
+from . import cache
+from .images import render_variants
+from .models import Product
+
+User = get_user_model()
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(username='buyer', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name='Kit', description='', price=Decimal('5.00'), stock=10)
+
+    def test_list_is_served_from_cache(self):
+        self.client.get('/api/products/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.data[0]['name'], 'Kit')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_product_save_invalidates(self):
+        self.client.get(f'/api/products/{self.product.pk}/')
+        self.product.name = 'Renamed'
+        self.product.save()
+        self.assertEqual(self.client.get(f'/api/products/{self.product.pk}/').data['name'], 'Renamed')
+
+    def test_lab_changes_invalidate_labs_action(self):
+        url = f'/api/products/{self.product.pk}/labs/'
+        self.assertEqual(self.client.get(url).data, [])
+        lab = Lab.objects.create(title='Lab', description='', content='', product=self.product)
+        self.assertEqual(len(self.client.get(url).data), 1)
+        lab.delete()
+        self.assertEqual(self.client.get(url).data, [])
+
+    def test_missing_product_is_not_cached(self):
+        self.assertEqual(self.client.get('/api/products/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/products/999999/').status_code, 404)
+        self.assertEqual(cache.stats()['hits'], 0)
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}):
+                self.client.get('/api/products/')
+                with self.assertNumQueries(0):
+                    self.client.get('/api/products/')
+                Product.objects.create(name='New', description='', price=Decimal('1.00'))
+                self.assertEqual(len(self.client.get('/api/products/').data), 2)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(username='buyer', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.arduino = Product.objects.create(name='Arduino Starter Kit', description='Learn electronics',
+                                              price=Decimal('5.00'))
+        self.pi = Product.objects.create(name='Raspberry Pi', description='Works with Arduino shields',
+                                         price=Decimal('5.00'))
+        Product.objects.create(name='Drone', description='Flight control', price=Decimal('5.00'))
+
+    def test_product_search_is_ranked_and_paginated(self):
+        response = self.client.get('/api/products/?q=arduino')
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([p['id'] for p in response.data['results']], [self.arduino.id, self.pi.id])
+        response = self.client.get('/api/products/?q=arduino&page_size=1&page=2')
+        self.assertEqual([p['id'] for p in response.data['results']], [self.pi.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.arduino.name = 'Microcontroller kit'
+        self.arduino.description = 'Blinking lights'
+        self.arduino.save()
+        self.assertEqual(self.client.get('/api/products/?q=blink').data['count'], 1)
+        self.pi.delete()
+        self.assertEqual(self.client.get('/api/products/?q=arduino').data['count'], 0)
+
+    def test_query_syntax_is_escaped(self):
+        response = self.client.get('/api/products/?q=arduino" OR NEAR(')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/products/?q=%20').data['count'], 0)
+
+    def test_lab_content_search(self):
+        LabEntitlement.objects.create(customer=self.user, product=self.arduino)
+        Lab.objects.create(title='Blink', description='', content='Wire the LED to pin 13', product=self.arduino,
+                           status='published')
+        Lab.objects.create(title='Servo', description='', content='Sweep a motor', product=self.arduino,
+                           status='published')
+        response = self.client.get('/api/labs/?q=led pin')
+        self.assertEqual([lab['title'] for lab in response.data['results']], ['Blink'])
+
+    def test_lab_search_skips_drafts_and_unpurchased_labs(self):
+        Lab.objects.create(title='Draft', description='', content='Secret wiring', product=self.arduino)
+        Lab.objects.create(title='Paid', description='', content='Secret wiring', product=self.pi,
+                           status='published')
+        self.assertEqual(self.client.get('/api/labs/?q=secret').data['count'], 0)
+
+        LabEntitlement.objects.create(customer=self.user, product=self.pi)
+        response = self.client.get('/api/labs/?q=secret')
+        self.assertEqual([lab['title'] for lab in response.data['results']], ['Paid'])
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(username='buyer', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_image(self, size=(1600, 900), mode='RGB'):
+        buffer = BytesIO()
+        Image.new(mode, size, 'red').save(buffer, 'PNG' if mode == 'RGBA' else 'JPEG')
+        return ContentFile(buffer.getvalue(), name='kit.png' if mode == 'RGBA' else 'kit.jpg')
+
+    def test_render_variants_sizes_and_formats(self):
+        rendered = render_variants(self.make_image().read())
+        self.assertEqual(set(rendered), {'thumbnail', 'card', 'detail'})
+        with Image.open(BytesIO(rendered['card']['webp'])) as card:
+            self.assertEqual(card.size, (400, 225))
+        with Image.open(BytesIO(rendered['detail']['jpg'])) as detail:
+            self.assertEqual(detail.size, (1200, 675))
+        self.assertIn('png', render_variants(self.make_image(mode='RGBA').read())['thumbnail'])
+
+    def test_upload_queues_job_and_serializer_exposes_urls(self):
+        product = Product.objects.create(name='Kit', description='', price=Decimal('5.00'),
+                                         image=self.make_image())
+        self.assertEqual(run_pending(), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants['source'], product.image.name)
+        data = self.client.get(f'/api/products/{product.pk}/').data
+        self.assertTrue(data['image_variants']['thumbnail']['webp'].startswith('http://testserver/media/'))
+        # Saving again without a new image does not queue more work
+        product.save()
+        self.assertEqual(run_pending(), 0)
+
+    def test_backfill_command(self):
+        product = Product.objects.create(name='Kit', description='', price=Decimal('5.00'),
+                                         image=self.make_image())
+        out = StringIO()
+        call_command('generate_image_variants', '--workers', '2', stdout=out)
+        self.assertIn('Generated derivatives for 1 products', out.getvalue())
+        product.refresh_from_db()
+        self.assertEqual(set(product.image_variants['files']), {'thumbnail', 'card', 'detail'})
@@ -1,48 +1,42 @@
 from django.shortcuts import render
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import Product
 from labs.models import Lab
 from .serializers import ProductSerializer
-from labs.serializers import LabSerializer, LabDetailSerializer
+from . import cache
+from .search import FullTextSearchMixin
+from labs.serializers import LabSerializer
 
 # Create your views here.
 
-class IsManagerOrReadOnly(permissions.BasePermission):
-    def has_permission(self, request, view):
-        if request.method in permissions.SAFE_METHODS:
-            return True
-        return request.user and request.user.role in ['admin', 'manager']
-
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(FullTextSearchMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
+    search_fts_table = 'products_fts'
+    search_fields = ('name', 'description')
 
-    @action(detail=True, methods=['get'])
-    def labs(self, request, pk=None):
-        product = self.get_object()
-        labs = Lab.objects.filter(product=product)
-        serializer = LabSerializer(labs, many=True)
-        return Response(serializer.data)
+    def list(self, request, *args, **kwargs):
+        return cache.cached_response(request, lambda: super(ProductViewSet, self).list(request, *args, **kwargs))
 
-class LabViewSet(viewsets.ModelViewSet):
-    queryset = Lab.objects.all()
-    serializer_class = LabSerializer
-    permission_classes = [permissions.IsAuthenticated, IsManagerOrReadOnly]
+    def retrieve(self, request, *args, **kwargs):
+        return cache.cached_response(request, lambda: super(ProductViewSet, self).retrieve(request, *args, **kwargs))
 
-    def get_serializer_class(self):
-        if self.action == 'retrieve':
-            return LabDetailSerializer
-        return LabSerializer
+    @action(detail=True, methods=['get'])
+    def labs(self, request, pk=None):
+        def build():
+            product = self.get_object()
+            labs = Lab.objects.filter(product=product).defer('content').select_related('author')
+            serializer = LabSerializer(labs, many=True)
+            return Response(serializer.data)
+        return cache.cached_response(request, build)
 
-    def get_queryset(self):
-        queryset = Lab.objects.all()
-        if self.request.user.role == 'customer':
-            # Customers can only see published labs they have purchased
-            return queryset.filter(status='published', 
-                                 product__orderitem__order__customer=self.request.user,
-                                 product__orderitem__labs_activated=True)
-        return queryset
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        if request.user.role not in ['admin', 'manager', 'staff']:
+            return Response({'error': 'Permission denied'},
+                          status=status.HTTP_403_FORBIDDEN)
+        return Response(cache.stats())
@@ -0,0 +1,177 @@
+"""
+ASGI endpoints that push events to signed-in clients.
+
+``/ws/events/`` is a WebSocket and ``/api/events/`` the same stream as
+Server-Sent Events for clients that cannot open one. Both authenticate with
+a simplejwt access token, passed as ``?token=`` (browsers cannot set headers
+on either) or as a ``Bearer`` Authorization header, and send one JSON
+object per event. Everything else is handed to Django.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from accounts.authentication import CachedJWTAuthentication
+from .broadcast import get_broadcaster, user_topics
+
+WEBSOCKET_PATH = '/ws/events/'
+SSE_PATH = '/api/events/'
+
+
+def get_heartbeat():
+    return getattr(settings, 'REALTIME_HEARTBEAT_SECONDS', 15)
+
+
+def _token(scope):
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            scheme, _, token = value.decode('latin-1').partition(' ')
+            if scheme.lower() == 'bearer' and token:
+                return token
+    tokens = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token')
+    return tokens[0] if tokens else None
+
+
+def _resolve_user(token):
+    auth = CachedJWTAuthentication()
+    try:
+        user = auth.get_user(auth.get_validated_token(token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+    return user if user.is_active else None
+
+
+async def authenticate(scope):
+    token = _token(scope)
+    if not token:
+        return None
+    return await sync_to_async(_resolve_user)(token)
+
+
+def encode(event):
+    return json.dumps(event, cls=DjangoJSONEncoder)
+
+
+async def stream(subscription, disconnected, emit):
+    """
+    Call ``emit(event)`` for every event on ``subscription`` and
+    ``emit(None)`` after each quiet heartbeat interval, until the
+    ``disconnected`` future completes.
+    """
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {pending, disconnected}, timeout=get_heartbeat(), return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                return
+            if pending in done:
+                event, pending = pending.result(), None
+                await emit(event)
+            else:
+                await emit(None)
+    finally:
+        if pending is not None:
+            pending.cancel()
+        subscription.close()
+
+
+async def websocket_events(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    user = await authenticate(scope)
+    if user is None:
+        # Closing before accepting rejects the handshake with a 403
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+    subscription = get_broadcaster().subscribe(user_topics(user))
+    await send({'type': 'websocket.accept'})
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'websocket.disconnect':
+            pass
+
+    async def emit(event):
+        await send({'type': 'websocket.send', 'text': encode(event if event is not None else {'type': 'ping'})})
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await stream(subscription, disconnected, emit)
+    finally:
+        disconnected.cancel()
+
+
+def _cors_headers(scope):
+    origin = next((value for name, value in scope.get('headers', ()) if name == b'origin'), None)
+    if origin is None:
+        return []
+    allowed = getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False) or \
+        origin.decode('latin-1') in getattr(settings, 'CORS_ALLOWED_ORIGINS', ())
+    if not allowed:
+        return []
+    return [(b'access-control-allow-origin', origin), (b'vary', b'Origin')]
+
+
+async def sse_events(scope, receive, send):
+    user = await authenticate(scope)
+    if user is None:
+        await send({
+            'type': 'http.response.start',
+            'status': 401,
+            'headers': [(b'content-type', b'application/json')] + _cors_headers(scope),
+        })
+        await send({'type': 'http.response.body', 'body': b'{"detail": "Authentication credentials were not provided or are invalid."}'})
+        return
+    subscription = get_broadcaster().subscribe(user_topics(user))
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            # Stop nginx and friends from buffering the stream
+            (b'x-accel-buffering', b'no'),
+        ] + _cors_headers(scope),
+    })
+    await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def emit(event):
+        if event is None:
+            chunk = ': keepalive\n\n'
+        else:
+            chunk = f"event: {event['type']}\ndata: {encode(event)}\n\n"
+        await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await stream(subscription, disconnected, emit)
+    finally:
+        disconnected.cancel()
+
+
+def with_push_endpoints(django_application):
+    """Wrap Django's ASGI application with the push endpoints."""
+    async def application(scope, receive, send):
+        if scope['type'] == 'websocket':
+            if scope['path'] == WEBSOCKET_PATH:
+                return await websocket_events(scope, receive, send)
+            await receive()
+            return await send({'type': 'websocket.close', 'code': 4404})
+        if scope['type'] == 'http' and scope['path'] == SSE_PATH:
+            return await sse_events(scope, receive, send)
+        return await django_application(scope, receive, send)
+    return application
@@ -0,0 +1,114 @@
+"""
+Fan-out of events to connected clients.
+
+Events are published to topics (``user:<id>``, ``support:staff``,
+``orders:staff``) from ordinary synchronous Django code and delivered to
+every subscription on those topics. ``InProcessBroadcaster`` only reaches
+clients connected to the same process; set ``REALTIME_BROADCASTER`` to a
+class with the same ``subscribe``/``publish`` interface that is backed by a
+shared store when running several ASGI workers.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Sent instead of the missed events when a client falls too far behind;
+# the client should re-fetch whatever it is showing
+RESYNC = {'type': 'resync'}
+
+SUPPORT_STAFF_ROLES = ('admin', 'staff')
+ORDER_STAFF_ROLES = ('admin', 'manager', 'staff')
+
+
+def user_topics(user):
+    topics = [f'user:{user.pk}']
+    if user.role in SUPPORT_STAFF_ROLES:
+        topics.append('support:staff')
+    if user.role in ORDER_STAFF_ROLES:
+        topics.append('orders:staff')
+    return topics
+
+
+class Subscription:
+    def __init__(self, broadcaster, topics, max_queued):
+        self.broadcaster = broadcaster
+        self.topics = tuple(topics)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_queued)
+        self.overflowed = False
+
+    def put(self, event):
+        # Always runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        if self.overflowed:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflowed = False
+            return RESYNC
+        return await self.queue.get()
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+
+class InProcessBroadcaster:
+    def __init__(self, max_queued=100):
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, topics):
+        """Subscribe to ``topics``; must be called from the consuming event loop."""
+        subscription = Subscription(self, topics, self.max_queued)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscriptions[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscriptions.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[topic]
+
+    def publish(self, topics, event):
+        """Deliver ``event`` once to every subscription on any of ``topics``. Thread-safe."""
+        with self._lock:
+            targets = set()
+            for topic in topics:
+                targets.update(self._subscriptions.get(topic, ()))
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The subscriber's loop has gone away without closing
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(set().union(*self._subscriptions.values()))
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                path = getattr(settings, 'REALTIME_BROADCASTER', 'realtime.broadcast.InProcessBroadcaster')
+                _broadcaster = import_string(path)()
+    return _broadcaster
@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from orders.models import Order
+from orders.signals import order_status_changed
+from support.models import SupportMessage
+from support.serializers import SupportMessageSerializer
+from .broadcast import get_broadcaster
+
+
+def publish_on_commit(topics, event):
+    # Clients must never hear about rows that end up rolled back
+    transaction.on_commit(lambda: get_broadcaster().publish(topics, event))
+
+
+@receiver(post_save, sender=SupportMessage)
+def push_support_message(sender, instance, created, **kwargs):
+    if not created:
+        return
+    topics = ['support:staff']
+    if instance.ticket.user_id is not None:
+        topics.append(f'user:{instance.ticket.user_id}')
+    publish_on_commit(topics, {
+        'type': 'support.message',
+        'ticket': instance.ticket_id,
+        'message': SupportMessageSerializer(instance).data,
+    })
+
+
+@receiver(order_status_changed, sender=Order)
+def push_order_status(sender, orders, status, **kwargs):
+    if not orders:
+        return
+    by_customer = {}
+    for order_id, customer_id in orders:
+        by_customer.setdefault(customer_id, []).append(order_id)
+
+    # One event per recipient, however many orders changed
+    publish_on_commit(['orders:staff'], {
+        'type': 'order.status', 'status': status, 'orders': [order_id for order_id, _ in orders],
+    })
+    for customer_id, order_ids in by_customer.items():
+        publish_on_commit([f'user:{customer_id}'], {
+            'type': 'order.status', 'status': status, 'orders': order_ids,
+        })
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import threading
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from labs.models import Lab
+from orders.models import Order
+from support.models import SupportTicket, SupportMessage
+from .asgi import SSE_PATH, WEBSOCKET_PATH, with_push_endpoints
+from .broadcast import RESYNC, InProcessBroadcaster, get_broadcaster
+
+
+async def django_stub(scope, receive, send):
+    raise AssertionError('request should not reach Django')
+
+application = with_push_endpoints(django_stub)
+
+
+class BroadcasterTests(TestCase):
+    def test_publish_from_another_thread(self):
+        broadcaster = InProcessBroadcaster()
+
+        async def main():
+            subscription = broadcaster.subscribe(['user:1'])
+            other = broadcaster.subscribe(['user:2'])
+            thread = threading.Thread(target=broadcaster.publish, args=(['user:1', 'orders:staff'], {'n': 1}))
+            thread.start()
+            thread.join()
+            event = await asyncio.wait_for(subscription.get(), 1)
+            self.assertTrue(other.queue.empty())
+            subscription.close()
+            other.close()
+            return event
+
+        self.assertEqual(async_to_sync(main)(), {'n': 1})
+        self.assertEqual(broadcaster.subscriber_count(), 0)
+
+    def test_slow_subscriber_gets_resync(self):
+        broadcaster = InProcessBroadcaster(max_queued=2)
+
+        async def main():
+            subscription = broadcaster.subscribe(['user:1'])
+            for n in range(5):
+                broadcaster.publish(['user:1'], {'n': n})
+            await asyncio.sleep(0)
+            first = await subscription.get()
+            broadcaster.publish(['user:1'], {'n': 5})
+            await asyncio.sleep(0)
+            second = await subscription.get()
+            subscription.close()
+            return first, second
+
+        self.assertEqual(async_to_sync(main)(), (RESYNC, {'n': 5}))
+
+
+class PushEndpointTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer', password='pass', role='customer')
+        self.staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        self.lab = Lab.objects.create(title='Lab', description='', content='Body')
+        self.ticket = SupportTicket.objects.create(title='Help', description='', user=self.customer, lab=self.lab)
+
+    def scope(self, kind, user, path):
+        return {
+            'type': kind,
+            'path': path,
+            'query_string': f'token={AccessToken.for_user(user)}'.encode(),
+            'headers': [],
+        }
+
+    def connect(self, scope, action, events=1):
+        """
+        Open ``scope``, run ``action`` once subscribed and return what the
+        endpoint sent until ``events`` events arrived.
+        """
+        async def main():
+            sent = []
+            received = asyncio.Event()
+            closing = asyncio.Event()
+            first = True
+
+            async def receive():
+                nonlocal first
+                if first and scope['type'] == 'websocket':
+                    first = False
+                    return {'type': 'websocket.connect'}
+                await closing.wait()
+                return {'type': 'websocket.disconnect' if scope['type'] == 'websocket' else 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                if len(self.events(sent)) >= events:
+                    received.set()
+
+            task = asyncio.ensure_future(application(scope, receive, send))
+            while get_broadcaster().subscriber_count() == 0 and not task.done():
+                await asyncio.sleep(0.01)
+            await sync_to_async(action)()
+            await asyncio.wait_for(received.wait(), 2)
+            closing.set()
+            await asyncio.wait_for(task, 2)
+            return sent
+
+        return async_to_sync(main)()
+
+    def events(self, sent):
+        events = []
+        for message in sent:
+            if message['type'] == 'websocket.send':
+                events.append(json.loads(message['text']))
+            elif message['type'] == 'http.response.body':
+                for line in message['body'].decode().splitlines():
+                    if line.startswith('data: '):
+                        events.append(json.loads(line[6:]))
+        return events
+
+    def test_sse_delivers_new_ticket_messages(self):
+        def reply():
+            with self.captureOnCommitCallbacks(execute=True):
+                SupportMessage.objects.create(ticket=self.ticket, sender=self.staff, message='On it')
+
+        sent = self.connect(self.scope('http', self.customer, SSE_PATH), reply)
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        [event] = self.events(sent)
+        self.assertEqual(event['type'], 'support.message')
+        self.assertEqual(event['ticket'], self.ticket.id)
+        self.assertEqual(event['message']['message'], 'On it')
+        self.assertEqual(get_broadcaster().subscriber_count(), 0)
+
+    def test_websocket_delivers_order_status_changes(self):
+        orders = [
+            Order.objects.create(customer=self.customer, total_amount=10, shipping_address='x')
+            for _ in range(2)
+        ]
+        other = User.objects.create_user(username='other', password='pass', role='customer')
+        Order.objects.create(customer=other, total_amount=10, shipping_address='x')
+
+        def ship():
+            with self.captureOnCommitCallbacks(execute=True):
+                Order.objects.all().set_status('shipped')
+
+        sent = self.connect(self.scope('websocket', self.customer, WEBSOCKET_PATH), ship)
+        self.assertEqual(sent[0], {'type': 'websocket.accept'})
+        # The customer hears about their own orders only, in one event
+        self.assertEqual(self.events(sent), [
+            {'type': 'order.status', 'status': 'shipped', 'orders': [order.id for order in orders]},
+        ])
+
+    def test_rejects_missing_or_invalid_tokens(self):
+        async def main(scope):
+            sent = []
+
+            async def receive():
+                return {'type': 'websocket.connect'}
+
+            async def send(message):
+                sent.append(message)
+
+            await application(scope, receive, send)
+            return sent
+
+        scope = {'type': 'websocket', 'path': WEBSOCKET_PATH, 'query_string': b'token=nope', 'headers': []}
+        self.assertEqual(async_to_sync(main)(scope), [{'type': 'websocket.close', 'code': 4401}])
+        scope = {'type': 'http', 'path': SSE_PATH, 'query_string': b'', 'headers': []}
+        self.assertEqual(async_to_sync(main)(scope)[0]['status'], 401)
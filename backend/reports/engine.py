@@ -0,0 +1,436 @@
+"""
+Time-bucketed report series.
+
+A report covers a run of equal buckets (hours, days, ISO weeks or months).
+Source rows are streamed once with ``values_list`` as ``(when, measure,
+...)`` tuples and summed into one ``array('d')`` per measure, so the cost
+is one pass over compact rows with no per-row model instances. Day and
+coarser buckets read the daily rollup tables; hourly buckets read the
+source tables through their ``created_at`` indexes.
+"""
+import calendar
+import heapq
+from array import array
+from datetime import date, datetime, time, timedelta
+from functools import partial
+
+from django.db.models import (
+    Count, DateTimeField, DurationField, ExpressionWrapper, F, FloatField, OuterRef, Q, Subquery, Sum, Value, Window,
+)
+from django.db.models.functions import Ceil, RowNumber, Trunc
+from django.utils import timezone
+
+from orders.models import Order, OrderItem, OrderStatusChange
+from products.models import Product
+from support.models import SupportTicket
+from .models import DailySales, DailyProductSales, DailySupport
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+MAX_BUCKETS = 50000
+MAX_MOVING_AVERAGE_WINDOW = 365
+STREAM_CHUNK_SIZE = 5000
+
+
+def _add_months(value, months):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1, day=1)
+
+
+class Buckets:
+    """``count`` consecutive buckets of ``granularity`` starting at ``origin``."""
+
+    def __init__(self, granularity, origin, count):
+        self.granularity = granularity
+        self.origin = origin
+        self.count = count
+
+    @classmethod
+    def covering(cls, start, end, granularity):
+        """
+        The buckets covering the dates ``start`` to ``end`` inclusive. The
+        range widens to whole weeks or months so every bucket is complete.
+        """
+        if granularity == 'hour':
+            origin = timezone.make_aware(datetime.combine(start, time.min))
+            count = ((end - start).days + 1) * 24
+        elif granularity == 'day':
+            origin, count = start, (end - start).days + 1
+        elif granularity == 'week':
+            origin = start - timedelta(days=start.weekday())
+            count = (end - origin).days // 7 + 1
+        else:
+            origin = start.replace(day=1)
+            count = (end.year - origin.year) * 12 + end.month - origin.month + 1
+        return cls(granularity, origin, max(count, 0))
+
+    def previous(self):
+        """The same number of buckets immediately before these."""
+        if self.granularity == 'month':
+            return Buckets('month', _add_months(self.origin, -self.count), self.count)
+        return Buckets(self.granularity, self.origin - self.step * self.count, self.count)
+
+    @property
+    def step(self):
+        return {'hour': timedelta(hours=1), 'day': timedelta(days=1), 'week': timedelta(weeks=1)}[self.granularity]
+
+    def label(self, index):
+        if self.granularity == 'month':
+            return _add_months(self.origin, index)
+        return self.origin + self.step * index
+
+    def index(self, value):
+        """Bucket number of ``value`` (a date, or an aware datetime for hours)."""
+        if self.granularity == 'hour':
+            return int((value - self.origin).total_seconds() // 3600)
+        if isinstance(value, datetime):
+            value = timezone.localdate(value)
+        if self.granularity == 'day':
+            return (value - self.origin).days
+        if self.granularity == 'week':
+            return (value - self.origin).days // 7
+        return (value.year - self.origin.year) * 12 + value.month - self.origin.month
+
+    @property
+    def first_day(self):
+        return timezone.localdate(self.origin) if self.granularity == 'hour' else self.origin
+
+    @property
+    def last_day(self):
+        """The last date inside the final bucket."""
+        if self.granularity == 'hour':
+            return self.first_day + timedelta(days=self.count // 24 - 1)
+        if self.granularity == 'month':
+            last = _add_months(self.origin, self.count - 1)
+            return last.replace(day=calendar.monthrange(last.year, last.month)[1])
+        return self.origin + self.step * self.count - timedelta(days=1)
+
+    @property
+    def time_range(self):
+        """Aware ``[start, end)`` datetimes, for range filters on ``created_at``."""
+        start = timezone.make_aware(datetime.combine(self.first_day, time.min))
+        end = timezone.make_aware(datetime.combine(self.last_day + timedelta(days=1), time.min))
+        return start, end
+
+
+def aggregate(rows, buckets, measures):
+    """
+    Sum the ``(when, value, ...)`` tuples in ``rows`` into one array of
+    ``buckets.count`` floats per measure. Rows outside the buckets are skipped.
+    """
+    columns = [array('d', bytes(8 * buckets.count)) for _ in range(measures)]
+    count = buckets.count
+    index = buckets.index
+    for row in rows:
+        position = index(row[0])
+        if 0 <= position < count:
+            for column, value in zip(columns, row[1:]):
+                column[position] += float(value or 0)
+    return columns
+
+
+def moving_average(values, window):
+    """Trailing mean over ``window`` buckets; None until the window is full."""
+    averages = []
+    total = 0.0
+    for position, value in enumerate(values):
+        total += value
+        if position >= window:
+            total -= values[position - window]
+        averages.append(total / window if position >= window - 1 else None)
+    return averages
+
+
+def _stream(queryset, *fields):
+    return queryset.values_list(*fields).order_by().iterator(chunk_size=STREAM_CHUNK_SIZE)
+
+
+def sales_series(buckets, product_id=None):
+    """``[totals, orders]`` (or ``[totals, quantities]`` for one product) per bucket."""
+    if buckets.granularity == 'hour':
+        start, end = buckets.time_range
+        if product_id is not None:
+            rows = _stream(
+                OrderItem.objects.filter(product_id=product_id, order__created_at__gte=start,
+                                         order__created_at__lt=end),
+                'order__created_at', 'price', 'quantity',
+            )
+        else:
+            rows = ((created_at, total, 1) for created_at, total in _stream(
+                Order.objects.filter(created_at__gte=start, created_at__lt=end), 'created_at', 'total_amount',
+            ))
+    elif product_id is not None:
+        rows = _stream(
+            DailyProductSales.objects.filter(product_id=product_id,
+                                             date__range=[buckets.first_day, buckets.last_day]),
+            'date', 'total', 'quantity',
+        )
+    else:
+        rows = _stream(
+            DailySales.objects.filter(date__range=[buckets.first_day, buckets.last_day]),
+            'date', 'total', 'orders',
+        )
+    return aggregate(rows, buckets, 2)
+
+
+def support_series(buckets):
+    """``[tickets, resolved]`` per bucket."""
+    if buckets.granularity == 'hour':
+        start, end = buckets.time_range
+        rows = (
+            (created_at, 1, status == 'resolved') for created_at, status in _stream(
+                SupportTicket.objects.filter(created_at__gte=start, created_at__lt=end),
+                'created_at', 'status',
+            )
+        )
+    else:
+        rows = _stream(
+            DailySupport.objects.filter(date__range=[buckets.first_day, buckets.last_day]),
+            'date', 'tickets', 'resolved',
+        )
+    return aggregate(rows, buckets, 2)
+
+
+def build_report(buckets, series, names, window=None, compare=False, precision=None):
+    """
+    Turn ``series(buckets)`` into one dict per bucket with a ``date`` and each
+    measure in ``names``. ``window`` adds ``<name>_moving_avg``; ``compare``
+    adds ``previous_<name>`` and ``<name>_change`` (percent) from the
+    preceding period of the same length.
+    """
+    precision = precision or {}
+    columns = series(buckets)
+    previous = series(buckets.previous()) if compare else None
+    averages = [moving_average(column, window) for column in columns] if window else None
+
+    def rounded(name, value):
+        if value is None:
+            return None
+        digits = precision.get(name)
+        return round(value, digits) if digits else int(round(value))
+
+    rows = []
+    for position in range(buckets.count):
+        row = {'date': buckets.label(position)}
+        for column_index, name in enumerate(names):
+            value = columns[column_index][position]
+            row[name] = rounded(name, value)
+            if averages:
+                average = averages[column_index][position]
+                row[f'{name}_moving_avg'] = None if average is None else round(average, 2)
+            if previous:
+                before = previous[column_index][position]
+                row[f'previous_{name}'] = rounded(name, before)
+                row[f'{name}_change'] = round((value - before) / before * 100, 1) if before else None
+        rows.append(row)
+    return rows
+
+
+# stage -> (status that ends it, status that starts it or None for placement)
+FULFILLMENT_STAGES = {
+    'pending_to_shipped': ('shipped', None),
+    'shipped_to_delivered': ('delivered', 'shipped'),
+    'pending_to_delivered': ('delivered', None),
+}
+PERCENTILES = (50, 90, 99)
+
+
+def nearest_rank(p, count):
+    """1-based position of the nearest-rank ``p``th percentile among ``count`` sorted values."""
+    return max(-(-p * count // 100), 1)
+
+
+def _elapsed(since):
+    return ExpressionWrapper(F('changed_at') - since, output_field=DurationField())
+
+
+def fulfillment_report(buckets):
+    """
+    Per bucket, how many orders finished each FULFILLMENT_STAGES stage and
+    the p50/p90/p99 hours they took. One query per ending status computes
+    the durations from the status log, ranks them within each bucket with
+    window functions and returns only the rows at the percentile ranks, so
+    the result costs O(buckets) to transfer however many orders there are.
+    """
+    start, end = buckets.time_range
+    report = [{'date': buckets.label(position)} for position in range(buckets.count)]
+    for row in report:
+        for stage in FULFILLMENT_STAGES:
+            row[f'{stage}_count'] = 0
+            row.update({f'{stage}_p{p}': None for p in PERCENTILES})
+
+    for status in {ending for ending, _ in FULFILLMENT_STAGES.values()}:
+        stages = [(stage, starting) for stage, (ending, starting) in FULFILLMENT_STAGES.items()
+                  if ending == status]
+        annotations = {}
+        for stage, starting in stages:
+            if starting is None:
+                annotations[stage] = _elapsed(F('order__created_at'))
+            else:
+                annotations[stage] = _elapsed(Subquery(
+                    OrderStatusChange.objects.filter(order=OuterRef('order'), to_status=starting)
+                    .order_by('changed_at').values('changed_at')[:1]
+                ))
+        windows = {}
+        wanted = Q()
+        for stage, _ in stages:
+            # Orders missing the starting status sort last and are not counted
+            windows[f'{stage}_rank'] = Window(RowNumber(), partition_by=F('bucket'),
+                                              order_by=F(stage).asc(nulls_last=True))
+            windows[f'{stage}_count'] = Window(Count(stage), partition_by=F('bucket'))
+            count = ExpressionWrapper(F(f'{stage}_count') * Value(1.0), output_field=FloatField())
+            for p in PERCENTILES:
+                wanted |= Q(**{f'{stage}_rank': Ceil(count * p / 100), f'{stage}_count__gt': 0})
+        fields = ['bucket'] + [name for stage, _ in stages for name in (stage, f'{stage}_rank', f'{stage}_count')]
+        rows = (
+            OrderStatusChange.objects.filter(to_status=status, changed_at__gte=start, changed_at__lt=end)
+            .annotate(bucket=Trunc('changed_at', buckets.granularity, output_field=DateTimeField()),
+                      **annotations)
+            .annotate(**windows).filter(wanted).values_list(*fields)
+        )
+        for bucket, *columns in rows:
+            position = buckets.index(bucket)
+            if not 0 <= position < buckets.count:
+                continue
+            for index, (stage, _) in enumerate(stages):
+                elapsed, rank, count = columns[3 * index:3 * index + 3]
+                report[position][f'{stage}_count'] = count
+                for p in PERCENTILES:
+                    if elapsed is not None and rank == nearest_rank(p, count):
+                        report[position][f'{stage}_p{p}'] = round(elapsed.total_seconds() / 3600, 2)
+    return report
+
+
+# ranking name -> column of the product ranking rows
+RANKINGS = {'revenue': 1, 'units': 2, 'orders': 3}
+MAX_RANKING_LIMIT = 100
+
+
+def product_ranking(start, end, rank_by='revenue', limit=10):
+    """
+    The ``limit`` best-selling products from ``start`` to ``end`` inclusive
+    by ``rank_by`` (revenue, units or orders). The database sums each
+    product's daily rows from the covering index, and only the best
+    ``limit`` of them are kept while streaming instead of sorting them all.
+    """
+    sums = (
+        DailyProductSales.objects.filter(date__range=[start, end]).values('product_id')
+        .annotate(revenue=Sum('total'), units=Sum('quantity'), orders=Sum('orders')).order_by()
+        .values_list('product_id', 'revenue', 'units', 'orders')
+    )
+    column = RANKINGS[rank_by]
+    totals = {'revenue': 0, 'units': 0}
+
+    def counted(rows):
+        for row in rows:
+            totals['revenue'] += row[1]
+            totals['units'] += row[2]
+            yield row
+
+    # Ties go to the lower product id, so pages of results are stable
+    top = heapq.nlargest(limit, counted(sums.iterator(chunk_size=STREAM_CHUNK_SIZE)),
+                         key=lambda row: (row[column], -row[0]))
+    names = dict(Product.objects.filter(id__in=[row[0] for row in top]).values_list('id', 'name'))
+    return {
+        'start_date': start,
+        'end_date': end,
+        'rank_by': rank_by,
+        'total_revenue': totals['revenue'],
+        'total_units': totals['units'],
+        'results': [
+            {
+                'rank': rank,
+                'product_id': product_id,
+                'name': names.get(product_id),
+                'revenue': revenue,
+                'units': units,
+                'orders': orders,
+                'revenue_share': round(float(revenue / totals['revenue']) * 100, 1) if totals['revenue'] else None,
+            }
+            for rank, (product_id, revenue, units, orders) in enumerate(top, start=1)
+        ],
+    }
+
+
+def parse_range(params, default_days=30):
+    """Inclusive ``(start, end)`` dates from ``start_date``/``end_date`` (YYYY-MM-DD)."""
+    start = params.get('start_date')
+    end = params.get('end_date')
+    if not start or not end:
+        end = timezone.localdate()
+        return end - timedelta(days=default_days), end
+    start = date.fromisoformat(str(start))
+    end = date.fromisoformat(str(end))
+    if end < start:
+        raise ValueError('end_date is before start_date')
+    return start, end
+
+
+def sales_report(spec):
+    product_id = spec.get('product')
+    if product_id is None:
+        return sales_series, ('total', 'orders')
+    return partial(sales_series, product_id=product_id), ('total', 'quantity')
+
+
+def support_report(spec):
+    return support_series, ('tickets', 'resolved')
+
+
+# report name -> (function of the spec returning (series, measures), precision)
+REPORTS = {
+    'sales': (sales_report, {'total': 2}),
+    'support': (support_report, {}),
+}
+
+
+def parse_buckets(params, default_granularity='day'):
+    """The Buckets for ``start_date``, ``end_date`` and ``granularity`` in ``params``."""
+    granularity = params.get('granularity') or default_granularity
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    buckets = Buckets.covering(*parse_range(params), granularity)
+    if buckets.count > MAX_BUCKETS:
+        raise ValueError('Too many buckets, use a coarser granularity or a shorter range')
+    return buckets
+
+
+def parse_spec(report, params):
+    """
+    Validate report ``params`` (query parameters or a JSON body) into a
+    canonical spec dict, with the date range resolved, for ``run_spec``.
+    Raises ValueError with a message for the client.
+    """
+    if report not in REPORTS:
+        raise ValueError(f"report must be one of {', '.join(REPORTS)}")
+    buckets = parse_buckets(params)
+    window = int(params['moving_average']) if params.get('moving_average') not in (None, '') else None
+    if window is not None and not 1 <= window <= MAX_MOVING_AVERAGE_WINDOW:
+        raise ValueError(f'moving_average must be between 1 and {MAX_MOVING_AVERAGE_WINDOW}')
+    compare = params.get('compare') or None
+    if compare not in (None, 'previous'):
+        raise ValueError('compare must be "previous"')
+
+    start_date, end_date = parse_range(params)
+    spec = {
+        'report': report,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'granularity': buckets.granularity,
+        'moving_average': window,
+        'compare': compare,
+    }
+    if report == 'sales' and params.get('product') not in (None, ''):
+        if not str(params['product']).isdigit():
+            raise ValueError('Invalid product')
+        spec['product'] = int(params['product'])
+    return spec
+
+
+def run_spec(spec):
+    """The rows of the report described by a ``parse_spec`` result."""
+    report, precision = REPORTS[spec['report']]
+    series, measures = report(spec)
+    buckets = Buckets.covering(date.fromisoformat(spec['start_date']), date.fromisoformat(spec['end_date']),
+                               spec['granularity'])
+    return build_report(buckets, series, measures, window=spec['moving_average'],
+                        compare=spec['compare'] == 'previous', precision=precision)
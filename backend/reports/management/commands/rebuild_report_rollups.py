@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from reports import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or backfill) the report rollup tables from orders and support tickets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        counts = rollups.rebuild(batch_size=options['batch_size'])
+        for table, rows in sorted(counts.items()):
+            self.stdout.write(f"{table}: {rows} rows")
+        self.stdout.write(self.style.SUCCESS("Rebuilt report rollups"))
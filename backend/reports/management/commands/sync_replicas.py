@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from stem_kit_backend.db import copy_sqlite
+
+
+class Command(BaseCommand):
+    help = "Copy the primary database over the SQLite read replicas in READ_REPLICAS."
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError("Only SQLite replicas can be synced; use the database's own replication.")
+        if not settings.READ_REPLICAS:
+            raise CommandError("No read replicas configured (set DATABASE_REPLICAS).")
+        for alias in settings.READ_REPLICAS:
+            # Drop this process's handle on the old file before replacing its contents
+            connections[alias].close()
+            copy_sqlite(DEFAULT_DB_ALIAS, connections[alias].settings_dict['NAME'])
+            self.stdout.write(f"{alias}: {connections[alias].settings_dict['NAME']}")
+        self.stdout.write(self.style.SUCCESS(f"Synced {len(settings.READ_REPLICAS)} replicas"))
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def roll_up_existing_rows(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    SupportTicket = apps.get_model('support', 'SupportTicket')
+    rollups = [
+        (apps.get_model('reports', 'DailySales'),
+         Order.objects.annotate(date=TruncDate('created_at')).values('date')
+         .annotate(orders=Count('id'), total=Sum('total_amount'))),
+        (apps.get_model('reports', 'DailyProductSales'),
+         OrderItem.objects.annotate(date=TruncDate('order__created_at')).values('date', 'product_id')
+         .annotate(quantity=Sum('quantity'), total=Sum('price'))),
+        (apps.get_model('reports', 'DailySupport'),
+         SupportTicket.objects.annotate(date=TruncDate('created_at')).values('date')
+         .annotate(tickets=Count('id'), resolved=Count('id', filter=Q(status='resolved')))),
+        (apps.get_model('reports', 'OrderStatusCount'),
+         Order.objects.values('status').annotate(count=Count('id'))),
+    ]
+    for model, rows in rollups:
+        model.objects.bulk_create([model(**row) for row in rows.order_by()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('orders', '0002_order_listing_indexes'),
+        ('products', '0003_product_image_variants'),
+        ('support', '0004_lab_support_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'db_table': 'report_daily_sales',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySupport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('tickets', models.IntegerField(default=0)),
+                ('resolved', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'report_daily_support',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20, unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'report_order_status_counts',
+                'ordering': ['status'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product')),
+            ],
+            options={
+                'db_table': 'report_daily_product_sales',
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='report_daily_product_sales_date_product')],
+            },
+        ),
+        migrations.RunPython(roll_up_existing_rows, migrations.RunPython.noop),
+    ]
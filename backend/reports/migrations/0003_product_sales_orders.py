@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:26
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def count_existing_orders(apps, schema_editor):
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    DailyProductSales = apps.get_model('reports', 'DailyProductSales')
+    counts = (
+        OrderItem.objects.annotate(date=TruncDate('order__created_at')).values('date', 'product_id')
+        .annotate(orders=Count('order_id', distinct=True)).order_by()
+    )
+    for row in counts.iterator(chunk_size=1000):
+        DailyProductSales.objects.filter(date=row['date'], product_id=row['product_id']).update(
+            orders=row['orders'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_image_variants'),
+        ('reports', '0002_report_runs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='orders',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_orders, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='dailyproductsales',
+            index=models.Index(fields=['date', 'product', 'quantity', 'total', 'orders'], name='report_product_sales_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyproductsales',
+            index=models.Index(fields=['product', 'date'], name='report_product_sales_prod_idx'),
+        ),
+    ]
@@ -1,3 +1,92 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from jobs.models import Job
+from products.models import Product
 
-# Create your models here.
+# Rollups behind the report views, maintained by reports.rollups
+
+class DailySales(models.Model):
+    date = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'report_daily_sales'
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.date}: {self.orders} orders, {self.total}"
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    quantity = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Orders with at least one line for the product
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'report_daily_product_sales'
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='report_daily_product_sales_date_product'),
+        ]
+        indexes = [
+            # Ranking a date range reads every column from the index alone
+            models.Index(fields=['date', 'product', 'quantity', 'total', 'orders'],
+                         name='report_product_sales_cover_idx'),
+            models.Index(fields=['product', 'date'], name='report_product_sales_prod_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date}: {self.quantity} x {self.product.name}"
+
+class DailySupport(models.Model):
+    date = models.DateField(unique=True)
+    tickets = models.IntegerField(default=0)
+    resolved = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'report_daily_support'
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.date}: {self.tickets} tickets, {self.resolved} resolved"
+
+class OrderStatusCount(models.Model):
+    status = models.CharField(max_length=20, unique=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'report_order_status_counts'
+        ordering = ['status']
+
+    def __str__(self):
+        return f"{self.status}: {self.count}"
+
+class ReportRun(models.Model):
+    """
+    A report computed by a background job. Runs are keyed by the hash of
+    their spec, so submitting the same spec again reuses the stored result.
+    """
+    spec_hash = models.CharField(max_length=64, unique=True)
+    spec = models.JSONField()
+    job = models.ForeignKey(Job, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True,
+                                     blank=True, related_name='report_runs')
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'report_runs'
+
+    @property
+    def status(self):
+        if self.finished_at is not None:
+            return 'succeeded'
+        return self.job.status if self.job else 'failed'
+
+    def __str__(self):
+        return f"Report run #{self.id} {self.spec.get('report')} ({self.status})"
@@ -0,0 +1,164 @@
+"""
+Rollup tables behind the report views.
+
+Orders, order items and support tickets add to one row per day (and per
+product, and per order status). Items of cancelled orders are taken out
+of the per-product rows, so product rankings only count live sales. Every change is applied as an
+``INSERT OR IGNORE`` of the row followed by an ``UPDATE ... SET col = col
++ delta``, so writers never read-modify-write and reports read O(days)
+rows. ``rebuild()`` recomputes all of them from the source tables.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from support.models import SupportTicket
+from .models import DailySales, DailyProductSales, DailySupport, OrderStatusCount
+
+
+def bump(model, rows, deltas):
+    """Add ``deltas`` to every row of ``model`` identified by the dicts in ``rows``."""
+    deltas = {name: value for name, value in deltas.items() if value}
+    if not rows or not deltas:
+        return
+    with transaction.atomic(savepoint=False):
+        model.objects.bulk_create([model(**row) for row in rows], ignore_conflicts=True)
+        condition = Q()
+        for row in rows:
+            condition |= Q(**row)
+        model.objects.filter(condition).update(**{name: F(name) + value for name, value in deltas.items()})
+
+
+def day(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def record_order(order, sign=1):
+    bump(DailySales, [{'date': day(order.created_at)}], {'orders': sign, 'total': sign * order.total_amount})
+    bump(OrderStatusCount, [{'status': order.status}], {'count': sign})
+
+
+# Products per UPDATE, as for stock reservation in orders.serializers
+ITEM_BATCH_SIZE = 100
+
+
+def per_product(values, product_ids, **kwargs):
+    return Case(
+        *[When(product_id=product_id, then=Value(values[product_id])) for product_id in product_ids],
+        default=Value(0), **kwargs,
+    )
+
+
+def bump_products(date, quantities, totals, orders):
+    """Add to the ``date`` row of every product in ``quantities``, one UPDATE per batch."""
+    product_ids = list(quantities)
+    with transaction.atomic(savepoint=False):
+        for start in range(0, len(product_ids), ITEM_BATCH_SIZE):
+            batch = product_ids[start:start + ITEM_BATCH_SIZE]
+            DailyProductSales.objects.bulk_create(
+                [DailyProductSales(date=date, product_id=product_id) for product_id in batch],
+                ignore_conflicts=True,
+            )
+            DailyProductSales.objects.filter(date=date, product_id__in=batch).update(
+                quantity=F('quantity') + per_product(quantities, batch),
+                total=F('total') + per_product(totals, batch,
+                                               output_field=DecimalField(max_digits=14, decimal_places=2)),
+                orders=F('orders') + per_product(orders, batch),
+            )
+
+
+def record_items(order, items, sign=1):
+    """Add ``items`` of ``order`` to the per-product rollup."""
+    quantities = defaultdict(int)
+    totals = defaultdict(int)
+    for item in items:
+        quantities[item.product_id] += sign * item.quantity
+        totals[item.product_id] += sign * item.price
+    bump_products(day(order.created_at), quantities, totals, {product_id: sign for product_id in quantities})
+
+
+def record_cancellation(order_ids, sign=-1):
+    """
+    Take the items of the orders ``order_ids`` out of the per-product
+    rollup when they are cancelled; ``sign=1`` puts them back when a
+    cancelled order is restored.
+    """
+    by_date = defaultdict(lambda: (defaultdict(int), defaultdict(int), defaultdict(set)))
+    items = OrderItem.objects.filter(order_id__in=order_ids).values_list(
+        'order_id', 'order__created_at', 'product_id', 'quantity', 'price',
+    )
+    for order_id, created_at, product_id, quantity, price in items:
+        quantities, totals, orders = by_date[day(created_at)]
+        quantities[product_id] += sign * quantity
+        totals[product_id] += sign * price
+        orders[product_id].add(order_id)
+    for date, (quantities, totals, orders) in by_date.items():
+        bump_products(date, quantities, totals,
+                      {product_id: sign * len(ids) for product_id, ids in orders.items()})
+
+
+def record_status_change(previous, status):
+    """``previous`` maps old statuses to the ids of the orders that left them for ``status``."""
+    moved = 0
+    for old_status, order_ids in previous.items():
+        if old_status != status:
+            bump(OrderStatusCount, [{'status': old_status}], {'count': -len(order_ids)})
+            moved += len(order_ids)
+    bump(OrderStatusCount, [{'status': status}], {'count': moved})
+
+    if status == 'cancelled':
+        record_cancellation([order_id for old_status, order_ids in previous.items()
+                             if old_status != status for order_id in order_ids])
+    elif previous.get('cancelled'):
+        record_cancellation(previous['cancelled'], sign=1)
+
+
+def record_ticket(ticket, sign=1):
+    bump(DailySupport, [{'date': day(ticket.created_at)}], {
+        'tickets': sign,
+        'resolved': sign * int(ticket.status == 'resolved'),
+    })
+
+
+def rebuild(batch_size=1000):
+    """Recompute every rollup table; returns ``{table: rows}``."""
+    sales = (
+        Order.objects.annotate(date=TruncDate('created_at')).values('date')
+        .annotate(orders=Count('id'), total=Sum('total_amount')).order_by()
+    )
+    product_sales = (
+        OrderItem.objects.exclude(order__status='cancelled')
+        .annotate(date=TruncDate('order__created_at')).values('date', 'product_id')
+        .annotate(quantity=Sum('quantity'), total=Sum('price'), orders=Count('order_id', distinct=True))
+        .order_by()
+    )
+    support = (
+        SupportTicket.objects.annotate(date=TruncDate('created_at')).values('date')
+        .annotate(tickets=Count('id'), resolved=Count('id', filter=Q(status='resolved'))).order_by()
+    )
+    statuses = Order.objects.values('status').annotate(count=Count('id')).order_by()
+
+    counts = defaultdict(int)
+    with transaction.atomic():
+        for model, rows in (
+            (DailySales, sales),
+            (DailyProductSales, product_sales),
+            (DailySupport, support),
+            (OrderStatusCount, statuses),
+        ):
+            model.objects.all().delete()
+            batch = []
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(model(**row))
+                if len(batch) >= batch_size:
+                    model.objects.bulk_create(batch)
+                    counts[model._meta.db_table] += len(batch)
+                    batch = []
+            if batch:
+                model.objects.bulk_create(batch)
+                counts[model._meta.db_table] += len(batch)
+    return dict(counts)
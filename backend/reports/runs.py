@@ -0,0 +1,76 @@
+"""
+Reports computed outside the request cycle.
+
+``submit`` validates a report spec and returns its ReportRun, queueing a
+``reports.build_report`` job for ``manage.py run_workers`` unless a fresh
+result for the same spec is already stored or on its way. Workers write
+the rows to the run; clients poll the run until ``finished_at`` is set.
+Runs are not pushed over the realtime connection: workers run in their
+own process and the in-process broadcaster cannot reach its clients.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from jobs import queue
+from .models import ReportRun
+from . import engine
+
+BUILD_TASK = 'reports.build_report'
+
+
+def result_ttl():
+    """How long a stored result is served before the report is run again."""
+    return timedelta(seconds=getattr(settings, 'REPORT_RESULT_TTL', 300))
+
+
+def spec_hash(spec):
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+def is_stale(run):
+    if run.finished_at is not None:
+        return run.finished_at < timezone.now() - result_ttl()
+    return run.job is None or run.job.status == 'failed'
+
+
+def submit(report, params, user=None):
+    """Return ``(run, queued)`` for the report; raises ValueError for a bad spec."""
+    spec = engine.parse_spec(report, params)
+    run = ReportRun.objects.select_related('job').filter(spec_hash=spec_hash(spec)).first()
+    if run is not None and not is_stale(run):
+        return run, False
+
+    with transaction.atomic():
+        run, created = ReportRun.objects.select_related('job').get_or_create(
+            spec_hash=spec_hash(spec), defaults={'spec': spec, 'requested_by': user},
+        )
+        if not created and not is_stale(run):
+            return run, False
+
+        job = queue.enqueue(BUILD_TASK, {'run_id': run.id}, max_attempts=3)
+        # Only one of several clients refreshing the same run gets to queue it;
+        # the run keeps the user who first requested it
+        refreshed = ReportRun.objects.filter(pk=run.pk, job_id=run.job_id, finished_at=run.finished_at).update(
+            job=job, result=None, finished_at=None,
+        )
+        if not refreshed:
+            job.delete()
+            return ReportRun.objects.select_related('job').get(pk=run.pk), False
+    run.job, run.result, run.finished_at = job, None, None
+    return run, True
+
+
+def build(run_id):
+    """Compute and store the rows of run ``run_id``."""
+    run = ReportRun.objects.filter(pk=run_id).first()
+    if run is None:
+        return None
+    rows = engine.run_spec(run.spec)
+    run.finished_at = timezone.now()
+    ReportRun.objects.filter(pk=run.pk).update(result=rows, finished_at=run.finished_at)
+    return run, len(rows)
@@ -0,0 +1,32 @@
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+from .models import ReportRun
+
+class ReportRunSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(read_only=True)
+    rows = serializers.SerializerMethodField()
+    downloads = serializers.SerializerMethodField()
+    error = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportRun
+        fields = ('id', 'spec', 'status', 'rows', 'downloads', 'error', 'created_at', 'finished_at')
+        read_only_fields = fields
+
+    def get_rows(self, obj):
+        return len(obj.result) if obj.result is not None else None
+
+    def get_downloads(self, obj):
+        if obj.finished_at is None:
+            return None
+        request = self.context.get('request')
+        return {
+            extension: reverse('report-run-result', args=[obj.id, extension], request=request)
+            for extension in ('json', 'csv')
+        }
+
+    def get_error(self, obj):
+        # Only the last line of the traceback, which names the exception
+        if obj.status == 'failed' and obj.job and obj.job.last_error:
+            return obj.job.last_error.strip().splitlines()[-1]
+        return None
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from orders.models import Order
+from orders.signals import order_placed, order_status_changed
+from support.models import SupportTicket
+from . import rollups
+
+ORDER_FIELDS = ('created_at', 'status', 'total_amount')
+TICKET_FIELDS = ('created_at', 'status')
+
+
+def snapshot(instance, fields):
+    # Read from __dict__ so deferred fields are not loaded just for this
+    values = {name: instance.__dict__.get(name) for name in fields}
+    return SimpleNamespace(**values) if None not in values.values() else None
+
+
+def changed(instance, fields):
+    """Return ``(before, after)`` snapshots when any of ``fields`` changed since loading."""
+    before = getattr(instance, '_report_snapshot', None)
+    after = snapshot(instance, fields)
+    instance._report_snapshot = after
+    if before is None or after is None or before == after:
+        return None
+    return before, after
+
+
+@receiver(post_init, sender=Order)
+def remember_order(sender, instance, **kwargs):
+    instance._report_snapshot = snapshot(instance, ORDER_FIELDS)
+
+
+@receiver(post_save, sender=Order)
+def roll_up_order(sender, instance, created, **kwargs):
+    if created:
+        instance._report_snapshot = snapshot(instance, ORDER_FIELDS)
+        rollups.record_order(instance)
+        return
+    change = changed(instance, ORDER_FIELDS)
+    if change:
+        rollups.record_order(change[0], sign=-1)
+        rollups.record_order(change[1])
+        before, after = change
+        if (before.status == 'cancelled') != (after.status == 'cancelled'):
+            rollups.record_cancellation([instance.pk], sign=1 if before.status == 'cancelled' else -1)
+
+
+@receiver(order_placed, sender=Order)
+def roll_up_order_items(sender, order, items, **kwargs):
+    rollups.record_items(order, items)
+
+
+@receiver(order_status_changed, sender=Order)
+def roll_up_order_status(sender, status, previous, **kwargs):
+    rollups.record_status_change(previous, status)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order(sender, instance, **kwargs):
+    # Before the cascade takes the items with it; cancelled ones are already out
+    rollups.record_order(instance, sign=-1)
+    if instance.status != 'cancelled':
+        rollups.record_items(instance, instance.items.all(), sign=-1)
+
+
+@receiver(post_init, sender=SupportTicket)
+def remember_ticket(sender, instance, **kwargs):
+    instance._report_snapshot = snapshot(instance, TICKET_FIELDS)
+
+
+@receiver(post_save, sender=SupportTicket)
+def roll_up_ticket(sender, instance, created, **kwargs):
+    if created:
+        instance._report_snapshot = snapshot(instance, TICKET_FIELDS)
+        rollups.record_ticket(instance)
+        return
+    change = changed(instance, TICKET_FIELDS)
+    if change:
+        rollups.record_ticket(change[0], sign=-1)
+        rollups.record_ticket(change[1])
+
+
+@receiver(post_delete, sender=SupportTicket)
+def remove_ticket(sender, instance, **kwargs):
+    rollups.record_ticket(instance, sign=-1)
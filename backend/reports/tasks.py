@@ -0,0 +1,11 @@
+from jobs.queue import task
+from . import runs
+
+
+@task(runs.BUILD_TASK)
+def build_report(run_id):
+    built = runs.build(run_id)
+    if built is None:
+        return None
+    run, rows = built
+    return {'run': run.id, 'rows': rows}
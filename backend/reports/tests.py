@@ -1,3 +1,366 @@
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from jobs import queue
+from jobs.models import Job
+from labs.models import Lab
+from orders.models import Order, OrderStatusChange
+from products.models import Product
+from support.models import SupportTicket
+from .models import DailySales, DailyProductSales, DailySupport, OrderStatusCount, ReportRun
+from . import rollups, runs
+
+
+def table_rows():
+    return {
+        model._meta.db_table: sorted(
+            tuple(value for name, value in row.items() if name != 'id')
+            for row in model.objects.values()
+        )
+        for model in (DailySales, DailyProductSales, DailySupport, OrderStatusCount)
+    }
+
+
+class ReportRollupTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer', password='pass', role='customer')
+        self.manager = User.objects.create_user(username='manager', password='pass', role='manager')
+        self.products = [
+            Product.objects.create(name=f'Kit {i}', description='', price=Decimal('10.00'), stock=100)
+            for i in range(2)
+        ]
+        self.lab = Lab.objects.create(title='Lab', description='', content='Body')
+        self.client = APIClient()
+
+    def place_order(self, *quantities):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/orders/', {
+            'shipping_address': 'Somewhere',
+            'items': [{'product_id': product.id, 'quantity': quantity}
+                      for product, quantity in zip(self.products, quantities)],
+        }, format='json')
+        return response.data['id']
+
+    def test_rollups_follow_orders_and_tickets(self):
+        first = self.place_order(1, 2)
+        second = self.place_order(3)
+        self.place_order(1, 1)
+        Order.objects.filter(pk=first).set_status('shipped')
+        Order.objects.filter(pk=second).set_status('cancelled')
+        Order.objects.filter(pk=second).delete()
+
+        ticket = SupportTicket.objects.create(title='Help', description='', user=self.customer, lab=self.lab)
+        SupportTicket.objects.create(title='More', description='', user=self.customer, lab=self.lab)
+        ticket.status = 'resolved'
+        ticket.save()
+
+        today = timezone.localdate()
+        self.assertEqual(DailySales.objects.get(date=today).orders, 2)
+        self.assertEqual(DailySales.objects.get(date=today).total, Decimal('50.00'))
+        self.assertEqual(DailyProductSales.objects.get(date=today, product=self.products[0]).quantity, 2)
+        self.assertEqual(dict(OrderStatusCount.objects.values_list('status', 'count')),
+                         {'pending': 1, 'shipped': 1, 'cancelled': 0})
+        self.assertEqual((DailySupport.objects.get().tickets, DailySupport.objects.get().resolved), (2, 1))
+
+        # Incremental maintenance agrees with a full recount
+        maintained = table_rows()
+        rollups.rebuild()
+        rebuilt = table_rows()
+        maintained['report_order_status_counts'].remove(('cancelled', 0))
+        self.assertEqual(maintained, rebuilt)
+
+    def test_cancelled_orders_leave_product_rankings(self):
+        kept = self.place_order(1, 2)
+        cancelled = self.place_order(5, 1)
+        saved = self.place_order(2, 4)
+        Order.objects.filter(pk__in=[kept, cancelled]).set_status('processing')
+        Order.objects.filter(pk__in=[kept, cancelled]).set_status('cancelled')
+        Order.objects.filter(pk=kept).set_status('processing')
+        order = Order.objects.get(pk=saved)
+        order.status = 'cancelled'
+        order.save()
+
+        today = timezone.localdate().isoformat()
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/reports/products/', {'start_date': today, 'end_date': today,
+                                                               'rank_by': 'units'})
+        self.assertEqual([(row['name'], row['units'], row['orders']) for row in response.data['results']],
+                         [('Kit 1', 2, 1), ('Kit 0', 1, 1)])
+
+        maintained = table_rows()
+        rollups.rebuild()
+        self.assertEqual(maintained['report_daily_product_sales'], table_rows()['report_daily_product_sales'])
+
+    def test_reports_read_only_rollup_rows(self):
+        self.place_order(1, 1)
+        self.place_order(2)
+        Order.objects.update(created_at=timezone.now() - timedelta(days=3))
+        rollups.rebuild()
+        self.client.force_authenticate(self.manager)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/reports/sales/')
+        self.assertEqual([(row['orders'], row['total']) for row in response.data if row['orders']],
+                         [(2, Decimal('40.00'))])
+
+        response = self.client.get(f'/api/reports/sales/?product={self.products[0].id}')
+        self.assertEqual([row['quantity'] for row in response.data if row['quantity']], [3])
+        self.assertEqual(self.client.get('/api/reports/sales/?product=x').status_code, 400)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/reports/delivery/')
+        self.assertEqual(list(response.data), [{'status': 'pending', 'count': 2}])
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/reports/support/')
+        self.assertFalse(any(row['tickets'] for row in response.data))
+
+
+class ProductRankingTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='pass', role='manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+        self.products = Product.objects.bulk_create([
+            Product(name=f'Kit {i}', description='', price=Decimal('10.00'), stock=100) for i in range(300)
+        ])
+        # Product i sells i units a day for revenue of 300 - i, in i % 7 + 1 orders
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(date=date(2024, 1, day), product=product, quantity=i,
+                              total=Decimal(300 - i), orders=i % 7 + 1)
+            for day in (1, 2) for i, product in enumerate(self.products)
+        ])
+
+    def get(self, **params):
+        params = {'start_date': '2024-01-01', 'end_date': '2024-01-02', **params}
+        return self.client.get('/api/reports/products/', params)
+
+    def test_ranks_by_revenue_units_and_orders(self):
+        with self.assertNumQueries(2):
+            data = self.get(limit=3).data
+        self.assertEqual([row['name'] for row in data['results']], ['Kit 0', 'Kit 1', 'Kit 2'])
+        self.assertEqual(data['results'][0], {
+            'rank': 1, 'product_id': self.products[0].id, 'name': 'Kit 0', 'revenue': Decimal('600'),
+            'units': 0, 'orders': 2, 'revenue_share': 0.7,
+        })
+        self.assertEqual(data['total_units'], 299 * 300)
+
+        data = self.get(rank_by='units', limit=2).data
+        self.assertEqual([row['units'] for row in data['results']], [598, 596])
+        # Equal order counts rank the lower product id first
+        data = self.get(rank_by='orders', limit=2).data
+        self.assertEqual([row['name'] for row in data['results']], ['Kit 6', 'Kit 13'])
+
+        data = self.get(start_date='2024-01-02', end_date='2024-01-02', limit=1).data
+        self.assertEqual(data['results'][0]['revenue'], Decimal('300'))
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'rank_by': 'margin'}, {'limit': 0}, {'limit': 'all'}, {'start_date': 'x'}):
+            self.assertEqual(self.get(**params).status_code, 400, params)
+
+
+class FulfillmentReportTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='pass', role='manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+        placed = timezone.make_aware(datetime(2024, 3, 4, 9))
+        # Order i ships 2i + 1 hours after it is placed and is delivered a day later
+        orders = Order.objects.bulk_create([
+            Order(customer=self.manager, total_amount=Decimal('1.00'), shipping_address='x', status='delivered')
+            for _ in range(100)
+        ])
+        Order.objects.update(created_at=placed)
+        changes = []
+        for i, order in enumerate(orders):
+            shipped = placed + timedelta(hours=2 * i + 1)
+            changes += [
+                OrderStatusChange(order=order, to_status='pending', changed_at=placed),
+                OrderStatusChange(order=order, from_status='pending', to_status='shipped', changed_at=shipped),
+                OrderStatusChange(order=order, from_status='shipped', to_status='delivered',
+                                  changed_at=shipped + timedelta(days=1)),
+            ]
+        OrderStatusChange.objects.bulk_create(changes)
+
+    def test_percentiles_per_period(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/reports/fulfillment/', {
+                'start_date': '2024-03-04', 'end_date': '2024-03-17', 'granularity': 'week',
+            })
+        first, second = response.data
+        # 159 hours of the first week are left after 9am on Monday, so it
+        # holds the orders shipped after 1, 3, ... 157 hours
+        self.assertEqual(first['pending_to_shipped_count'], 79)
+        self.assertEqual((first['pending_to_shipped_p50'], first['pending_to_shipped_p90'],
+                          first['pending_to_shipped_p99']), (79, 143, 157))
+        self.assertEqual(second['pending_to_shipped_count'], 21)
+        self.assertEqual(first['shipped_to_delivered_p99'], 24)
+        self.assertEqual((first['pending_to_delivered_count'], second['pending_to_delivered_count']), (67, 33))
+        self.assertEqual(second['pending_to_delivered_p99'], 199 + 24)
+
+    def test_orders_without_a_stage_are_left_out_of_it(self):
+        placed = timezone.make_aware(datetime(2024, 3, 4, 9))
+        order = Order.objects.create(customer=self.manager, total_amount=Decimal('1.00'),
+                                     shipping_address='x', status='delivered')
+        Order.objects.filter(pk=order.pk).update(created_at=placed)
+        # Delivered straight from pending 500 hours later, at 5am on the 25th
+        OrderStatusChange.objects.create(order=order, from_status='pending', to_status='delivered',
+                                         changed_at=placed + timedelta(hours=500))
+        response = self.client.get('/api/reports/fulfillment/', {
+            'start_date': '2024-03-25', 'end_date': '2024-03-25', 'granularity': 'hour',
+        })
+        row = response.data[5]
+        self.assertEqual((row['pending_to_delivered_count'], row['pending_to_delivered_p50']), (1, 500))
+        self.assertEqual((row['shipped_to_delivered_count'], row['shipped_to_delivered_p50']), (0, None))
+        self.assertEqual(sum(row['pending_to_delivered_count'] for row in response.data), 1)
+
+    def test_empty_and_invalid_periods(self):
+        response = self.client.get('/api/reports/fulfillment/', {'start_date': '2024-03-20',
+                                                                  'end_date': '2024-03-20'})
+        self.assertEqual(response.data[0]['pending_to_shipped_p50'], None)
+        self.assertEqual(self.client.get('/api/reports/fulfillment/', {'granularity': 'year'}).status_code, 400)
+
+
+class ReportEngineTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='pass', role='manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+        # Every day of 2023 and 2024: one order of 10.00 (two on Mondays)
+        day = date(2023, 1, 1)
+        rows = []
+        while day <= date(2024, 12, 31):
+            orders = 2 if day.weekday() == 0 else 1
+            rows.append(DailySales(date=day, orders=orders, total=Decimal('10.00') * orders))
+            day += timedelta(days=1)
+        DailySales.objects.bulk_create(rows)
+
+    def get(self, **params):
+        response = self.client.get('/api/reports/sales/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_buckets_by_week_and_month(self):
+        rows = self.get(start_date='2024-01-01', end_date='2024-01-31', granularity='week')
+        self.assertEqual(rows[0]['date'], date(2024, 1, 1))
+        self.assertEqual(rows[0]['orders'], 8)
+        # Ranges widen to whole buckets, the last week runs into February
+        self.assertEqual((rows[-1]['date'], rows[-1]['orders']), (date(2024, 1, 29), 8))
+
+        rows = self.get(start_date='2023-01-15', end_date='2024-12-31', granularity='month')
+        self.assertEqual(len(rows), 24)
+        self.assertEqual(rows[0]['date'], date(2023, 1, 1))
+        self.assertEqual(sum(row['orders'] for row in rows), 731 + 105)
+        self.assertEqual(rows[-1]['total'], 360.0)
+
+    def test_moving_average_and_previous_period(self):
+        rows = self.get(start_date='2024-02-01', end_date='2024-02-29', granularity='month',
+                        moving_average=1, compare='previous')
+        [row] = rows
+        self.assertEqual(row['orders'], 33)
+        self.assertEqual(row['orders_moving_avg'], 33)
+        self.assertEqual(row['previous_orders'], 36)
+        self.assertEqual(row['orders_change'], -8.3)
+
+        rows = self.get(start_date='2024-01-01', end_date='2024-01-07', moving_average=3)
+        self.assertEqual([row['orders_moving_avg'] for row in rows], [None, None, 1.33, 1.0, 1.0, 1.0, 1.0])
+
+    def test_hourly_buckets_read_orders(self):
+        customer = User.objects.create_user(username='customer', password='pass', role='customer')
+        order = Order.objects.create(customer=customer, total_amount=Decimal('5.50'), shipping_address='x')
+        Order.objects.filter(pk=order.pk).update(
+            created_at=timezone.make_aware(datetime(2025, 3, 2, 14, 30)))
+        rows = self.get(start_date='2025-03-02', end_date='2025-03-02', granularity='hour')
+        self.assertEqual(len(rows), 24)
+        self.assertEqual([(row['date'].hour, row['total']) for row in rows if row['orders']], [(14, 5.5)])
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'granularity': 'year'}, {'moving_average': 0}, {'compare': 'yesterday'},
+                       {'start_date': '2024-02-01', 'end_date': '2024-01-01'}, {'start_date': 'x', 'end_date': 'y'},
+                       {'start_date': '1900-01-01', 'end_date': '2024-01-01', 'granularity': 'hour'}):
+            self.assertEqual(self.client.get('/api/reports/sales/', params).status_code, 400, params)
+
+    def test_multi_year_daily_report_is_fast(self):
+        started = time.perf_counter()
+        rows = self.get(start_date='2023-01-01', end_date='2024-12-31', moving_average=7, compare='previous')
+        self.assertEqual(len(rows), 731)
+        self.assertLess(time.perf_counter() - started, 1)
+
+
+class ReportRunTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='pass', role='manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+        DailySales.objects.bulk_create([
+            DailySales(date=date(2024, 1, day), orders=day, total=Decimal('2.50') * day) for day in range(1, 11)
+        ])
+        self.spec = {'report': 'sales', 'start_date': '2024-01-01', 'end_date': '2024-01-10'}
+
+    def test_run_is_queued_then_downloaded(self):
+        response = self.client.post('/api/reports/runs/', self.spec, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertIsNone(response.data['downloads'])
+        url = f"/api/reports/runs/{response.data['id']}/"
+        self.assertEqual(self.client.get(url + 'result.csv').status_code, 409)
+
+        self.assertEqual(queue.run_pending(), 1)
+        response = self.client.get(url)
+        self.assertEqual((response.data['status'], response.data['rows']), ('succeeded', 10))
+
+        response = self.client.get(url + 'result.json')
+        self.assertEqual(response.data[2], {'date': '2024-01-03', 'total': 7.5, 'orders': 3})
+        response = self.client.get(url + 'result.csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines[:2], ['date,total,orders', '2024-01-01,2.5,1'])
+        self.assertEqual(self.client.get(url + 'result.xml').status_code, 404)
+
+    def test_same_spec_reuses_the_result(self):
+        first = self.client.post('/api/reports/runs/', self.spec, format='json').data
+        # Equivalent parameters hash to the same run while it is pending
+        again = self.client.post('/api/reports/runs/', dict(self.spec, granularity='day'), format='json')
+        self.assertEqual((again.status_code, again.data['id']), (202, first['id']))
+        queue.run_pending()
+
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/reports/runs/', self.spec, format='json')
+        self.assertEqual((response.status_code, response.data['id']), (200, first['id']))
+        self.assertEqual(Job.objects.count(), 1)
+
+        # Stale results are computed again
+        ReportRun.objects.update(finished_at=timezone.now() - runs.result_ttl() * 2)
+        response = self.client.post('/api/reports/runs/', self.spec, format='json')
+        self.assertEqual((response.status_code, response.data['id']), (202, first['id']))
+        self.assertEqual(queue.run_pending(), 1)
+
+    def test_refresh_keeps_the_requester(self):
+        run, _ = runs.submit('support', {}, user=self.manager)
+        other = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.assertEqual(runs.submit('support', {}, user=other)[0].requested_by, self.manager)
+        queue.run_pending()
+        ReportRun.objects.update(finished_at=timezone.now() - runs.result_ttl() * 2)
+        refreshed, queued = runs.submit('support', {}, user=other)
+        self.assertTrue(queued)
+        self.assertEqual(refreshed.requested_by, self.manager)
+        self.assertEqual(ReportRun.objects.get(pk=run.pk).requested_by, self.manager)
+
+    def test_failed_runs_report_the_error_and_can_be_retried(self):
+        run, _ = runs.submit('sales', self.spec)
+        Job.objects.filter(pk=run.job_id).update(status='failed', last_error='Traceback\nValueError: boom')
+        response = self.client.get(f'/api/reports/runs/{run.id}/')
+        self.assertEqual((response.data['status'], response.data['error']), ('failed', 'ValueError: boom'))
+        self.assertEqual(self.client.post('/api/reports/runs/', self.spec, format='json').status_code, 202)
 
-# Create your tests here.
+    def test_rejects_bad_specs(self):
+        for spec in ({'report': 'payroll'}, {'report': 'sales', 'granularity': 'year'},
+                     {'report': 'sales', 'product': 'x'}):
+            self.assertEqual(self.client.post('/api/reports/runs/', spec, format='json').status_code, 400, spec)
+        self.assertFalse(ReportRun.objects.exists())
@@ -1,8 +1,16 @@
 from django.urls import path
-from .views import SalesReportView, SupportReportView, DeliveryReportView
+from .views import (
+    SalesReportView, SupportReportView, ProductSalesReportView, FulfillmentReportView, DeliveryReportView,
+    ReportRunListView, ReportRunDetailView, ReportRunResultView,
+)
 
 urlpatterns = [
     path('sales/', SalesReportView.as_view(), name='sales-report'),
     path('support/', SupportReportView.as_view(), name='support-report'),
+    path('products/', ProductSalesReportView.as_view(), name='product-sales-report'),
+    path('fulfillment/', FulfillmentReportView.as_view(), name='fulfillment-report'),
     path('delivery/', DeliveryReportView.as_view(), name='delivery-report'),
+    path('runs/', ReportRunListView.as_view(), name='report-runs'),
+    path('runs/<int:pk>/', ReportRunDetailView.as_view(), name='report-run-detail'),
+    path('runs/<int:pk>/result.<str:extension>', ReportRunResultView.as_view(), name='report-run-result'),
 ] 
\ No newline at end of file
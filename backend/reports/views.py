@@ -1,66 +1,144 @@
-from django.shortcuts import render
+import csv
+import io
+
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404, render
+from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import permission_classes
-from django.db.models import Count, Sum
-from django.db.models.functions import TruncDate
-from orders.models import Order
-from support.models import SupportTicket
-from datetime import datetime, timedelta
-from django.db.models import Q
+from .models import OrderStatusCount, ReportRun
+from .serializers import ReportRunSerializer
+from . import engine, runs
 
 # Create your views here.
+# Time series come from reports.engine, which reads the rollup tables
+# maintained by reports.rollups.
 
-class SalesReportView(APIView):
+class TimeSeriesReportView(APIView):
+    """
+    A report over ``start_date``..``end_date`` (the last 30 days by
+    default), bucketed by ``granularity`` (hour, day, week or month).
+    ``moving_average=<n>`` adds a trailing mean over n buckets and
+    ``compare=previous`` the figures of the preceding period.
+    """
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'reports'
+    read_replica = True
+    report = None
 
     def get(self, request):
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-
-        if not start_date or not end_date:
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=30)
-        else:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d')
-            end_date = datetime.strptime(end_date, '%Y-%m-%d')
+        try:
+            spec = engine.parse_spec(self.report, request.query_params)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(engine.run_spec(spec))
 
-        sales_data = Order.objects.filter(
-            created_at__date__range=[start_date, end_date]
-        ).annotate(
-            date=TruncDate('created_at')
-        ).values('date').annotate(
-            total=Sum('total_amount'),
-            orders=Count('id')
-        ).order_by('date')
+class SalesReportView(TimeSeriesReportView):
+    report = 'sales'
 
-        return Response(sales_data)
+class SupportReportView(TimeSeriesReportView):
+    report = 'support'
 
-class SupportReportView(APIView):
+class ProductSalesReportView(APIView):
+    """
+    Top products over ``start_date``..``end_date`` (the last 30 days by
+    default), ranked by ``rank_by`` (revenue, units or orders) and cut to
+    ``limit`` rows.
+    """
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'reports'
+    read_replica = True
 
     def get(self, request):
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30)
+        params = request.query_params
+        rank_by = params.get('rank_by', 'revenue')
+        if rank_by not in engine.RANKINGS:
+            return Response({'error': f"rank_by must be one of {', '.join(engine.RANKINGS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start_date, end_date = engine.parse_range(params)
+            limit = int(params.get('limit', 10))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= engine.MAX_RANKING_LIMIT:
+            return Response({'error': f'limit must be between 1 and {engine.MAX_RANKING_LIMIT}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(engine.product_ranking(start_date, end_date, rank_by=rank_by, limit=limit))
 
-        support_data = SupportTicket.objects.filter(
-            created_at__date__range=[start_date, end_date]
-        ).annotate(
-            date=TruncDate('created_at')
-        ).values('date').annotate(
-            tickets=Count('id'),
-            resolved=Count('id', filter=Q(status='resolved'))
-        ).order_by('date')
+class FulfillmentReportView(APIView):
+    """
+    Percentiles of the hours orders spent from placement to shipping, from
+    shipping to delivery and from placement to delivery, per ``granularity``
+    bucket (a week by default) of when each stage was reached.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'reports'
+    read_replica = True
 
-        return Response(support_data)
+    def get(self, request):
+        try:
+            buckets = engine.parse_buckets(request.query_params, default_granularity='week')
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(engine.fulfillment_report(buckets))
 
 class DeliveryReportView(APIView):
     permission_classes = [IsAuthenticated]
+    read_replica = True
 
     def get(self, request):
-        delivery_data = Order.objects.values('status').annotate(
-            count=Count('id')
-        ).order_by('status')
+        delivery_data = OrderStatusCount.objects.filter(count__gt=0).values('status', 'count').order_by('status')
 
         return Response(delivery_data)
+
+class ReportRunListView(APIView):
+    """
+    POST ``{"report": "sales" | "support", ...}`` with the parameters of
+    that report to compute it in the background. Answers 202 with the run
+    to poll through its detail URL until it is finished, or 200 when a
+    fresh result for the same spec already exists.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'reports'
+
+    def post(self, request):
+        try:
+            run, queued = runs.submit(request.data.get('report'), request.data, user=request.user)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        data = ReportRunSerializer(run, context={'request': request}).data
+        return Response(data, status=status.HTTP_200_OK if run.finished_at else status.HTTP_202_ACCEPTED)
+
+class ReportRunDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        run = get_object_or_404(ReportRun.objects.select_related('job').defer('result'), pk=pk)
+        return Response(ReportRunSerializer(run, context={'request': request}).data)
+
+class ReportRunResultView(APIView):
+    """The stored rows of a finished run as a ``.json`` or ``.csv`` download."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, extension):
+        if extension not in ('json', 'csv'):
+            raise Http404
+        run = get_object_or_404(ReportRun.objects.select_related('job'), pk=pk)
+        if run.finished_at is None:
+            return Response({'error': 'Report is not ready', 'status': run.status},
+                            status=status.HTTP_409_CONFLICT)
+
+        filename = f"{run.spec['report']}-report-{run.id}.{extension}"
+        if extension == 'json':
+            response = Response(run.result)
+        else:
+            output = io.StringIO()
+            if run.result:
+                writer = csv.DictWriter(output, fieldnames=list(run.result[0]))
+                writer.writeheader()
+                writer.writerows(run.result)
+            response = HttpResponse(output.getvalue(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -2,6 +2,8 @@
 ASGI config for stem_kit_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Besides the Django views it serves the realtime push endpoints (see
+``realtime.asgi``), so run it under an ASGI server such as uvicorn.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +15,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stem_kit_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up by get_asgi_application()
+from realtime.asgi import with_push_endpoints  # noqa: E402
+
+application = with_push_endpoints(django_application)
@@ -0,0 +1,122 @@
+"""
+Read replicas.
+
+``READ_REPLICAS`` names database aliases holding copies of ``default``.
+ReadReplicaMiddleware marks the GET requests of views that opt in (report
+views with ``read_replica = True``, viewsets through the actions listed in
+``read_replica_actions``) and picks one replica for the whole request.
+ReadReplicaRouter then sends their reads there until the request writes
+anything; from then on, and inside any transaction on the primary, reads
+go back to ``default`` so a request always sees its own writes. Accounts
+are always read from the primary, so a user who just registered can
+authenticate at once. Every other request never touches a replica.
+
+Replicas are expected to lag behind, so nothing read from one should be
+cached past the request (see ``read_from_replica``). For SQLite,
+``sync_replicas`` copies the primary over the replica files.
+"""
+import contextvars
+import random
+import sqlite3
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaState:
+    __slots__ = ('alias', 'wrote', 'read')
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.wrote = False
+        self.read = False
+
+
+_current = contextvars.ContextVar('read_replica', default=None)
+
+
+def replicas():
+    return getattr(settings, 'READ_REPLICAS', [])
+
+
+def reads_from_replica(view_func, method):
+    """Whether a ``method`` request to the resolved ``view_func`` may read from a replica."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None or method not in SAFE_METHODS:
+        return False
+    actions = getattr(view_func, 'actions', None)
+    if actions is not None:
+        return actions.get(method.lower()) in getattr(cls, 'read_replica_actions', ())
+    return getattr(cls, 'read_replica', False)
+
+
+def use_replica(alias):
+    """Route the reads of the current request to ``alias``; returns a token for ``release``."""
+    return _current.set(ReplicaState(alias))
+
+
+def release(token):
+    _current.reset(token)
+
+
+def read_from_replica():
+    """Whether the current request has read anything from a replica."""
+    state = _current.get()
+    return state is not None and state.read
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None or state.wrote or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if model._meta.label == settings.AUTH_USER_MODEL:
+            return DEFAULT_DB_ALIAS
+        state.read = True
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema with the data
+        return db not in replicas()
+
+
+class ReadReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            token = getattr(request, '_read_replica_token', None)
+            if token is not None:
+                release(token)
+                del request._read_replica_token
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        aliases = replicas()
+        if aliases and reads_from_replica(view_func, request.method):
+            request._read_replica_token = use_replica(random.choice(aliases))
+
+
+def copy_sqlite(source, path):
+    """Copy the SQLite database of the ``source`` alias to the file at ``path``, consistently."""
+    connection = connections[source]
+    connection.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        connection.connection.backup(target)
+    finally:
+        target.close()
@@ -0,0 +1,175 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware measures wall time, database queries and time, DRF
+serializer time and response render time for every request. The numbers
+go out as a ``Server-Timing`` header and as one JSON log line on the
+``stem_kit_backend.perf`` logger: WARNING for requests slower than
+``PERF_SLOW_REQUEST_MS``, INFO for the rest. With ``PERF_PROFILE_SAMPLE_RATE`` set, a
+sample of requests runs under cProfile and those slower than
+``PERF_PROFILE_SLOW_MS`` are dumped to ``PERF_PROFILE_DIR``. A profiler
+hooks the whole thread, so only one request per process is profiled at a
+time; sampled requests overlapping it simply run unprofiled.
+"""
+import cProfile
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger('stem_kit_backend.perf')
+
+_current = contextvars.ContextVar('perf_metrics', default=None)
+_profiling = threading.Lock()
+
+
+class RequestMetrics:
+    __slots__ = ('db_queries', 'db_time', 'serializer_time', 'serializer_depth', 'render_time')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.db_queries += 1
+
+
+def _timed_data(original):
+    fget = original.fget
+
+    def data(self):
+        metrics = _current.get()
+        # Outside a measured request, and for nested serializers, the
+        # original property runs untouched
+        if metrics is None or metrics.serializer_depth:
+            return fget(self)
+        metrics.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+            metrics.serializer_depth -= 1
+    return property(data)
+
+
+_serializers_instrumented = False
+
+
+def instrument_serializers():
+    """
+    Time the top-level ``.data`` of DRF serializers used inside requests
+    measured by PerformanceMiddleware (idempotent). Anywhere else, such as
+    management commands, workers or requests with instrumentation off,
+    the patched property only reads the ``_current`` contextvar.
+    """
+    global _serializers_instrumented
+    if _serializers_instrumented:
+        return
+    for cls in (serializers.BaseSerializer, serializers.Serializer, serializers.ListSerializer):
+        if 'data' in cls.__dict__:
+            cls.data = _timed_data(cls.__dict__['data'])
+    _serializers_instrumented = True
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PERF_INSTRUMENTATION', True)
+        self.sample_rate = getattr(settings, 'PERF_PROFILE_SAMPLE_RATE', 0.0)
+        self.slow_ms = getattr(settings, 'PERF_PROFILE_SLOW_MS', 500)
+        self.profile_dir = getattr(settings, 'PERF_PROFILE_DIR', None)
+        self.slow_request_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', 1000)
+        if self.enabled:
+            instrument_serializers()
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        profiler = None
+        if (self.sample_rate and self.profile_dir and random.random() < self.sample_rate
+                and _profiling.acquire(blocking=False)):
+            profiler = cProfile.Profile()
+
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            _current.reset(token)
+            if profiler is not None:
+                _profiling.release()
+        duration = time.perf_counter() - start
+
+        self.report(request, response, metrics, duration)
+        if profiler is not None and duration * 1000 >= self.slow_ms:
+            self.dump_profile(request, profiler)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that too
+        metrics = _current.get()
+        if metrics is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                metrics.render_time += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, metrics, duration):
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={duration * 1000:.1f}',
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.db_queries} queries"',
+            f'serialize;dur={metrics.serializer_time * 1000:.1f}',
+            f'render;dur={metrics.render_time * 1000:.1f}',
+        ])
+        level = logging.WARNING if duration * 1000 >= self.slow_request_ms else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        logger.log(level, json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'db_queries': metrics.db_queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'serializer_ms': round(metrics.serializer_time * 1000, 2),
+            'render_ms': round(metrics.render_time * 1000, 2),
+        }))
+
+    def dump_profile(self, request, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+        filename = f"{time.strftime('%Y%m%dT%H%M%S')}_{request.method}_{slug}_{os.getpid()}.prof"
+        profiler.dump_stats(os.path.join(self.profile_dir, filename))
@@ -46,21 +46,52 @@ INSTALLED_APPS = [
     'support',
     'reports',
     'labs',
+    'jobs',
+    'realtime',
 ]
 
 MIDDLEWARE = [
+    'stem_kit_backend.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'stem_kit_backend.db.ReadReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'stem_kit_backend.urls'
 
+# Request instrumentation (stem_kit_backend.middleware.PerformanceMiddleware)
+PERF_INSTRUMENTATION = os.environ.get('PERF_INSTRUMENTATION', '1') == '1'
+# Fraction of requests run under cProfile; 0 disables profiling
+PERF_PROFILE_SAMPLE_RATE = float(os.environ.get('PERF_PROFILE_SAMPLE_RATE', 0))
+PERF_PROFILE_SLOW_MS = float(os.environ.get('PERF_PROFILE_SLOW_MS', 500))
+PERF_PROFILE_DIR = os.environ.get('PERF_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+# Requests at least this slow are logged at WARNING, the rest at INFO. The
+# logger shows WARNING and up unless PERF_LOG_LEVEL=INFO asks for every request.
+PERF_SLOW_REQUEST_MS = float(os.environ.get('PERF_SLOW_REQUEST_MS', 1000))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'stem_kit_backend.perf': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERF_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -83,13 +114,72 @@ WSGI_APPLICATION = 'stem_kit_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# SQLite tuning, applied by every connection (replicas included) as it opens.
+# WAL lets reads run alongside the single writer and synchronous=NORMAL only
+# syncs at checkpoints, which is safe in WAL mode. IMMEDIATE transactions
+# take the write lock up front, so concurrent writers queue for up to
+# busy_timeout instead of failing with "database is locked" when a read lock
+# cannot be upgraded. An empty variable leaves that pragma at SQLite's
+# default; `python benchmark_sqlite.py` compares against the defaults.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'),
+    'mmap_size': os.environ.get('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)),
+    # Negative sizes are in KiB
+    'cache_size': os.environ.get('SQLITE_CACHE_SIZE', '-20000'),
+}
+SQLITE_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {name} = {value}' for name, value in SQLITE_PRAGMAS.items() if value),
+    'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE') or None,
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        # Seconds a connection is reused for; 0 opens one per request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Read replicas (stem_kit_backend.db): DATABASE_REPLICAS is a comma-separated
+# list of SQLite files holding copies of the primary, refreshed with
+# `manage.py sync_replicas`. Report, list and statistics GET requests read
+# from one of them until they write; everything else uses 'default'.
+READ_REPLICAS = []
+for index, name in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name.strip(),
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+    READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['stem_kit_backend.db.ReadReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Use a shared backend (file-based, Redis, Memcached) when running several
+# worker processes so catalog invalidation reaches all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'stem-kit'),
     }
 }
 
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -174,16 +264,56 @@ CORS_ALLOWED_HEADERS = [
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'stem_kit_backend.throttling.RoleRateThrottle',
+    ],
+}
+
+# Token buckets per throttle scope and role (stem_kit_backend.throttling);
+# "global" is one bucket shared by every client of the scope. Reports and
+# statistics are the expensive endpoints.
+THROTTLE_RATES = {
+    'default': {
+        'anonymous': '60/min',
+        'customer': '120/min',
+        'staff': '600/min',
+        'manager': '600/min',
+    },
+    'reports': {
+        'customer': '10/min',
+        'staff': '30/min',
+        'manager': '60/min',
+        'admin': '120/min',
+        'global': os.environ.get('THROTTLE_REPORTS_GLOBAL_RATE', '300/min'),
+    },
 }
+# Use stem_kit_backend.throttling.CacheBucketStore with a shared cache
+# backend to throttle across several workers
+THROTTLE_STORE = os.environ.get('THROTTLE_STORE', 'stem_kit_backend.throttling.MemoryBucketStore')
+THROTTLE_CACHE_ALIAS = 'default'
 
 # JWT settings
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.serializers.UserClaimsTokenObtainPairSerializer',
 }
+# Seconds an authenticated user is served from the per-process cache
+# (accounts.authentication) before being read again
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 60))
+
+# Realtime push (realtime.asgi). The default broadcaster only reaches
+# clients of the same process; point this at a shared implementation when
+# running more than one ASGI worker.
+REALTIME_BROADCASTER = os.environ.get('REALTIME_BROADCASTER', 'realtime.broadcast.InProcessBroadcaster')
+REALTIME_HEARTBEAT_SECONDS = int(os.environ.get('REALTIME_HEARTBEAT_SECONDS', 15))
+
+# Seconds a background report result (reports.runs) is reused for the
+# same spec before the report is computed again
+REPORT_RESULT_TTL = int(os.environ.get('REPORT_RESULT_TTL', 300))
@@ -0,0 +1,229 @@
+import io
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import resolve
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from products import cache
+from products.models import Product
+from products.serializers import ProductSerializer
+from reports.models import OrderStatusCount
+from . import db, middleware, throttling
+
+User = get_user_model()
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Product.objects.create(name='Kit', description='', price=Decimal('5.00'))
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs('stem_kit_backend.perf', 'INFO') as logs:
+            response = self.client.get('/api/labs/')
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['path'], '/api/labs/')
+        self.assertEqual(line['status'], 200)
+        self.assertEqual(line['db_queries'], 1)
+
+    def test_only_slow_requests_log_warnings(self):
+        with self.assertLogs('stem_kit_backend.perf', 'INFO') as logs:
+            self.client.get('/api/labs/')
+        self.assertEqual(logs.records[-1].levelname, 'INFO')
+        with override_settings(PERF_SLOW_REQUEST_MS=0):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            with self.assertLogs('stem_kit_backend.perf', 'WARNING') as logs:
+                client.get('/api/labs/')
+        self.assertEqual(json.loads(logs.records[-1].getMessage())['path'], '/api/labs/')
+
+    def test_slow_requests_are_profiled(self):
+        with tempfile.TemporaryDirectory() as profile_dir:
+            with override_settings(PERF_PROFILE_SAMPLE_RATE=1.0, PERF_PROFILE_SLOW_MS=0,
+                                   PERF_PROFILE_DIR=profile_dir):
+                # Middleware reads its settings when the handler is built
+                client = APIClient()
+                client.force_authenticate(self.user)
+                client.get('/api/labs/')
+            self.assertEqual(len(os.listdir(profile_dir)), 1)
+
+    def test_overlapping_requests_are_not_profiled(self):
+        with tempfile.TemporaryDirectory() as profile_dir:
+            with override_settings(PERF_PROFILE_SAMPLE_RATE=1.0, PERF_PROFILE_SLOW_MS=0,
+                                   PERF_PROFILE_DIR=profile_dir):
+                client = APIClient()
+                client.force_authenticate(self.user)
+                # As if another request were being profiled
+                with middleware._profiling:
+                    self.assertEqual(client.get('/api/labs/').status_code, 200)
+                client.get('/api/labs/')
+            self.assertEqual(len(os.listdir(profile_dir)), 1)
+
+    def test_serializers_are_untouched_outside_requests(self):
+        product = Product.objects.get()
+        self.assertIsNone(middleware._current.get())
+        self.assertEqual(ProductSerializer(product).data['name'], 'Kit')
+        metrics = middleware.RequestMetrics()
+        token = middleware._current.set(metrics)
+        try:
+            ProductSerializer(product).data
+        finally:
+            middleware._current.reset(token)
+        self.assertGreater(metrics.serializer_time, 0)
+        self.assertEqual(metrics.serializer_depth, 0)
+
+
+@override_settings(THROTTLE_RATES={
+    'default': {'anonymous': '2/min', 'customer': '5/s'},
+    'reports': {'customer': '2/min', 'manager': '3/min', 'global': '4/min'},
+})
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        self.addCleanup(throttling.get_store().clear)
+
+    def client_for(self, username, role):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username=username, password='pass', role=role))
+        return client
+
+    def test_buckets_per_user_with_retry_after(self):
+        customer = self.client_for('customer', 'customer')
+        statuses = [customer.get('/api/reports/sales/').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = customer.get('/api/reports/sales/')
+        self.assertEqual(response['Retry-After'], '30')
+
+        # Other scopes and other users have buckets of their own
+        self.assertEqual(customer.get('/api/labs/').status_code, 200)
+        manager = self.client_for('manager', 'manager')
+        self.assertEqual(manager.get('/api/reports/sales/').status_code, 200)
+        self.assertEqual(manager.get('/api/support/lab-support/statistics/').status_code, 200)
+
+    def test_global_bucket_sheds_load_for_everyone(self):
+        clients = [self.client_for(f'customer{i}', 'customer') for i in range(3)]
+        statuses = [client.get('/api/reports/support/').status_code for client in clients for _ in range(2)]
+        self.assertEqual(statuses, [200, 200, 200, 200, 429, 429])
+        # Cheap endpoints keep working
+        self.assertEqual(clients[2].get('/api/reports/delivery/').status_code, 200)
+
+    def test_anonymous_clients_and_unlimited_roles(self):
+        anonymous = APIClient()
+        statuses = [anonymous.post('/api/token/', {'username': 'x', 'password': 'y'}).status_code for _ in range(3)]
+        self.assertEqual(statuses, [401, 401, 429])
+        admin = self.client_for('admin', 'admin')
+        self.assertEqual({admin.get('/api/labs/').status_code for _ in range(10)}, {200})
+
+    def test_buckets_refill(self):
+        store = throttling.MemoryBucketStore()
+        interval, window = throttling.parse_rate('2/min')
+        self.assertEqual([store.take('key', interval, window, now=0) for _ in range(3)], [0, 0, 30])
+        self.assertEqual(store.take('key', interval, window, now=30), 0)
+        self.assertEqual(store.take('key', interval, window, now=30), 30)
+
+    @override_settings(THROTTLE_STORE='stem_kit_backend.throttling.CacheBucketStore')
+    def test_shared_cache_store(self):
+        customer = self.client_for('customer', 'customer')
+        statuses = [customer.get('/api/reports/sales/').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+@override_settings(READ_REPLICAS=['replica_1'])
+class ReadReplicaTests(TransactionTestCase):
+    """A second database file as the replica of the in-memory test database."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        connections.settings['replica_1'] = {
+            **connections.settings['default'], 'NAME': os.path.join(directory.name, 'replica.sqlite3'),
+        }
+        cls.addClassCleanup(cls.remove_replica)
+        # Added after the runner has set up the test databases
+        cls.databases = {*cls.databases, 'replica_1'}
+
+    @classmethod
+    def remove_replica(cls):
+        connections['replica_1'].close()
+        del connections['replica_1']
+        del connections.settings['replica_1']
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='pass', role='manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        OrderStatusCount.objects.create(status='pending', count=2)
+        call_command('sync_replicas', stdout=io.StringIO())
+        # Not replicated yet
+        OrderStatusCount.objects.filter(status='pending').update(count=5)
+
+    def test_report_views_read_from_replica(self):
+        response = self.client.get('/api/reports/delivery/')
+        self.assertEqual(response.json(), [{'status': 'pending', 'count': 2}])
+
+    def test_other_requests_use_primary(self):
+        with override_settings(READ_REPLICAS=[]):
+            response = self.client.get('/api/reports/delivery/')
+        self.assertEqual(response.json(), [{'status': 'pending', 'count': 5}])
+        self.assertEqual(OrderStatusCount.objects.get().count, 5)
+
+    def test_reads_after_a_write_use_primary(self):
+        token = db.use_replica('replica_1')
+        try:
+            self.assertEqual(OrderStatusCount.objects.get().count, 2)
+            with transaction.atomic():
+                self.assertEqual(OrderStatusCount.objects.get().count, 5)
+            # Accounts always come from the primary
+            self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+            OrderStatusCount.objects.create(status='shipped', count=1)
+            self.assertEqual(OrderStatusCount.objects.get(status='pending').count, 5)
+        finally:
+            db.release(token)
+
+    def test_catalog_cache_skips_replica_reads(self):
+        cache.get_cache().clear()
+        request = SimpleNamespace(get_host=lambda: 'testserver', get_full_path=lambda: '/catalog/')
+        count = lambda: Response(OrderStatusCount.objects.get().count)
+        token = db.use_replica('replica_1')
+        try:
+            self.assertEqual(cache.cached_response(request, count).data, 2)
+        finally:
+            db.release(token)
+        self.assertEqual(cache.cached_response(request, count).data, 5)
+        self.assertEqual(cache.cached_response(request, lambda: Response(0)).data, 5)
+
+    def test_sync_replicas(self):
+        call_command('sync_replicas', stdout=io.StringIO())
+        self.assertEqual(OrderStatusCount.objects.using('replica_1').get().count, 5)
+
+    def test_eligible_views(self):
+        for method, path, expected in [
+            ('GET', '/api/reports/sales/', True),
+            ('GET', '/api/reports/fulfillment/', True),
+            # Cached, and a lagging replica would pin a stale page in the cache
+            ('GET', '/api/products/', False),
+            ('GET', '/api/labs/', True),
+            ('GET', '/api/support/lab-support/statistics/', True),
+            ('POST', '/api/products/', False),
+            ('GET', '/api/products/1/', False),
+            ('GET', '/api/orders/', False),
+            ('GET', '/api/reports/runs/1/', False),
+        ]:
+            with self.subTest(method=method, path=path):
+                self.assertIs(db.reads_from_replica(resolve(path).func, method), expected)
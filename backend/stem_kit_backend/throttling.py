@@ -0,0 +1,129 @@
+"""
+Token-bucket request throttling by role and endpoint class.
+
+Every view belongs to a throttle scope (``throttle_scope`` on the view or
+``@action``, ``default`` otherwise). ``THROTTLE_RATES`` gives each scope a
+bucket per role as ``"<requests>/<s|min|hour|day>"``. The bucket holds up
+to that many requests and refills at that rate. Each user gets their own
+bucket, and anonymous clients get one per address. A ``global`` entry adds
+one bucket shared by everyone in the scope, so expensive endpoints shed
+load as a whole before they slow down the rest of the API. Roles without
+an entry are not limited.
+
+Each bucket is a single "theoretical arrival time" (GCRA, the usual
+single-value form of a token bucket), so taking a token is one read and
+one write. MemoryBucketStore keeps them per process in a plain dict and
+uses no locks. Two threads racing on the same bucket can both be let
+through, which is acceptable for load shedding. Set ``THROTTLE_STORE`` to
+CacheBucketStore to share buckets between workers through a cache
+backend.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'min': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_rate(rate):
+    """``(interval, window)`` seconds for ``"<requests>/<period>"``, or None for no limit."""
+    if rate is None:
+        return None
+    requests, _, period = rate.partition('/')
+    if not requests.isdigit() or int(requests) == 0 or period not in PERIODS:
+        raise ImproperlyConfigured(f"Invalid throttle rate {rate!r}")
+    window = PERIODS[period]
+    return window / int(requests), float(window)
+
+
+class MemoryBucketStore:
+    """Buckets of the current process, pruned once more than ``max_keys`` exist."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._arrivals = {}
+
+    def take(self, key, interval, window, now):
+        """Take a token from ``key``; returns 0, or the seconds until one is available."""
+        arrival = max(self._arrivals.get(key, now), now) + interval
+        if arrival - now > window:
+            return arrival - now - window
+        self._arrivals[key] = arrival
+        if len(self._arrivals) > self.max_keys:
+            self.prune(now)
+        return 0
+
+    def prune(self, now):
+        # Buckets that have refilled completely are the same as missing ones
+        for key, arrival in list(self._arrivals.items()):
+            if arrival <= now:
+                self._arrivals.pop(key, None)
+
+    def clear(self):
+        self._arrivals.clear()
+
+
+class CacheBucketStore:
+    """Buckets in the ``THROTTLE_CACHE_ALIAS`` cache, shared by every worker using it."""
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+    def take(self, key, interval, window, now):
+        key = f'throttle:{key}'
+        arrival = max(self.cache.get(key, now), now) + interval
+        if arrival - now > window:
+            return arrival - now - window
+        self.cache.set(key, arrival, timeout=int(arrival - now) + 1)
+        return 0
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        path = getattr(settings, 'THROTTLE_STORE', 'stem_kit_backend.throttling.MemoryBucketStore')
+        _store = import_string(path)()
+    return _store
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    global _store
+    if setting in ('THROTTLE_STORE', 'THROTTLE_CACHE_ALIAS'):
+        _store = None
+
+
+class RoleRateThrottle(BaseThrottle):
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None) or 'default'
+        rates = getattr(settings, 'THROTTLE_RATES', {}).get(scope, {})
+        user = request.user
+        if user and user.is_authenticated:
+            role, ident = user.role, f'user:{user.pk}'
+        else:
+            role, ident = 'anonymous', f'ip:{self.get_ident(request)}'
+
+        self.wait_seconds = 0
+        now = time.time()
+        store = get_store()
+        # The client's own bucket first, so rejected clients do not use up the shared one
+        for key, rate in ((f'{scope}:{ident}', rates.get(role)), (f'{scope}:*', rates.get('global'))):
+            limit = parse_rate(rate)
+            if limit is None:
+                continue
+            self.wait_seconds = store.take(key, *limit, now)
+            if self.wait_seconds:
+                return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
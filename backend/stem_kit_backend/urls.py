@@ -25,13 +25,16 @@ from accounts.views import UserViewSet
 from products.views import ProductViewSet
 from labs.views import LabViewSet
 from orders.views import OrderViewSet
-from support.views import SupportTicketViewSet
+from support.views import SupportTicketViewSet, LabSupportViewSet, LabSupportLimitViewSet
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
 router.register(r'products', ProductViewSet)
 router.register(r'labs', LabViewSet)
 router.register(r'orders', OrderViewSet, basename='order')
+# Before 'support' so these prefixes are not read as ticket ids
+router.register(r'support/lab-support', LabSupportViewSet, basename='lab-support')
+router.register(r'support/lab-support-limits', LabSupportLimitViewSet)
 router.register(r'support', SupportTicketViewSet, basename='support')
 
 urlpatterns = [
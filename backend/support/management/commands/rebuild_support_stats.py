@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from support import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the lab support statistics from the LabSupport rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        rows = stats.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} lab support statistic rows"))
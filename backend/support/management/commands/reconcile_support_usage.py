@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from support.models import LabSupport, LabSupportUsage
+
+
+class Command(BaseCommand):
+    help = "Rebuild the lab support usage counters from the LabSupport rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Only report counters that are off.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            actual = {
+                (row['customer_id'], row['lab_id']): row['used']
+                for row in LabSupport.objects.values('customer_id', 'lab_id').annotate(used=Count('id')).order_by()
+            }
+            stored = {
+                (customer_id, lab_id): used_count
+                for customer_id, lab_id, used_count in LabSupportUsage.objects.values_list(
+                    'customer_id', 'lab_id', 'used_count'
+                )
+            }
+            drifted = [
+                key for key in actual.keys() | stored.keys() if actual.get(key, 0) != stored.get(key, 0)
+            ]
+            for customer_id, lab_id in sorted(drifted)[:20]:
+                self.stdout.write(
+                    f"customer {customer_id}, lab {lab_id}: counted {stored.get((customer_id, lab_id), 0)}, "
+                    f"actual {actual.get((customer_id, lab_id), 0)}"
+                )
+
+            if not options['dry_run']:
+                LabSupportUsage.objects.all().delete()
+                LabSupportUsage.objects.bulk_create(
+                    [LabSupportUsage(customer_id=customer_id, lab_id=lab_id, used_count=used)
+                     for (customer_id, lab_id), used in actual.items()],
+                    batch_size=batch_size,
+                )
+
+        verb = "Found" if options['dry_run'] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(drifted)} drifted counters out of {len(actual)} customer/lab pairs"
+        ))
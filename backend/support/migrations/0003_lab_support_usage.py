@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_existing_supports(apps, schema_editor):
+    LabSupport = apps.get_model('support', 'LabSupport')
+    LabSupportUsage = apps.get_model('support', 'LabSupportUsage')
+    counts = LabSupport.objects.values('customer_id', 'lab_id').annotate(used=models.Count('id')).order_by()
+    LabSupportUsage.objects.bulk_create(
+        [LabSupportUsage(customer_id=row['customer_id'], lab_id=row['lab_id'], used_count=row['used'])
+         for row in counts],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labs', '0004_lab_content_versions'),
+        ('support', '0002_support_ticket_read_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='labsupport',
+            name='staff',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='provided_lab_supports', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.CreateModel(
+            name='LabSupportUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('used_count', models.PositiveIntegerField(default=0)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lab_support_usage', to=settings.AUTH_USER_MODEL)),
+                ('lab', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='support_usage', to='labs.lab')),
+            ],
+            options={
+                'db_table': 'lab_support_usage',
+                'constraints': [models.UniqueConstraint(fields=('customer', 'lab'), name='lab_support_usage_customer_lab')],
+            },
+        ),
+        migrations.RunPython(count_existing_supports, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:13
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def compute_existing_stats(apps, schema_editor):
+    LabSupport = apps.get_model('support', 'LabSupport')
+    LabSupportStat = apps.get_model('support', 'LabSupportStat')
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    for support in LabSupport.objects.iterator(chunk_size=2000):
+        resolve_seconds = 0
+        if support.is_resolved and support.resolved_at:
+            resolve_seconds = max(int((support.resolved_at - support.created_at).total_seconds()), 0)
+        keys = [('all', ''), ('type', support.support_type), ('lab', str(support.lab_id)),
+                ('staff', str(support.staff_id or ''))]
+        for key in keys:
+            row = totals[key]
+            row[0] += 1
+            row[1] += int(support.is_resolved)
+            row[2] += support.duration_minutes or 0
+            row[3] += resolve_seconds
+    LabSupportStat.objects.bulk_create([
+        LabSupportStat(dimension=dimension, key=key, total=total, resolved=resolved,
+                       duration_minutes_total=duration, resolve_seconds_total=resolve_seconds)
+        for (dimension, key), (total, resolved, duration, resolve_seconds) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0003_lab_support_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabSupportStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('all', 'All'), ('type', 'Support type'), ('lab', 'Lab'), ('staff', 'Staff')], max_length=10)),
+                ('key', models.CharField(blank=True, max_length=50)),
+                ('total', models.IntegerField(default=0)),
+                ('resolved', models.IntegerField(default=0)),
+                ('duration_minutes_total', models.BigIntegerField(default=0)),
+                ('resolve_seconds_total', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'lab_support_stats',
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'key'), name='lab_support_stat_dimension_key')],
+            },
+        ),
+        migrations.RunPython(compute_existing_stats, migrations.RunPython.noop),
+    ]
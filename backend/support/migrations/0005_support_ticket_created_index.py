@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labs', '0004_lab_content_versions'),
+        ('support', '0004_lab_support_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supportticket',
+            index=models.Index(fields=['created_at'], name='support_tickets_created_idx'),
+        ),
+    ]
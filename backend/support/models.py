@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from labs.models import Lab
 
@@ -23,6 +25,9 @@ class SupportTicket(models.Model):
     class Meta:
         db_table = 'support_tickets'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='support_tickets_created_idx'),
+        ]
         
     def __str__(self):
         return f"{self.title} - {self.user.username}"
@@ -40,6 +45,21 @@ class SupportMessage(models.Model):
     def __str__(self):
         return f"Message from {self.sender.username} on {self.ticket.title}"
 
+class SupportTicketReadState(models.Model):
+    """The newest message of a ticket that a user has seen."""
+    ticket = models.ForeignKey(SupportTicket, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='support_read_states')
+    last_read_message_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'support_ticket_reads'
+        constraints = [
+            models.UniqueConstraint(fields=['ticket', 'user'], name='support_ticket_read_state'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} read {self.ticket.title} up to #{self.last_read_message_id}"
+
 class LabSupport(models.Model):
     SUPPORT_TYPE_CHOICES = [
         ('technical', 'Technical Support'),
@@ -50,7 +70,7 @@ class LabSupport(models.Model):
 
     lab = models.ForeignKey(Lab, on_delete=models.CASCADE, related_name='lab_supports')
     customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='received_lab_supports')
-    staff = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='provided_lab_supports')
+    staff = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='provided_lab_supports', null=True, blank=True)
     support_type = models.CharField(max_length=20, choices=SUPPORT_TYPE_CHOICES)
     description = models.TextField()
     solution = models.TextField()
@@ -65,6 +85,11 @@ class LabSupport(models.Model):
     def __str__(self):
         return f"Support for {self.lab.title} - {self.customer.username}"
 
+    def save(self, *args, **kwargs):
+        # support.signals reads the stored row and updates the statistics in this transaction
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
 class LabSupportLimit(models.Model):
     lab = models.OneToOneField(Lab, on_delete=models.CASCADE)
     max_support_count = models.IntegerField(default=3)
@@ -72,3 +97,80 @@ class LabSupportLimit(models.Model):
 
     def __str__(self):
         return f"Support limit for {self.lab.title}"
+
+class LabSupportUsage(models.Model):
+    """How many LabSupport sessions a customer has used on a lab."""
+    customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='lab_support_usage')
+    lab = models.ForeignKey(Lab, on_delete=models.CASCADE, related_name='support_usage')
+    used_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'lab_support_usage'
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'lab'], name='lab_support_usage_customer_lab'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer.username} used {self.used_count} supports on {self.lab.title}"
+
+class SupportQuotaExceeded(Exception):
+    pass
+
+# Stands in for the limit of labs without a LabSupportLimit row
+UNLIMITED = 2 ** 31 - 1
+
+def reserve_support_quota(customer_id, lab_id):
+    """
+    Count one more support session for ``customer_id`` on ``lab_id``.
+
+    The counter is bumped by one ``UPDATE ... WHERE used_count < limit`` so
+    concurrent requests can never use more than the lab's
+    ``max_support_count``. Raises SupportQuotaExceeded when it is used up;
+    run inside the transaction that creates the LabSupport row.
+    """
+    limit = LabSupportLimit.objects.filter(lab_id=lab_id).values('max_support_count')
+    usage = LabSupportUsage.objects.filter(
+        customer_id=customer_id, lab_id=lab_id,
+        used_count__lt=Coalesce(models.Subquery(limit[:1]), Value(UNLIMITED)),
+    )
+    if usage.update(used_count=F('used_count') + 1):
+        return
+    # First session on this lab, or the quota is used up
+    LabSupportUsage.objects.bulk_create(
+        [LabSupportUsage(customer_id=customer_id, lab_id=lab_id)], ignore_conflicts=True
+    )
+    if not usage.update(used_count=F('used_count') + 1):
+        raise SupportQuotaExceeded()
+
+def release_support_quota(customer_id, lab_id):
+    LabSupportUsage.objects.filter(customer_id=customer_id, lab_id=lab_id, used_count__gt=0).update(
+        used_count=F('used_count') - 1
+    )
+
+class LabSupportStat(models.Model):
+    """
+    Running totals behind the lab support statistics, one row per value of
+    each dimension. Maintained by support.stats.
+    """
+    DIMENSION_CHOICES = (
+        ('all', 'All'),
+        ('type', 'Support type'),
+        ('lab', 'Lab'),
+        ('staff', 'Staff'),
+    )
+
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=50, blank=True)
+    total = models.IntegerField(default=0)
+    resolved = models.IntegerField(default=0)
+    duration_minutes_total = models.BigIntegerField(default=0)
+    resolve_seconds_total = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'lab_support_stats'
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='lab_support_stat_dimension_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension}:{self.key} ({self.total} supports)"
@@ -1,10 +1,11 @@
 from rest_framework import serializers
 from .models import SupportTicket, SupportMessage, LabSupport, LabSupportLimit
-from accounts.serializers import UserSerializer
+from labs.models import Lab
+from accounts.serializers import UserSerializer, UserSummarySerializer
 from labs.serializers import LabSerializer
 
 class SupportMessageSerializer(serializers.ModelSerializer):
-    sender = UserSerializer(read_only=True)
+    sender = UserSummarySerializer(read_only=True)
     
     class Meta:
         model = SupportMessage
@@ -19,14 +20,59 @@ class SupportTicketSerializer(serializers.ModelSerializer):
         model = SupportTicket
         fields = ['id', 'title', 'description', 'user', 'lab', 'status', 'messages', 'created_at', 'updated_at']
 
+class SupportTicketListSerializer(serializers.ModelSerializer):
+    """
+    Ticket summary for lists. Expects the annotations added by
+    ``SupportTicketViewSet.get_queryset``; messages are fetched page by page
+    from the ticket's messages endpoint.
+    """
+    user = UserSummarySerializer(read_only=True)
+    lab = LabSerializer(read_only=True)
+    message_count = serializers.IntegerField(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
+    last_message = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SupportTicket
+        fields = ['id', 'title', 'description', 'user', 'lab', 'status', 'message_count', 'unread_count',
+                  'last_message', 'created_at', 'updated_at']
+
+    def get_last_message(self, obj):
+        if obj.last_message_id is None:
+            return None
+        return {
+            'id': obj.last_message_id,
+            'message': obj.last_message_text,
+            'sender': obj.last_message_sender,
+            'created_at': serializers.DateTimeField().to_representation(obj.last_message_at),
+        }
+
 class LabSupportSerializer(serializers.ModelSerializer):
     lab = LabSerializer(read_only=True)
+    lab_id = serializers.PrimaryKeyRelatedField(source='lab', queryset=Lab.objects.all(), write_only=True)
     customer = UserSerializer(read_only=True)
     staff = UserSerializer(read_only=True)
+    # Annotated by LabSupportViewSet; null for labs without a limit
+    remaining_support_count = serializers.SerializerMethodField()
     
     class Meta:
         model = LabSupport
         fields = '__all__'
+        # Customers open a support request before there is a solution
+        extra_kwargs = {'solution': {'required': False, 'allow_blank': True}}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if self.instance is not None:
+            # Quota was reserved on the session's lab, so it stays there
+            fields.pop('lab_id')
+        elif request is not None:
+            fields['lab_id'].queryset = Lab.objects.visible_to(request.user)
+        return fields
+
+    def get_remaining_support_count(self, obj):
+        return getattr(obj, 'remaining_support_count', None)
 
 class LabSupportLimitSerializer(serializers.ModelSerializer):
     lab = LabSerializer(read_only=True)
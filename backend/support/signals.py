@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import stats
+from .models import LabSupport
+
+
+@receiver(pre_save, sender=LabSupport)
+def remember_support(sender, instance, **kwargs):
+    # Locked until the save commits, so concurrent edits apply their deltas in turn
+    stored = None
+    if not instance._state.adding:
+        stored = LabSupport.objects.select_for_update().only(*stats.FIELDS).filter(pk=instance.pk).first()
+    instance._stats_before = stats.contribution(stored) if stored is not None else None
+
+
+@receiver(post_save, sender=LabSupport)
+def count_support(sender, instance, created, **kwargs):
+    before = instance.__dict__.pop('_stats_before', None)
+    if before is None:
+        stats.record(instance)
+    else:
+        stats.record_change(before, instance)
+
+
+@receiver(post_delete, sender=LabSupport)
+def uncount_support(sender, instance, **kwargs):
+    # Also sent for every support deleted along with its lab, customer or staff member
+    stats.record(instance, sign=-1)
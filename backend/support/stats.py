@@ -0,0 +1,146 @@
+"""
+Lab support statistics kept as running totals.
+
+Every LabSupport adds to one LabSupportStat row per dimension: overall,
+its support type, its lab and its staff member. Saving and deleting a
+support (support.signals, so admin edits and cascades from labs and users
+count too) applies the difference with a single UPDATE, so reading the
+statistics costs the same however many supports exist. ``QuerySet.update``
+sends no signals; callers apply the change themselves, as the resolve
+action does with ``record_resolution``. ``rebuild()`` recomputes
+everything from the LabSupport table.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from accounts.models import User
+from labs.models import Lab
+from .models import LabSupport, LabSupportStat
+
+COUNTERS = ('total', 'resolved', 'duration_minutes_total', 'resolve_seconds_total')
+# What contribution() reads
+FIELDS = ('support_type', 'lab_id', 'staff_id', 'is_resolved', 'created_at', 'resolved_at', 'duration_minutes')
+
+
+def dimension_keys(support):
+    return [
+        ('all', ''),
+        ('type', support.support_type),
+        ('lab', str(support.lab_id)),
+        ('staff', str(support.staff_id or '')),
+    ]
+
+
+def contribution(support):
+    """What ``support`` adds to each of its rows, as ``(keys, counters)``."""
+    resolve_seconds = 0
+    if support.is_resolved and support.resolved_at and support.created_at:
+        resolve_seconds = max(int((support.resolved_at - support.created_at).total_seconds()), 0)
+    return dimension_keys(support), {
+        'total': 1,
+        'resolved': int(support.is_resolved),
+        'duration_minutes_total': support.duration_minutes or 0,
+        'resolve_seconds_total': resolve_seconds,
+    }
+
+
+def apply(keys, counters, sign=1):
+    counters = {name: sign * value for name, value in counters.items() if value}
+    if not counters:
+        return
+    with transaction.atomic(savepoint=False):
+        LabSupportStat.objects.bulk_create(
+            [LabSupportStat(dimension=dimension, key=key) for dimension, key in keys], ignore_conflicts=True
+        )
+        rows = Q()
+        for dimension, key in keys:
+            rows |= Q(dimension=dimension, key=key)
+        LabSupportStat.objects.filter(rows).update(
+            **{name: F(name) + value for name, value in counters.items()}
+        )
+
+
+def record(support, sign=1):
+    apply(*contribution(support), sign=sign)
+
+
+def record_change(before, support):
+    """Move ``support``'s totals from the ``before`` contribution to its current one."""
+    old_keys, old_counters = before
+    new_keys, new_counters = contribution(support)
+    if old_keys == new_keys:
+        apply(new_keys, {name: new_counters[name] - old_counters[name] for name in COUNTERS})
+    else:
+        apply(old_keys, old_counters, sign=-1)
+        apply(new_keys, new_counters)
+
+
+def record_resolution(support):
+    apply(dimension_keys(support), {
+        'resolved': 1,
+        'resolve_seconds_total': max(int((support.resolved_at - support.created_at).total_seconds()), 0),
+    })
+
+
+def rebuild(batch_size=2000):
+    """Recompute every LabSupportStat row; returns the number of rows."""
+    totals = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for support in LabSupport.objects.only(*FIELDS).iterator(chunk_size=batch_size):
+        keys, counters = contribution(support)
+        for key in keys:
+            for name, value in counters.items():
+                totals[key][name] += value
+
+    with transaction.atomic():
+        LabSupportStat.objects.all().delete()
+        LabSupportStat.objects.bulk_create(
+            [LabSupportStat(dimension=dimension, key=key, **counters)
+             for (dimension, key), counters in totals.items()],
+            batch_size=batch_size,
+        )
+    return len(totals)
+
+
+def _averages(row):
+    return {
+        'avg_duration_minutes': row.duration_minutes_total / row.total if row.total else None,
+        'avg_resolve_minutes': row.resolve_seconds_total / row.resolved / 60 if row.resolved else None,
+    }
+
+
+def summary():
+    """The statistics payload of LabSupportViewSet.statistics."""
+    rows = defaultdict(list)
+    for row in LabSupportStat.objects.filter(total__gt=0).order_by('dimension', 'key'):
+        rows[row.dimension].append(row)
+
+    overall = rows['all'][0] if rows['all'] else LabSupportStat(dimension='all')
+    lab_titles = dict(Lab.objects.filter(id__in=[row.key for row in rows['lab']]).values_list('id', 'title'))
+    usernames = dict(User.objects.filter(
+        id__in=[row.key for row in rows['staff'] if row.key]
+    ).values_list('id', 'username'))
+
+    return {
+        'total_supports': overall.total,
+        'resolved_supports': overall.resolved,
+        **_averages(overall),
+        'support_by_type': [
+            {'support_type': row.key, 'count': row.total, **_averages(row)}
+            for row in rows['type']
+        ],
+        'support_by_lab': [
+            {'lab__title': lab_titles.get(int(row.key)), 'count': row.total, **_averages(row)}
+            for row in rows['lab']
+        ],
+        'staff_performance': [
+            {
+                'staff__username': usernames.get(int(row.key)) if row.key else None,
+                'total_supports': row.total,
+                'resolved_supports': row.resolved,
+                **_averages(row),
+            }
+            for row in rows['staff']
+        ],
+    }
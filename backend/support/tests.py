@@ -1,3 +1,327 @@
-from django.test import TestCase
+import threading
+import time
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from labs.models import Lab, LabEntitlement
+from products.models import Product
+from .models import (
+    SupportTicket, SupportMessage, SupportTicketReadState, LabSupport, LabSupportLimit, LabSupportUsage,
+    LabSupportStat,
+)
+from . import stats
+
+
+class SupportMessageTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer', password='pass', role='customer')
+        self.staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        product = Product.objects.create(name='Kit', description='', price=10, stock=5)
+        self.lab = Lab.objects.create(title='Lab', description='', content='Body', product=product,
+                                      author=self.staff)
+        self.ticket = SupportTicket.objects.create(title='Help', description='Stuck', user=self.customer,
+                                                   lab=self.lab)
+        self.messages = [
+            SupportMessage.objects.create(ticket=self.ticket, sender=self.staff if i % 2 else self.customer,
+                                          message=f'message {i}')
+            for i in range(5)
+        ]
+        self.client = APIClient()
+
+    def test_list_returns_summary_in_one_query(self):
+        for i in range(3):
+            ticket = SupportTicket.objects.create(title=f'Other {i}', description='', user=self.customer,
+                                                  lab=self.lab)
+            SupportMessage.objects.create(ticket=ticket, sender=self.staff, message='hi')
+        self.client.force_authenticate(self.customer)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/support/')
+        self.assertEqual(response.status_code, 200)
+        summary = next(t for t in response.data if t['id'] == self.ticket.id)
+        self.assertNotIn('messages', summary)
+        self.assertEqual(summary['message_count'], 5)
+        # Only the staff replies count as unread for the customer
+        self.assertEqual(summary['unread_count'], 2)
+        self.assertEqual(summary['last_message']['id'], self.messages[-1].id)
+        self.assertEqual(summary['last_message']['message'], 'message 4')
+        self.assertEqual(summary['last_message']['sender'], 'customer')
+
+    def test_latest_page_and_backwards_paging(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(f'/api/support/{self.ticket.id}/messages/?page_size=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m['message'] for m in response.data['results']], ['message 3', 'message 4'])
+        self.assertEqual(set(response.data['results'][0]['sender']), {'id', 'username', 'first_name',
+                                                                      'last_name', 'role'})
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([m['message'] for m in response.data['results']], ['message 1', 'message 2'])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([m['message'] for m in response.data['results']], ['message 0'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_since_returns_only_new_messages(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(f'/api/support/{self.ticket.id}/messages/')
+        poll = response.data['next']
+        self.assertEqual(self.client.get(poll).data['results'], [])
+
+        SupportMessage.objects.create(ticket=self.ticket, sender=self.staff, message='new')
+        response = self.client.get(poll)
+        self.assertEqual([m['message'] for m in response.data['results']], ['new'])
+
+        response = self.client.get(f'/api/support/{self.ticket.id}/messages/?since=abc')
+        self.assertEqual(response.status_code, 400)
+
+    def test_fetching_messages_marks_them_read(self):
+        self.client.force_authenticate(self.customer)
+        self.client.get(f'/api/support/{self.ticket.id}/messages/?page_size=2')
+        state = SupportTicketReadState.objects.get(ticket=self.ticket, user=self.customer)
+        self.assertEqual(state.last_read_message_id, self.messages[-1].id)
+        self.assertEqual(self.client.get('/api/support/').data[0]['unread_count'], 0)
+
+        # Paging back through history never moves the marker backwards
+        self.client.get(f'/api/support/{self.ticket.id}/messages/?before={self.messages[2].id}')
+        state.refresh_from_db()
+        self.assertEqual(state.last_read_message_id, self.messages[-1].id)
+
+    def test_other_customers_cannot_read_messages(self):
+        other = User.objects.create_user(username='other', password='pass', role='customer')
+        self.client.force_authenticate(other)
+        response = self.client.get(f'/api/support/{self.ticket.id}/messages/')
+        self.assertEqual(response.status_code, 404)
+
+
+def entitled_lab(customer, title='Lab'):
+    """A published lab that ``customer`` has bought."""
+    product = Product.objects.create(name=title, description='', price=10, stock=5)
+    LabEntitlement.objects.create(customer=customer, product=product)
+    return Lab.objects.create(title=title, description='', content='Body', product=product, status='published')
+
+
+def support_payload(lab):
+    return {'lab_id': lab.id, 'support_type': 'technical', 'description': 'Stuck', 'solution': '',
+            'duration_minutes': 10}
+
+
+class LabSupportQuotaTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer', password='pass', role='customer')
+        self.lab = entitled_lab(self.customer)
+        LabSupportLimit.objects.create(lab=self.lab, max_support_count=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_rejects_requests_over_the_limit(self):
+        for _ in range(2):
+            response = self.client.post('/api/support/lab-support/', support_payload(self.lab), format='json')
+            self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/support/lab-support/', support_payload(self.lab), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Maximum support limit reached for this lab')
+        self.assertEqual(LabSupport.objects.count(), 2)
+        self.assertEqual(LabSupportUsage.objects.get().used_count, 2)
+
+        response = self.client.get('/api/support/lab-support/')
+        self.assertEqual(response.data[0]['remaining_support_count'], 0)
+
+    def test_quota_check_is_one_statement(self):
+        self.client.post('/api/support/lab-support/', support_payload(self.lab), format='json')
+        with self.assertNumQueries(7):
+            # lab, savepoint, conditional UPDATE, insert, two statistics
+            # statements, release
+            self.client.post('/api/support/lab-support/', support_payload(self.lab), format='json')
+
+    def test_labs_without_limit_are_unlimited(self):
+        other = entitled_lab(self.customer, 'Open lab')
+        for _ in range(3):
+            response = self.client.post('/api/support/lab-support/', support_payload(other), format='json')
+            self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.data['remaining_support_count'])
+
+    def test_only_staff_delete_and_free_quota(self):
+        for _ in range(2):
+            response = self.client.post('/api/support/lab-support/', support_payload(self.lab), format='json')
+        url = f"/api/support/lab-support/{response.data['id']}/"
+        self.assertEqual(self.client.delete(url).status_code, 403)
+        self.assertEqual(self.client.patch(url, {'duration_minutes': 1}, format='json').status_code, 403)
+        response = self.client.post('/api/support/lab-support/', support_payload(self.lab), format='json')
+        self.assertEqual(response.status_code, 400)
+
+        staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        self.client.force_authenticate(staff)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/support/lab-support/', support_payload(self.lab), format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_only_entitled_labs_can_be_booked(self):
+        draft = Lab.objects.create(title='Draft', description='', content='Body', product=self.lab.product)
+        unpurchased = Lab.objects.create(title='Other', description='', content='Body', status='published')
+        for lab in (draft, unpurchased):
+            response = self.client.post('/api/support/lab-support/', support_payload(lab), format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('lab_id', response.data)
+        self.assertFalse(LabSupportUsage.objects.exists())
+
+    def test_lab_cannot_change_after_booking(self):
+        other = entitled_lab(self.customer, 'Other')
+        support = self.client.post('/api/support/lab-support/', support_payload(self.lab), format='json').data
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='pass', role='staff'))
+        response = self.client.patch(f"/api/support/lab-support/{support['id']}/", {'lab_id': other.id},
+                                     format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['lab']['id'], self.lab.id)
+        self.assertEqual(LabSupportUsage.objects.get().lab_id, self.lab.id)
+
+    def test_only_staff_change_limits(self):
+        limit = LabSupportLimit.objects.get()
+        url = f'/api/support/lab-support-limits/{limit.pk}/'
+        response = self.client.patch(url, {'max_support_count': 1000}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.delete(url).status_code, 403)
+        limit.refresh_from_db()
+        self.assertEqual(limit.max_support_count, 2)
+
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='pass', role='staff'))
+        response = self.client.patch(url, {'max_support_count': 5}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['max_support_count'], 5)
+
+    def test_reconcile_rebuilds_counters(self):
+        LabSupport.objects.create(lab=self.lab, customer=self.customer, support_type='other',
+                                  description='', solution='')
+        LabSupportUsage.objects.create(customer=self.customer, lab=self.lab, used_count=7)
+        out = StringIO()
+        call_command('reconcile_support_usage', stdout=out)
+        self.assertIn('Fixed 1 drifted counters', out.getvalue())
+        self.assertEqual(LabSupportUsage.objects.get().used_count, 1)
+
+
+class LabSupportStatisticsTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer', password='pass', role='customer')
+        self.staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        self.manager = User.objects.create_user(username='manager', password='pass', role='manager')
+        self.labs = [entitled_lab(self.customer, f'Lab {i}') for i in range(2)]
+        self.client = APIClient()
+
+    def create(self, user, lab, support_type='technical', duration=10):
+        self.client.force_authenticate(user)
+        payload = dict(support_payload(lab), support_type=support_type, duration_minutes=duration)
+        return self.client.post('/api/support/lab-support/', payload, format='json').data['id']
+
+    def statistics(self):
+        self.client.force_authenticate(self.manager)
+        return self.client.get('/api/support/lab-support/statistics/').data
+
+    def test_statistics_follow_every_change(self):
+        first = self.create(self.staff, self.labs[0], duration=30)
+        second = self.create(self.customer, self.labs[0], support_type='guidance', duration=10)
+        third = self.create(self.staff, self.labs[1], duration=20)
+
+        self.client.force_authenticate(self.staff)
+        self.client.post(f'/api/support/lab-support/{first}/resolve/')
+        self.client.post(f'/api/support/lab-support/{first}/resolve/')
+        self.client.patch(f'/api/support/lab-support/{second}/', {'support_type': 'technical',
+                                                                   'duration_minutes': 40}, format='json')
+        self.client.delete(f'/api/support/lab-support/{third}/')
+
+        data = self.statistics()
+        self.assertEqual(data['total_supports'], 2)
+        self.assertEqual(data['resolved_supports'], 1)
+        self.assertEqual(data['avg_duration_minutes'], 35)
+        self.assertIsNotNone(data['avg_resolve_minutes'])
+        self.assertEqual(data['support_by_type'], [
+            {'support_type': 'technical', 'count': 2, 'avg_duration_minutes': 35,
+             'avg_resolve_minutes': data['avg_resolve_minutes']},
+        ])
+        self.assertEqual([(row['lab__title'], row['count']) for row in data['support_by_lab']], [('Lab 0', 2)])
+        self.assertEqual(
+            {row['staff__username']: (row['total_supports'], row['resolved_supports'])
+             for row in data['staff_performance']},
+            {None: (1, 0), 'staff': (1, 1)},
+        )
+
+        # The maintained rows agree with a full recount
+        maintained = {row.pop('id') and tuple(row.values()) for row in LabSupportStat.objects.filter(
+            total__gt=0).values()}
+        stats.rebuild()
+        rebuilt = {row.pop('id') and tuple(row.values()) for row in LabSupportStat.objects.values()}
+        self.assertEqual(maintained, rebuilt)
+
+    def test_cascades_and_direct_saves_are_counted(self):
+        self.create(self.staff, self.labs[0], duration=30)
+        self.create(self.customer, self.labs[1], duration=10)
+        kept = self.create(self.customer, self.labs[0], duration=5)
+        support = LabSupport.objects.get(pk=kept)
+        support.duration_minutes = 15
+        support.save()
+
+        self.labs[1].delete()
+        self.staff.delete()
+        data = self.statistics()
+        self.assertEqual(data['total_supports'], 1)
+        self.assertEqual(data['avg_duration_minutes'], 15)
+        self.assertEqual([(row['lab__title'], row['count']) for row in data['support_by_lab']], [('Lab 0', 1)])
+
+        maintained = {row.pop('id') and tuple(row.values()) for row in LabSupportStat.objects.filter(
+            total__gt=0).values()}
+        stats.rebuild()
+        rebuilt = {row.pop('id') and tuple(row.values()) for row in LabSupportStat.objects.values()}
+        self.assertEqual(maintained, rebuilt)
+
+    def test_statistics_read_a_fixed_number_of_rows(self):
+        for i in range(20):
+            self.create(self.staff, self.labs[i % 2])
+        self.client.force_authenticate(self.manager)
+        with self.assertNumQueries(3):
+            self.client.get('/api/support/lab-support/statistics/')
+
+    def test_customers_cannot_read_statistics(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get('/api/support/lab-support/statistics/')
+        self.assertEqual(response.status_code, 403)
+
+
+class ConcurrentLabSupportTests(TransactionTestCase):
+    requests = 8
+    limit = 3
+
+    def test_parallel_requests_never_exceed_the_limit(self):
+        customer = User.objects.create_user(username='customer', password='pass', role='customer')
+        lab = entitled_lab(customer)
+        LabSupportLimit.objects.create(lab=lab, max_support_count=self.limit)
+        results = []
+        start = threading.Barrier(self.requests)
+
+        def request_support():
+            client = APIClient()
+            client.force_authenticate(customer)
+            start.wait()
+            try:
+                for attempt in range(200):
+                    try:
+                        response = client.post('/api/support/lab-support/', support_payload(lab), format='json')
+                    except OperationalError:
+                        time.sleep(0.005 * (attempt % 10))
+                        continue
+                    results.append(response.status_code)
+                    return
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=request_support) for _ in range(self.requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(LabSupport.objects.count(), self.limit)
+        self.assertEqual(LabSupportUsage.objects.get().used_count, self.limit)
+        self.assertIn(400, results)
@@ -4,10 +4,18 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
-from django.db.models import Count, Q
-from .models import SupportTicket, SupportMessage, LabSupport, LabSupportLimit
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+from rest_framework.exceptions import ValidationError
+from .models import (
+    SupportTicket, SupportMessage, SupportTicketReadState, LabSupport, LabSupportLimit, LabSupportUsage,
+    SupportQuotaExceeded, reserve_support_quota, release_support_quota,
+)
+from . import stats
 from .serializers import (
     SupportTicketSerializer, 
+    SupportTicketListSerializer,
     SupportMessageSerializer,
     LabSupportSerializer,
     LabSupportLimitSerializer
@@ -15,20 +23,76 @@ from .serializers import (
 
 # Create your views here.
 
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+MESSAGE_PREVIEW_LENGTH = 120
+
+def _count(queryset):
+    # Correlated COUNT(*) so the ticket list needs no GROUP BY
+    return Subquery(
+        queryset.order_by().values('ticket').annotate(total=Count('*')).values('total'),
+        output_field=IntegerField(),
+    )
+
+def annotate_ticket_summary(queryset, user):
+    """
+    Add message_count, unread_count and the last message preview for
+    ``user`` to every ticket, all in the list query itself.
+    """
+    messages = SupportMessage.objects.filter(ticket=OuterRef('pk'))
+    last = messages.order_by('-id')
+    last_read = SupportTicketReadState.objects.filter(ticket=OuterRef(OuterRef('pk')), user=user)
+    unread = messages.exclude(sender=user).filter(
+        id__gt=Coalesce(Subquery(last_read.values('last_read_message_id')[:1]), Value(0))
+    )
+    return queryset.annotate(
+        message_count=Coalesce(_count(messages), Value(0)),
+        unread_count=Coalesce(_count(unread), Value(0)),
+        last_message_id=Subquery(last.values('id')[:1]),
+        last_message_text=Subquery(last.values(preview=Substr('message', 1, MESSAGE_PREVIEW_LENGTH))[:1]),
+        last_message_sender=Subquery(last.values('sender__username')[:1]),
+        last_message_at=Subquery(last.values('created_at')[:1]),
+    )
+
+def mark_read(ticket, user, message_id):
+    """Move ``user``'s read marker on ``ticket`` forward to ``message_id``."""
+    updated = SupportTicketReadState.objects.filter(
+        ticket=ticket, user=user, last_read_message_id__lt=message_id
+    ).update(last_read_message_id=message_id)
+    if not updated:
+        SupportTicketReadState.objects.get_or_create(
+            ticket=ticket, user=user, defaults={'last_read_message_id': message_id}
+        )
+
 class IsOwnerOrStaff(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return (obj.user == request.user or 
                 request.user.role in ['admin', 'manager', 'staff'])
 
+class IsStaffRole(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.role in ['admin', 'manager', 'staff']
+
 class SupportTicketViewSet(viewsets.ModelViewSet):
     serializer_class = SupportTicketSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
+        # Nested labs never need their (large) content column
+        queryset = SupportTicket.objects.select_related('user', 'lab__author').defer('lab__content')
+        if self.action == 'list':
+            queryset = annotate_ticket_summary(queryset, user)
+        elif self.action == 'retrieve':
+            queryset = queryset.prefetch_related('messages__sender')
         if user.role in ['admin', 'staff']:
-            return SupportTicket.objects.all()
-        return SupportTicket.objects.filter(user=user)
+            return queryset
+        return queryset.filter(user=user)
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return SupportTicketListSerializer
+        return super().get_serializer_class()
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -42,6 +106,56 @@ class SupportTicketViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """
+        Messages of a ticket, oldest first, a page at a time.
+
+        Without parameters the latest page is returned. ``?before=<id>``
+        pages back through older messages, ``?since=<id>`` returns only
+        messages newer than ``id``. ``page_size`` sets the page length.
+        Fetching marks the returned messages as read.
+        """
+        ticket = self.get_object()
+        try:
+            before = int(request.query_params['before']) if 'before' in request.query_params else None
+            since = int(request.query_params['since']) if 'since' in request.query_params else None
+            page_size = int(request.query_params.get('page_size', MESSAGE_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': 'before, since and page_size must be integers'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        page_size = max(1, min(page_size, MAX_MESSAGE_PAGE_SIZE))
+
+        queryset = ticket.messages.select_related('sender')
+        if since is not None:
+            rows = list(queryset.filter(id__gt=since).order_by('id')[:page_size + 1])
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            has_older = False
+        else:
+            if before is not None:
+                queryset = queryset.filter(id__lt=before)
+            rows = list(queryset.order_by('-id')[:page_size + 1])
+            has_older = len(rows) > page_size
+            rows = rows[:page_size][::-1]
+            has_more = False
+
+        if rows:
+            mark_read(ticket, request.user, rows[-1].id)
+
+        # ``next`` is where to poll for newer messages; ``previous`` pages back
+        url = request.build_absolute_uri(request.path)
+        newest = rows[-1].id if rows else since
+        next_url = None
+        if has_more or (before is None and newest is not None):
+            next_url = f'{url}?since={newest}&page_size={page_size}'
+        previous_url = f'{url}?before={rows[0].id}&page_size={page_size}' if has_older else None
+        return Response({
+            'next': next_url,
+            'previous': previous_url,
+            'results': SupportMessageSerializer(rows, many=True).data,
+        })
+
     @action(detail=True, methods=['post'])
     def assign_staff(self, request, pk=None):
         ticket = self.get_object()
@@ -81,48 +195,62 @@ class SupportTicketViewSet(viewsets.ModelViewSet):
 class LabSupportViewSet(viewsets.ModelViewSet):
     serializer_class = LabSupportSerializer
     permission_classes = [IsAuthenticated]
+    # Expensive actions switch to the 'reports' scope
+    throttle_scope = 'default'
+    read_replica_actions = ('statistics',)
+
+    def get_permissions(self):
+        # Deleting refunds quota, so customers cannot delete (or rewrite) their sessions
+        if self.action in ['update', 'partial_update', 'destroy']:
+            return [IsAuthenticated(), IsStaffRole()]
+        return super().get_permissions()
 
     def get_queryset(self):
         user = self.request.user
+        limit = LabSupportLimit.objects.filter(lab=OuterRef('lab')).values('max_support_count')
+        used = LabSupportUsage.objects.filter(customer=OuterRef('customer'), lab=OuterRef('lab')).values('used_count')
+        queryset = LabSupport.objects.select_related('lab__author', 'customer', 'staff').defer('lab__content').annotate(
+            remaining_support_count=Subquery(limit[:1]) - Coalesce(Subquery(used[:1]), Value(0)),
+        )
         if user.role in ['admin', 'staff']:
-            return LabSupport.objects.all()
-        return LabSupport.objects.filter(customer=user)
+            return queryset
+        return queryset.filter(customer=user)
 
     def perform_create(self, serializer):
-        # Check support limits
-        lab_id = self.request.data.get('lab_id')
         customer = self.request.user
-        
-        try:
-            support_limit = LabSupportLimit.objects.get(lab_id=lab_id)
-            used_count = LabSupport.objects.filter(
-                lab_id=lab_id,
-                customer=customer
-            ).count()
-
-            if used_count >= support_limit.max_support_count:
-                return Response(
-                    {'error': 'Maximum support limit reached for this lab'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        except LabSupportLimit.DoesNotExist:
-            pass
-
-        serializer.save(
-            customer=customer,
-            staff=self.request.user if self.request.user.role in ['admin', 'staff'] else None
-        )
+        lab = serializer.validated_data['lab']
+        # The counter and the row commit or roll back together
+        with transaction.atomic():
+            try:
+                reserve_support_quota(customer.pk, lab.pk)
+            except SupportQuotaExceeded:
+                raise ValidationError({'error': 'Maximum support limit reached for this lab'})
+            serializer.save(
+                customer=customer,
+                staff=self.request.user if self.request.user.role in ['admin', 'staff'] else None
+            )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            release_support_quota(instance.customer_id, instance.lab_id)
+            instance.delete()
 
     @action(detail=True, methods=['post'])
     def resolve(self, request, pk=None):
         support = self.get_object()
-        if not support.is_resolved:
-            support.is_resolved = True
-            support.resolved_at = timezone.now()
-            support.save()
+        resolved_at = timezone.now()
+        with transaction.atomic():
+            # Only the request that actually flips the flag counts it
+            if LabSupport.objects.filter(pk=support.pk, is_resolved=False).update(
+                is_resolved=True, resolved_at=resolved_at
+            ):
+                support.is_resolved = True
+                support.resolved_at = resolved_at
+                stats.record_resolution(support)
+        support.refresh_from_db(fields=['is_resolved', 'resolved_at'])
         return Response(self.get_serializer(support).data)
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_scope='reports')
     def statistics(self, request):
         user = request.user
         if user.role not in ['admin', 'staff', 'manager']:
@@ -131,21 +259,7 @@ class LabSupportViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        stats = {
-            'total_supports': LabSupport.objects.count(),
-            'resolved_supports': LabSupport.objects.filter(is_resolved=True).count(),
-            'support_by_type': LabSupport.objects.values('support_type').annotate(
-                count=Count('id')
-            ),
-            'support_by_lab': LabSupport.objects.values('lab__title').annotate(
-                count=Count('id')
-            ),
-            'staff_performance': LabSupport.objects.values('staff__username').annotate(
-                total_supports=Count('id'),
-                resolved_supports=Count('id', filter=Q(is_resolved=True))
-            )
-        }
-        return Response(stats)
+        return Response(stats.summary())
 
 class LabSupportLimitViewSet(viewsets.ModelViewSet):
     queryset = LabSupportLimit.objects.all()
@@ -154,5 +268,5 @@ class LabSupportLimitViewSet(viewsets.ModelViewSet):
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
-            return [IsAuthenticated()]  # Only admin/staff can modify
+            return [IsAuthenticated(), IsStaffRole()]  # Only admin/staff can modify
         return super().get_permissions()
@@ -20,7 +20,8 @@ const ProductCard: React.FC<ProductCardProps> = ({ product }) => {
       <CardMedia
         component="img"
         height="200"
-        image={getImageUrl(product.image)}
+        image={getImageUrl(product.image_variants?.card?.webp ?? product.image)}
+        loading="lazy"
         alt={product.name}
         onError={(e: React.SyntheticEvent<HTMLImageElement>) => {
           e.currentTarget.src = 'https://placehold.co/400x300?text=No+Image';
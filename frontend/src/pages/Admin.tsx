@@ -22,7 +22,7 @@ import {
     TextField,
 } from '@mui/material';
 import { RootState } from '../store';
-import { Product, User, Order } from '../types';
+import { CursorPage, Product, User, Order } from '../types';
 import api from '../services/api';
 
 interface TabPanelProps {
@@ -58,6 +58,7 @@ const Admin: React.FC = () => {
     const [products, setProducts] = useState<Product[]>([]);
     const [users, setUsers] = useState<User[]>([]);
     const [orders, setOrders] = useState<Order[]>([]);
+    const [nextOrdersPage, setNextOrdersPage] = useState<string | null>(null);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
     const [openProductDialog, setOpenProductDialog] = useState(false);
@@ -79,11 +80,12 @@ const Admin: React.FC = () => {
                 const [productsRes, usersRes, ordersRes] = await Promise.all([
                     api.get('/api/products/'),
                     api.get('/api/users/'),
-                    api.get('/api/orders/'),
+                    api.get<CursorPage<Order>>('/api/orders/'),
                 ]);
                 setProducts(productsRes.data);
                 setUsers(usersRes.data);
-                setOrders(ordersRes.data);
+                setOrders(ordersRes.data.results);
+                setNextOrdersPage(ordersRes.data.next);
                 setLoading(false);
             } catch (error) {
                 setError('Failed to load data');
@@ -94,6 +96,18 @@ const Admin: React.FC = () => {
         fetchData();
     }, [user, navigate]);
 
+    const fetchMoreOrders = async () => {
+        if (!nextOrdersPage) return;
+
+        try {
+            const response = await api.get<CursorPage<Order>>(nextOrdersPage);
+            setOrders((current) => [...current, ...response.data.results]);
+            setNextOrdersPage(response.data.next);
+        } catch (error) {
+            console.error('Failed to fetch orders:', error);
+        }
+    };
+
     const handleCreateProduct = async () => {
         try {
             const response = await api.post('/api/products/', {
@@ -247,6 +261,13 @@ const Admin: React.FC = () => {
                             </TableBody>
                         </Table>
                     </TableContainer>
+                    {nextOrdersPage && (
+                        <Box sx={{ display: 'flex', justifyContent: 'center', my: 2 }}>
+                            <Button variant="outlined" onClick={fetchMoreOrders}>
+                                Load more
+                            </Button>
+                        </Box>
+                    )}
                 </TabPanel>
             </Paper>
 
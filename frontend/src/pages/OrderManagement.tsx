@@ -22,12 +22,13 @@ import {
     DialogActions,
     TextField,
 } from '@mui/material';
-import { Order } from '../types';
+import { CursorPage, Order } from '../types';
 import api from '../services/api';
 
 const OrderManagement = () => {
     const [orders, setOrders] = useState<Order[]>([]);
     const [loading, setLoading] = useState(true);
+    const [nextPage, setNextPage] = useState<string | null>(null);
     const [selectedOrder, setSelectedOrder] = useState<Order | null>(null);
     const [openDialog, setOpenDialog] = useState(false);
     const [newStatus, setNewStatus] = useState('');
@@ -61,8 +62,9 @@ const OrderManagement = () => {
 
     const fetchOrders = async () => {
         try {
-            const response = await api.get('/api/orders/');
-            setOrders(response.data);
+            const response = await api.get<CursorPage<Order>>('/api/orders/');
+            setOrders(response.data.results);
+            setNextPage(response.data.next);
             setLoading(false);
         } catch (error) {
             console.error('Failed to fetch orders:', error);
@@ -70,6 +72,18 @@ const OrderManagement = () => {
         }
     };
 
+    const fetchMoreOrders = async () => {
+        if (!nextPage) return;
+
+        try {
+            const response = await api.get<CursorPage<Order>>(nextPage);
+            setOrders((current) => [...current, ...response.data.results]);
+            setNextPage(response.data.next);
+        } catch (error) {
+            console.error('Failed to fetch orders:', error);
+        }
+    };
+
     const handleUpdateStatus = async () => {
         if (!selectedOrder || !newStatus) return;
 
@@ -151,6 +165,14 @@ const OrderManagement = () => {
                 </Table>
             </TableContainer>
 
+            {nextPage && (
+                <Box sx={{ display: 'flex', justifyContent: 'center', my: 2 }}>
+                    <Button variant="outlined" onClick={fetchMoreOrders}>
+                        Load more
+                    </Button>
+                </Box>
+            )}
+
             <Dialog open={openDialog} onClose={() => setOpenDialog(false)} maxWidth="sm" fullWidth>
                 <DialogTitle>Update Order Status</DialogTitle>
                 <DialogContent>
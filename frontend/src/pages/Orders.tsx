@@ -17,11 +17,13 @@ import {
     ListItem,
     ListItemText,
     Divider,
+    Button,
 } from '@mui/material';
 import KeyboardArrowDownIcon from '@mui/icons-material/KeyboardArrowDown';
 import KeyboardArrowUpIcon from '@mui/icons-material/KeyboardArrowUp';
-import { Order, OrderItem } from '../types';
+import { CursorPage, Order, OrderItem } from '../types';
 import api from '../services/api';
+import { subscribeToEvents } from '../services/events';
 import OrderStatus from '../components/OrderStatus';
 
 interface RowProps {
@@ -136,12 +138,14 @@ const Orders = () => {
     const [orders, setOrders] = React.useState<Order[]>([]);
     const [loading, setLoading] = React.useState(true);
     const [error, setError] = React.useState<string | null>(null);
+    const [nextPage, setNextPage] = React.useState<string | null>(null);
 
     React.useEffect(() => {
         const fetchOrders = async () => {
             try {
-                const response = await api.get('/api/orders/');
-                setOrders(response.data);
+                const response = await api.get<CursorPage<Order>>('/api/orders/');
+                setOrders(response.data.results);
+                setNextPage(response.data.next);
                 setLoading(false);
             } catch (error) {
                 setError('Failed to load orders');
@@ -150,8 +154,31 @@ const Orders = () => {
         };
 
         fetchOrders();
+
+        return subscribeToEvents((event) => {
+            if (event.type === 'order.status') {
+                const changed = new Set(event.orders);
+                setOrders((current) =>
+                    current.map((order) => (changed.has(order.id) ? { ...order, status: event.status } : order))
+                );
+            } else if (event.type === 'resync') {
+                fetchOrders();
+            }
+        });
     }, []);
 
+    const fetchMoreOrders = async () => {
+        if (!nextPage) return;
+
+        try {
+            const response = await api.get<CursorPage<Order>>(nextPage);
+            setOrders((current) => [...current, ...response.data.results]);
+            setNextPage(response.data.next);
+        } catch (error) {
+            console.error('Failed to fetch orders:', error);
+        }
+    };
+
     if (loading) {
         return (
             <Container>
@@ -201,6 +228,13 @@ const Orders = () => {
                     </TableBody>
                 </Table>
             </TableContainer>
+            {nextPage && (
+                <Box sx={{ display: 'flex', justifyContent: 'center', my: 2 }}>
+                    <Button variant="outlined" onClick={fetchMoreOrders}>
+                        Load more
+                    </Button>
+                </Box>
+            )}
         </Container>
     );
 };
@@ -9,6 +9,7 @@ import {
     Tab,
     Tabs,
     TextField,
+    MenuItem,
 } from '@mui/material';
 import { DatePicker } from '@mui/x-date-pickers/DatePicker';
 import { LocalizationProvider } from '@mui/x-date-pickers/LocalizationProvider';
@@ -44,23 +45,25 @@ const Reports = () => {
     const [salesData, setSalesData] = useState<SalesData[]>([]);
     const [supportData, setSupportData] = useState<SupportData[]>([]);
     const [deliveryData, setDeliveryData] = useState<DeliveryData[]>([]);
+    const [granularity, setGranularity] = useState('day');
 
     useEffect(() => {
         fetchReportData();
-    }, [startDate, endDate]);
+    }, [startDate, endDate, granularity]);
 
     const fetchReportData = async () => {
         if (!startDate || !endDate) return;
 
+        const params = {
+            start_date: startDate.toISOString().split('T')[0],
+            end_date: endDate.toISOString().split('T')[0],
+            granularity,
+        };
+
         try {
             const [salesResponse, supportResponse, deliveryResponse] = await Promise.all([
-                api.get('/api/reports/sales/', {
-                    params: {
-                        start_date: startDate.toISOString().split('T')[0],
-                        end_date: endDate.toISOString().split('T')[0],
-                    },
-                }),
-                api.get('/api/reports/support/'),
+                api.get('/api/reports/sales/', { params }),
+                api.get('/api/reports/support/', { params }),
                 api.get('/api/reports/delivery/'),
             ]);
 
@@ -124,7 +127,7 @@ const Reports = () => {
             <Grid item xs={12} md={6} component="div">
                 <Paper sx={{ p: 2 }}>
                     <Typography variant="h6" gutterBottom>
-                        Orders per Day
+                        Orders per {granularity.charAt(0).toUpperCase() + granularity.slice(1)}
                     </Typography>
                     <BarChart
                         xAxis={[{ data: salesData.map(d => new Date(d.date)) }]}
@@ -197,7 +200,7 @@ const Reports = () => {
                 </Typography>
                 
                 <Grid container spacing={2} sx={{ mb: 3 }} component="div">
-                    <Grid item xs={12} md={4} component="div">
+                    <Grid item xs={12} md={3} component="div">
                         <LocalizationProvider dateAdapter={AdapterDateFns}>
                             <DatePicker
                                 label="Start Date"
@@ -207,7 +210,7 @@ const Reports = () => {
                             />
                         </LocalizationProvider>
                     </Grid>
-                    <Grid item xs={12} md={4} component="div">
+                    <Grid item xs={12} md={3} component="div">
                         <LocalizationProvider dateAdapter={AdapterDateFns}>
                             <DatePicker
                                 label="End Date"
@@ -217,7 +220,21 @@ const Reports = () => {
                             />
                         </LocalizationProvider>
                     </Grid>
-                    <Grid item xs={12} md={4} component="div">
+                    <Grid item xs={12} md={3} component="div">
+                        <TextField
+                            select
+                            label="Group by"
+                            value={granularity}
+                            onChange={(e) => setGranularity(e.target.value)}
+                            sx={{ width: '100%' }}
+                        >
+                            <MenuItem value="hour">Hour</MenuItem>
+                            <MenuItem value="day">Day</MenuItem>
+                            <MenuItem value="week">Week</MenuItem>
+                            <MenuItem value="month">Month</MenuItem>
+                        </TextField>
+                    </Grid>
+                    <Grid item xs={12} md={3} component="div">
                         <Button
                             variant="contained"
                             onClick={exportToExcel}
@@ -23,8 +23,9 @@ import {
     MenuItem,
 } from '@mui/material';
 import { RootState } from '../store';
-import { SupportTicket, Lab } from '../types';
+import { SupportTicket, SupportMessage, MessagePage, Lab } from '../types';
 import api from '../services/api';
+import { subscribeToEvents } from '../services/events';
 
 function Support() {
     const user = useSelector((state: RootState) => state.auth.user);
@@ -34,6 +35,9 @@ function Support() {
     const [error, setError] = useState<string | null>(null);
     const [openDialog, setOpenDialog] = useState(false);
     const [newMessage, setNewMessage] = useState('');
+    const [conversations, setConversations] = useState<
+        Record<number, { messages: SupportMessage[]; next: string | null; previous: string | null }>
+    >({});
     const [newTicket, setNewTicket] = useState({
         title: '',
         description: '',
@@ -57,12 +61,43 @@ function Support() {
         };
 
         fetchData();
+
+        return subscribeToEvents((event) => {
+            if (event.type === 'support.message') {
+                const { ticket: ticketId, message } = event;
+                setConversations((current) => {
+                    const conversation = current[ticketId];
+                    if (!conversation) return current;
+                    if (conversation.messages.some((m) => m.id === message.id)) return current;
+                    return { ...current, [ticketId]: { ...conversation, messages: [...conversation.messages, message] } };
+                });
+                setTickets((current) =>
+                    current.map((t) =>
+                        t.id === ticketId
+                            ? {
+                                  ...t,
+                                  message_count: t.message_count + 1,
+                                  unread_count: message.sender.id === user?.id ? t.unread_count : t.unread_count + 1,
+                                  last_message: {
+                                      id: message.id,
+                                      message: message.message,
+                                      sender: message.sender.username,
+                                      created_at: message.created_at,
+                                  },
+                              }
+                            : t
+                    )
+                );
+            } else if (event.type === 'resync') {
+                fetchData();
+            }
+        });
     }, []);
 
     const handleCreateTicket = async () => {
         try {
             const response = await api.post('/api/support/', newTicket);
-            setTickets([...tickets, response.data]);
+            setTickets([...tickets, { ...response.data, message_count: 0, unread_count: 0, last_message: null }]);
             setOpenDialog(false);
             setNewTicket({ title: '', description: '', lab_id: '' });
         } catch (error) {
@@ -70,6 +105,60 @@ function Support() {
         }
     };
 
+    const openConversation = async (ticketId: number) => {
+        try {
+            const response = await api.get<MessagePage>(`/api/support/${ticketId}/messages/`);
+            setConversations((current) => ({
+                ...current,
+                [ticketId]: {
+                    messages: response.data.results,
+                    next: response.data.next,
+                    previous: response.data.previous,
+                },
+            }));
+            setTickets((current) =>
+                current.map((t) => (t.id === ticketId ? { ...t, unread_count: 0 } : t))
+            );
+        } catch (error) {
+            alert('Failed to load messages');
+        }
+    };
+
+    const loadEarlier = async (ticketId: number) => {
+        const conversation = conversations[ticketId];
+        if (!conversation?.previous) return;
+        const response = await api.get<MessagePage>(conversation.previous);
+        setConversations((current) => ({
+            ...current,
+            [ticketId]: {
+                ...current[ticketId],
+                messages: [...response.data.results, ...current[ticketId].messages],
+                previous: response.data.previous,
+            },
+        }));
+    };
+
+    // Only messages newer than the last one shown are fetched
+    const loadNewer = async (ticketId: number) => {
+        const conversation = conversations[ticketId];
+        if (!conversation?.next) return openConversation(ticketId);
+        const response = await api.get<MessagePage>(conversation.next);
+        setConversations((current) => ({
+            ...current,
+            [ticketId]: {
+                ...current[ticketId],
+                // A pushed copy of these messages may already be shown
+                messages: [
+                    ...current[ticketId].messages,
+                    ...response.data.results.filter(
+                        (m) => !current[ticketId].messages.some((shown) => shown.id === m.id)
+                    ),
+                ],
+                next: response.data.next ?? current[ticketId].next,
+            },
+        }));
+    };
+
     const handleSendMessage = async (ticketId: number) => {
         if (!newMessage.trim()) return;
 
@@ -77,10 +166,7 @@ function Support() {
             await api.post(`/api/support/${ticketId}/add_message/`, {
                 message: newMessage,
             });
-            
-            // Refresh ticket data
-            const response = await api.get('/api/support/');
-            setTickets(response.data);
+            await loadNewer(ticketId);
             setNewMessage('');
         } catch (error) {
             alert('Failed to send message');
@@ -137,18 +223,41 @@ function Support() {
                                 </Typography>
                                 <Typography paragraph>{ticket.description}</Typography>
 
-                                <List>
-                                    {ticket.messages.map((message) => (
-                                        <ListItem key={message.id}>
-                                            <ListItemText
-                                                primary={message.message}
-                                                secondary={`${message.sender.username} - ${new Date(
-                                                    message.created_at
-                                                ).toLocaleString()}`}
-                                            />
-                                        </ListItem>
-                                    ))}
-                                </List>
+                                {conversations[ticket.id] ? (
+                                    <>
+                                        {conversations[ticket.id].previous && (
+                                            <Button size="small" onClick={() => loadEarlier(ticket.id)}>
+                                                Load earlier messages
+                                            </Button>
+                                        )}
+                                        <List>
+                                            {conversations[ticket.id].messages.map((message) => (
+                                                <ListItem key={message.id}>
+                                                    <ListItemText
+                                                        primary={message.message}
+                                                        secondary={`${message.sender.username} - ${new Date(
+                                                            message.created_at
+                                                        ).toLocaleString()}`}
+                                                    />
+                                                </ListItem>
+                                            ))}
+                                        </List>
+                                    </>
+                                ) : (
+                                    <Box sx={{ display: 'flex', alignItems: 'center', gap: 2 }}>
+                                        {ticket.last_message && (
+                                            <Typography variant="body2" color="textSecondary">
+                                                {ticket.last_message.sender}: {ticket.last_message.message}
+                                            </Typography>
+                                        )}
+                                        <Button size="small" onClick={() => openConversation(ticket.id)}>
+                                            {`Show ${ticket.message_count} messages`}
+                                        </Button>
+                                        {ticket.unread_count > 0 && (
+                                            <Chip size="small" color="primary" label={`${ticket.unread_count} unread`} />
+                                        )}
+                                    </Box>
+                                )}
 
                                 {ticket.status !== 'closed' && (
                                     <Box sx={{ display: 'flex', gap: 1, mt: 2 }}>
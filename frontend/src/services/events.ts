@@ -0,0 +1,48 @@
+import { SupportMessage, Order } from '../types';
+
+const BASE_URL = 'http://localhost:8000';
+
+export type PushEvent =
+    | { type: 'support.message'; ticket: number; message: SupportMessage }
+    | { type: 'order.status'; status: Order['status']; orders: number[] }
+    | { type: 'resync' }
+    | { type: 'ping' };
+
+// Opens the push channel: a WebSocket, or Server-Sent Events when the
+// socket cannot be opened. Returns a function that closes it.
+export function subscribeToEvents(onEvent: (event: PushEvent) => void): () => void {
+    const token = localStorage.getItem('token');
+    if (!token) return () => {};
+    const query = `?token=${encodeURIComponent(token)}`;
+    let closed = false;
+    let source: EventSource | null = null;
+
+    const handle = (data: string) => {
+        const event = JSON.parse(data) as PushEvent;
+        if (event.type !== 'ping') onEvent(event);
+    };
+
+    const openEventSource = () => {
+        if (closed || source) return;
+        source = new EventSource(`${BASE_URL}/api/events/${query}`);
+        ['support.message', 'order.status', 'resync'].forEach((type) =>
+            source!.addEventListener(type, (e) => handle((e as MessageEvent).data))
+        );
+    };
+
+    let opened = false;
+    const socket = new WebSocket(`${BASE_URL.replace(/^http/, 'ws')}/ws/events/${query}`);
+    socket.onopen = () => {
+        opened = true;
+    };
+    socket.onmessage = (e) => handle(e.data);
+    socket.onclose = () => {
+        if (!opened) openEventSource();
+    };
+
+    return () => {
+        closed = true;
+        socket.close();
+        source?.close();
+    };
+}
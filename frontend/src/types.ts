@@ -10,6 +10,12 @@ export interface User {
     is_staff: boolean;
 }
 
+export interface ImageVariant {
+    jpg?: string;
+    png?: string;
+    webp: string;
+}
+
 export interface Product {
     id: number;
     name: string;
@@ -17,6 +23,11 @@ export interface Product {
     price: number;
     stock: number;
     image: string | null;
+    image_variants?: {
+        thumbnail?: ImageVariant;
+        card?: ImageVariant;
+        detail?: ImageVariant;
+    };
     created_at: string;
     updated_at: string;
     labs: Lab[];
@@ -54,6 +65,11 @@ export interface OrderItem {
     labs_activated: boolean;
 }
 
+export interface CursorPage<T> {
+    next: string | null;
+    results: T[];
+}
+
 export interface CartItem {
     product: Product;
     quantity: number;
@@ -69,7 +85,22 @@ export interface SupportTicket {
     status: 'open' | 'in_progress' | 'resolved' | 'closed';
     created_at: string;
     updated_at: string;
-    messages: SupportMessage[];
+    message_count: number;
+    unread_count: number;
+    last_message: SupportMessagePreview | null;
+}
+
+export interface SupportMessagePreview {
+    id: number;
+    message: string;
+    sender: string;
+    created_at: string;
+}
+
+export interface MessagePage {
+    next: string | null;
+    previous: string | null;
+    results: SupportMessage[];
 }
 
 export interface SupportMessage {